@@ -0,0 +1,55 @@
+"""Connect-to-response latency with the listener socket options
+
+    python -m benchmarks.accept [--connections N] [--requests N]
+
+Clients open a new connection per request, the samples cover connecting,
+accepting and answering. TCP_DEFER_ACCEPT wakes the worker only once the
+request arrived, TCP_QUICKACK acknowledges it without the delayed ACK.
+"""
+
+import time
+import argparse
+
+from tests.utils import run_uasgi
+
+from .common import concurrent_latencies, summary
+
+
+OPTIONS = {
+    "default": (),
+    "defer-accept": ("--tcp-defer-accept", "1"),
+    "quickack": ("--tcp-quickack",),
+    "fastopen": ("--tcp-fastopen", "256"),
+    "buffers": ("--rcvbuf", "262144", "--sndbuf", "262144"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, options in OPTIONS.items():
+        # the options are applied to the listener uasgi creates itself
+        with run_uasgi(
+            *options, app="benchmarks.apps:hello", bind=True
+        ) as process:
+            concurrent_latencies(
+                process.port, args.connections, 20, keep_alive=False
+            )
+
+            started_at = time.perf_counter()
+            samples = concurrent_latencies(
+                process.port,
+                args.connections,
+                args.requests,
+                keep_alive=False,
+            )
+            elapsed = time.perf_counter() - started_at
+
+        print(f"{name:13} {summary(samples, elapsed)}")
+
+
+if __name__ == "__main__":
+    main()
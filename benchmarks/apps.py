@@ -0,0 +1,40 @@
+"""Applications served by the benchmarks through `uasgi run`"""
+
+BODY = b"Hello, world!"
+
+
+async def hello(scope, receive, send):
+    """Answer at once, without awaiting anything but `send`"""
+
+    if scope["type"] == "lifespan":
+        while (await receive())["type"] != "lifespan.shutdown":
+            await send({"type": "lifespan.startup.complete"})
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain"),
+                (b"content-length", str(len(BODY)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": BODY})
+
+
+async def echo(scope, receive, send):
+    """Send every WebSocket message back as it came"""
+
+    if scope["type"] != "websocket":
+        return await hello(scope, receive, send)
+
+    await receive()
+    await send({"type": "websocket.accept"})
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        await send({**message, "type": "websocket.send"})
@@ -0,0 +1,115 @@
+"""Load generation shared by the benchmarks
+
+The client runs in the benchmark's own process while the server under test
+is a `uasgi run` subprocess, so both do not share a GIL.
+"""
+
+import time
+import socket
+import statistics
+import threading
+from typing import List
+
+
+def request(sock: socket.socket, data: bytes):
+    """Send a request over `sock` and read its response to the end"""
+
+    sock.sendall(data)
+    buffer = b""
+    while b"\r\n\r\n" not in buffer:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buffer += chunk
+
+    head, _, body = buffer.partition(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+
+    while len(body) < length:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        body += chunk
+
+
+def keep_alive_latencies(
+    port: int, requests: int, path: str = "/"
+) -> List[float]:
+    """Latencies of `requests` sequential GETs on one connection"""
+
+    data = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+    samples = []
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for _ in range(requests):
+            started_at = time.perf_counter()
+            request(sock, data)
+            samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+def new_connection_latencies(
+    port: int, requests: int, path: str = "/"
+) -> List[float]:
+    """Latencies of `requests` GETs each sent on a new connection
+
+    A sample covers the connect, so the accept path is part of it.
+    """
+
+    data = (
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    ).encode()
+    samples = []
+    for _ in range(requests):
+        started_at = time.perf_counter()
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+            request(sock, data)
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+def concurrent_latencies(
+    port: int,
+    connections: int,
+    requests: int,
+    path: str = "/",
+    keep_alive: bool = True,
+) -> List[float]:
+    """Latencies of `connections` clients each sending `requests` GETs
+
+    Without `keep_alive` every request opens a new connection.
+    """
+
+    results: List[List[float]] = []
+    latencies = (
+        keep_alive_latencies if keep_alive else new_connection_latencies
+    )
+
+    def client():
+        results.append(latencies(port, requests, path))
+
+    threads = [threading.Thread(target=client) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return [sample for samples in results for sample in samples]
+
+
+def summary(samples: List[float], elapsed: float = 0.0) -> str:
+    """Format the percentiles of `samples`, and the rate over `elapsed`"""
+
+    quantiles = statistics.quantiles(samples, n=1000)
+    line = (
+        f"p50 {quantiles[499] * 1e6:8.0f}us  "
+        f"p99 {quantiles[989] * 1e6:8.0f}us  "
+        f"p99.9 {quantiles[998] * 1e6:8.0f}us"
+    )
+    if elapsed:
+        line += f"  {len(samples) / elapsed:9.0f} req/s"
+    return line
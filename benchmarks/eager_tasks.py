@@ -0,0 +1,38 @@
+"""Request latency with and without --eager-tasks, on both event loops
+
+    python -m benchmarks.eager_tasks [--requests N]
+
+An app answering without awaiting I/O finishes inside data_received when
+its task starts eagerly, which saves one loop iteration per request.
+"""
+
+import sys
+import argparse
+
+from tests.utils import run_uasgi
+
+from .common import keep_alive_latencies, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    if sys.version_info < (3, 12):
+        sys.exit("--eager-tasks needs Python 3.12")
+
+    for loop in ["asyncio", "uvloop"]:
+        for eager in ["--no-eager-tasks", "--eager-tasks"]:
+            with run_uasgi(
+                "--loop", loop, eager, app="benchmarks.apps:hello"
+            ) as process:
+                # warm up the connection path before measuring
+                keep_alive_latencies(process.port, 1000)
+                samples = keep_alive_latencies(process.port, args.requests)
+
+            print(f"{loop:8} {eager:17} {summary(samples)}")
+
+
+if __name__ == "__main__":
+    main()
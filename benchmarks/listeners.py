@@ -0,0 +1,61 @@
+"""Tail latency of a shared listener against per-worker --reuse-port ones
+
+    python -m benchmarks.listeners [--workers N] [--connections N]
+                                   [--requests N]
+
+Every worker accepts from the one inherited socket unless --reuse-port
+gives each its own accept queue, with --cpu-affinity also pinning them.
+Clients open a new connection per request, so accepting is on the path of
+every sample.
+"""
+
+import time
+import argparse
+
+from tests.utils import run_uasgi
+
+from .common import concurrent_latencies, summary
+
+
+MODES = {
+    "shared": (),
+    "reuse-port": ("--reuse-port",),
+    "reuse-port+cpu": ("--reuse-port", "--cpu-affinity"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    for mode, options in MODES.items():
+        with run_uasgi(
+            "--workers",
+            str(args.workers),
+            *options,
+            app="benchmarks.apps:hello",
+            bind=bool(options),
+        ) as process:
+            # every worker has to be up before measuring
+            process.wait_for_workers(args.workers)
+            concurrent_latencies(
+                process.port, args.connections, 20, keep_alive=False
+            )
+
+            started_at = time.perf_counter()
+            samples = concurrent_latencies(
+                process.port,
+                args.connections,
+                args.requests,
+                keep_alive=False,
+            )
+            elapsed = time.perf_counter() - started_at
+
+        print(f"{mode:15} {summary(samples, elapsed)}")
+
+
+if __name__ == "__main__":
+    main()
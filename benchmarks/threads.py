@@ -0,0 +1,50 @@
+"""Throughput of event loops in threads against worker processes
+
+    python -m benchmarks.threads [--loops N] [--connections N]
+                                 [--requests N]
+
+Runs `loops` event loops either as --threads of a single worker or as
+separate --workers. Threads only scale on a free-threaded build, with the
+GIL they share one core and uasgi warns about it at startup.
+"""
+
+import sys
+import time
+import argparse
+import sysconfig
+
+from tests.utils import run_uasgi
+
+from .common import concurrent_latencies, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loops", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    print(f"Python {sys.version.split()[0]}, free-threaded: {free_threaded}")
+
+    loops = str(args.loops)
+    for mode, options in {
+        "processes": ("--workers", loops),
+        "threads": ("--workers", "1", "--threads", loops),
+    }.items():
+        with run_uasgi(*options, app="benchmarks.apps:hello") as process:
+            process.wait_for_workers(int(options[1]))
+            concurrent_latencies(process.port, args.connections, 100)
+
+            started_at = time.perf_counter()
+            samples = concurrent_latencies(
+                process.port, args.connections, args.requests
+            )
+            elapsed = time.perf_counter() - started_at
+
+        print(f"{mode:10} {summary(samples, elapsed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""WebSocket echo throughput in messages per second
+
+    python -m benchmarks.websocket [--messages N] [--window N]
+
+The client keeps `window` messages in flight on one connection. It masks
+with a zero key, so the client side costs nothing per byte while the
+server still runs its unmasking. With deflate the client only offers the
+extension: its frames stay uncompressed and the server compresses the
+echoes.
+"""
+
+import time
+import argparse
+
+from tests.utils import run_uasgi
+from tests.test_websocket import handshake, parse_server_frame
+
+from uasgi.websocket import OP_CLOSE, OP_TEXT, build_close_payload
+
+
+def client_frame(opcode: int, payload: bytes) -> bytes:
+    """Serialize a client frame masked with an all-zero key"""
+
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, 0x80 | length))
+    elif length < 1 << 16:
+        header = bytes((0x80 | opcode, 0x80 | 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((0x80 | opcode, 0x80 | 127)) + length.to_bytes(8, "big")
+    return header + b"\0\0\0\0" + payload
+
+
+def echo_rate(port: int, size: int, messages: int, window: int, deflate: bool):
+    sock, _, data = handshake(port, b"permessage-deflate" if deflate else None)
+    frame = client_frame(OP_TEXT, b"x" * size)
+
+    started_at = time.perf_counter()
+    sent = received = 0
+    with sock:
+        while received < messages:
+            burst = min(window - (sent - received), messages - sent)
+            if burst:
+                sock.sendall(frame * burst)
+                sent += burst
+
+            data += sock.recv(1 << 20)
+            while (parsed := parse_server_frame(data)) is not None:
+                data = parsed[3]
+                received += 1
+
+        elapsed = time.perf_counter() - started_at
+        sock.sendall(client_frame(OP_CLOSE, build_close_payload(1000)))
+
+    return messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--window", type=int, default=32)
+    args = parser.parse_args()
+
+    with run_uasgi(app="benchmarks.apps:echo") as process:
+        for size in [16, 1024, 65536]:
+            for deflate in [False, True]:
+                # 64KiB messages would take minutes at the full count
+                count = args.messages if size <= 1024 else args.messages // 10
+                echo_rate(process.port, size, 1000, args.window, deflate)
+                rate = echo_rate(
+                    process.port, size, count, args.window, deflate
+                )
+                label = "deflate" if deflate else "plain"
+                print(f"{size:6}B {label:8} {rate:9.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Applications served by the tests through `uasgi run`"""
+
+import os
+import json
+import asyncio
+import threading
+import urllib.parse
+
+
+# lifespan startups run by this process
+startups = 0
+# the arbiter when the app is preloaded, otherwise the worker
+imported_by = os.getpid()
+
+
+async def lifespan(receive, send):
+    global startups
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.sleep(float(os.environ.get("STARTUP_DELAY", 0)))
+            startups += 1
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """Describe the process and thread serving the request
+
+    `?delay=SECONDS` delays the response.
+    """
+
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    query = urllib.parse.parse_qs(scope["query_string"].decode())
+    if "delay" in query:
+        await asyncio.sleep(float(query["delay"][0]))
+
+    body = json.dumps(
+        {
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "cpus": sorted(os.sched_getaffinity(0)),
+            "loop": type(asyncio.get_running_loop()).__module__.split(".")[0],
+            "startups": startups,
+            "imported_by": imported_by,
+        }
+    ).encode()
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,37 @@
+import socket
+import asyncio
+
+from .utils import serve
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.15)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", b"2")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_pipelined_requests_are_not_shed():
+    requests = 4
+
+    with serve(slow_app, shed_target=0.05) as (_, port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            # each request waits for the previous response, not the server
+            sock.sendall(
+                b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n" * requests
+            )
+
+            data = b""
+            while data.count(b"HTTP/1.1 ") < requests or not data.endswith(
+                b"ok"
+            ):
+                chunk = sock.recv(65536)
+                assert chunk, data
+                data += chunk
+
+    assert data.count(b"HTTP/1.1 200 ") == requests
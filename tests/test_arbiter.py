@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import signal
+import threading
+import http.client
+from typing import List
+
+import pytest
+
+from .utils import get, run_uasgi
+
+
+def test_supervision_continues_during_rolling_restart():
+    with run_uasgi(
+        "--workers",
+        "2",
+        "--lifespan",
+        env={"STARTUP_DELAY": "2"},
+    ) as process:
+        process.wait_for(r"2 workers started")
+        first, second = process.worker_pids()
+
+        process.send_signal(signal.SIGHUP)
+        process.wait_for(r"Rolling restart of workers")
+        os.kill(second, signal.SIGKILL)
+
+        process.wait_for(rf"Worker {second} exited")
+        assert "Rolling restart completed" not in process.output()
+        process.wait_for(r"Rolling restart completed")
+
+
+def load(port: int, stop: threading.Event, results: List):
+    """Send requests over a keep-alive connection until `stop` is set"""
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    while not stop.is_set():
+        try:
+            conn.request("GET", "/?delay=0.01")
+            response = conn.getresponse()
+            body = json.loads(response.read())
+            results.append((response.status, body["pid"]))
+            if response.will_close:
+                conn.close()
+        except Exception as e:
+            results.append((repr(e), None))
+            conn.close()
+    conn.close()
+
+
+def test_rolling_restart_under_load():
+    with run_uasgi("--workers", "2") as process:
+        process.wait_for(r"2 workers started")
+        old_pids = set(process.worker_pids())
+
+        stop = threading.Event()
+        results: List = []
+        clients = [
+            threading.Thread(target=load, args=(process.port, stop, results))
+            for _ in range(8)
+        ]
+        for client in clients:
+            client.start()
+
+        time.sleep(0.5)
+        process.send_signal(signal.SIGHUP)
+        process.wait_for(r"Rolling restart completed")
+        time.sleep(0.5)
+
+        stop.set()
+        for client in clients:
+            client.join()
+
+    failed = [status for status, _ in results if status != 200]
+    assert failed == []
+    served_by = {pid for _, pid in results}
+    assert served_by & old_pids
+    assert served_by - old_pids
+
+
+def test_sigterm_drains_workers():
+    with run_uasgi("--workers", "2") as process:
+        process.wait_for(r"2 workers started")
+        pids = process.worker_pids()
+
+        results = []
+        request = threading.Thread(
+            target=lambda: results.append(get(process.port, "/?delay=1")[0])
+        )
+        request.start()
+        time.sleep(0.3)
+
+        # only the arbiter is signalled, like `docker stop` does
+        process.send_signal(signal.SIGTERM)
+        request.join()
+        assert process.process.wait(10) == 0
+
+    assert results == [200]
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+def test_slow_startup_is_not_a_hang():
+    with run_uasgi(
+        "--workers",
+        "2",
+        "--lifespan",
+        "--worker-timeout",
+        "1",
+        env={"STARTUP_DELAY": "3"},
+    ) as process:
+        process.wait_for(r"2 workers started")
+        time.sleep(1.5)
+
+        assert "missed its heartbeat" not in process.output()
+        assert len(process.worker_pids()) == 2
+
+
+def test_signal_storm_keeps_the_arbiter_responsive():
+    with run_uasgi("--workers", "2") as process:
+        process.wait_for(r"2 workers started")
+
+        for _ in range(1000):
+            process.send_signal(signal.SIGCHLD)
+            process.send_signal(signal.SIGTTOU)
+        process.wait_for_workers(1)
+
+        process.send_signal(signal.SIGTTIN)
+        process.wait_for_workers(2)
+
+        process.send_signal(signal.SIGTERM)
+        assert process.process.wait(10) == 0
@@ -0,0 +1,55 @@
+import time
+import signal
+import threading
+from typing import List
+
+from .utils import get, run_uasgi
+
+
+def test_signals_scale_within_bounds():
+    with run_uasgi(
+        "--workers", "2", "--min-workers", "1", "--max-workers", "3"
+    ) as process:
+        process.wait_for(r"2 workers started")
+
+        # pending signals of one kind coalesce, so they are spaced out
+        for _ in range(3):
+            process.send_signal(signal.SIGTTIN)
+            time.sleep(0.2)
+        process.wait_for_workers(3)
+
+        for _ in range(3):
+            process.send_signal(signal.SIGTTOU)
+            time.sleep(0.2)
+        process.wait_for_workers(1)
+
+        process.send_signal(signal.SIGTTIN)
+        process.wait_for_workers(2)
+
+
+def test_scales_up_under_load():
+    with run_uasgi("--workers", "1", "--max-workers", "2") as process:
+        process.wait_for(r"1 workers started")
+
+        stop = threading.Event()
+        statuses: List[int] = []
+
+        def client():
+            while not stop.is_set():
+                statuses.append(
+                    get(process.port, "/?delay=0.5", timeout=10)[0]
+                )
+
+        # far more in-flight requests than SCALE_UP_INFLIGHT per worker
+        clients = [threading.Thread(target=client) for _ in range(100)]
+        for thread in clients:
+            thread.start()
+        try:
+            process.wait_for(r"Scaling up")
+            process.wait_for_workers(2)
+        finally:
+            stop.set()
+            for thread in clients:
+                thread.join()
+
+    assert set(statuses) == {200}
@@ -0,0 +1,67 @@
+import time
+import socket
+import threading
+from typing import List
+
+from .utils import serve
+
+
+CHUNK = b"x" * 16384
+CHUNKS = 200
+WRITE_BUFFER_HIGH = 65536
+
+
+def test_slow_reader_pauses_the_app():
+    buffered: List[int] = []
+    done = threading.Event()
+    servers = []
+
+    async def app(scope, receive, send):
+        (connection,) = servers[0].state.connections
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-length", str(len(CHUNK) * CHUNKS).encode())
+                ],
+            }
+        )
+        for _ in range(CHUNKS):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": CHUNK,
+                    "more_body": True,
+                }
+            )
+            buffered.append(connection.transport.get_write_buffer_size())
+        await send({"type": "http.response.body", "body": b""})
+        done.set()
+
+    with serve(app, write_buffer_high=WRITE_BUFFER_HIGH, sndbuf=16384) as (
+        server,
+        port,
+    ):
+        servers.append(server)
+
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.settimeout(5)
+        sock.connect(("127.0.0.1", port))
+        sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+
+        # the client does not read, the app must wait in send()
+        time.sleep(1)
+        assert len(buffered) < CHUNKS
+        assert max(buffered) <= WRITE_BUFFER_HIGH
+
+        received = 0
+        while not done.is_set() or received < len(CHUNK) * CHUNKS:
+            data = sock.recv(65536)
+            assert data
+            received += len(data)
+        sock.close()
+
+    assert len(buffered) == CHUNKS
+    assert max(buffered) <= WRITE_BUFFER_HIGH
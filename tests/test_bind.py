@@ -0,0 +1,74 @@
+import json
+import socket
+import http.client
+
+from .utils import serve
+
+
+async def app(scope, receive, send):
+    body = json.dumps(
+        {"server": scope["server"], "client": scope["client"]}
+    ).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "uasgi.sock")
+
+    with serve(app, bind=[f"unix:{path}"], uds_mode=0o660):
+        assert oct(tmp_path.joinpath("uasgi.sock").stat().st_mode & 0o777) == (
+            "0o660"
+        )
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.settimeout(5)
+            sock.connect(path)
+            sock.sendall(
+                b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+            )
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+
+    head, _, body = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200")
+    assert json.loads(body) == {"server": [path, None], "client": None}
+
+
+def test_ipv6_loopback():
+    with serve(app, bind=["[::1]:0"]) as (_, port):
+        conn = http.client.HTTPConnection("::1", port, timeout=5)
+        try:
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            scope = json.loads(response.read())
+        finally:
+            conn.close()
+
+    assert response.status == 200
+    assert scope["server"] == ["::1", port]
+    assert scope["client"][0] == "::1"
+
+
+def test_multiple_binds(tmp_path):
+    path = str(tmp_path / "uasgi.sock")
+
+    with serve(app, bind=["127.0.0.1:0", f"unix:{path}"]) as (server, port):
+        assert [sock.family for sock in server.config.sockets] == [
+            socket.AF_INET,
+            socket.AF_UNIX,
+        ]
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            conn.request("GET", "/")
+            scope = json.loads(conn.getresponse().read())
+        finally:
+            conn.close()
+
+    assert scope["server"] == ["127.0.0.1", port]
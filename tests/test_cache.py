@@ -0,0 +1,192 @@
+import time
+import socket
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .utils import get, serve
+
+
+PUBLIC = (b"cache-control", b"public, max-age=60")
+
+
+def make_app(headers, delay: float = 0.0, size: int = 0):
+    """App answering with the number of calls so far, padded to `size`
+
+    `delay` is waited between the headers and the body, on every call but
+    the first one when negative.
+    """
+
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        body = str(len(calls)).encode().ljust(size)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-length", str(len(body)).encode()),
+                    *headers,
+                ],
+            }
+        )
+        if delay > 0 or (delay < 0 and len(calls) > 1):
+            await asyncio.sleep(abs(delay))
+        await send({"type": "http.response.body", "body": body})
+
+    return app, calls
+
+
+def get_many(port, paths, headers=None):
+    with ThreadPoolExecutor(len(paths)) as pool:
+        return list(
+            pool.map(lambda path: get(port, path, headers=headers), paths)
+        )
+
+
+def test_hits_carry_their_age():
+    app, calls = make_app([PUBLIC])
+
+    with serve(app, cache_size=2**20) as (_, port):
+        _, miss, _ = get(port)
+        assert "age" not in miss
+
+        _, hit, body = get(port)
+        assert body == b"1"
+        assert hit["age"] == "0"
+
+        time.sleep(1.1)
+        _, hit, _ = get(port)
+        assert hit["age"] == "1"
+        assert calls == ["/"]
+
+
+def test_age_from_the_app_counts():
+    app, calls = make_app(
+        [(b"cache-control", b"s-maxage=600"), (b"age", b"100")]
+    )
+
+    with serve(app, cache_size=2**20) as (_, port):
+        get(port)
+        _, hit, _ = get(port)
+        assert hit["age"] == "100"
+        assert calls == ["/"]
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    app, calls = make_app([PUBLIC], size=900)
+
+    # room for 8 entries, each holding the body once and the head twice
+    with serve(app, cache_size=9000) as (server, port):
+        cache = server.state.cache
+        for path in ["/a", "/b", "/c", "/d", "/e"]:
+            get(port, path)
+        # /a becomes the most recently used
+        get(port, "/a")
+        for path in ["/f", "/g", "/h", "/i"]:
+            get(port, path)
+
+        assert len(cache.entries) == 8
+        assert cache.size <= 9000
+        assert sum(entry.size for entry in cache.entries.values()) == (
+            cache.size
+        )
+
+        calls.clear()
+        for path in ["/a", "/i", "/b"]:
+            get(port, path)
+        # /b was the least recently used
+        assert calls == ["/b"]
+
+
+def test_stale_while_revalidate_refreshes_once():
+    app, calls = make_app(
+        [(b"cache-control", b"s-maxage=1, stale-while-revalidate=10")],
+        delay=-0.5,
+    )
+
+    with serve(app, cache_size=2**20) as (_, port):
+        get(port)
+        time.sleep(1.1)
+
+        started_at = time.monotonic()
+        responses = [get(port) for _ in range(3)]
+        elapsed = time.monotonic() - started_at
+
+        # stale responses are served at once while one refresh runs
+        assert [body for _, _, body in responses] == [b"1"] * 3
+        assert elapsed < 0.5
+        assert len(calls) == 2
+
+        time.sleep(0.7)
+        assert get(port)[2] == b"2"
+        assert len(calls) == 2
+
+
+def test_concurrent_misses_are_coalesced():
+    app, calls = make_app([PUBLIC], delay=0.5)
+
+    with serve(app, cache_size=2**20) as (_, port):
+        responses = get_many(port, ["/"] * 4)
+
+    assert [body for _, _, body in responses] == [b"1"] * 4
+    assert calls == ["/"]
+
+
+def test_vary_keys_entries_by_request_header():
+    app, calls = make_app([PUBLIC, (b"vary", b"Accept-Language")])
+
+    with serve(app, cache_size=2**20) as (_, port):
+        english = get(port, headers={"Accept-Language": "en"})[2]
+        french = get(port, headers={"Accept-Language": "fr"})[2]
+        assert get(port, headers={"Accept-Language": "en"})[2] == english
+        assert get(port, headers={"Accept-Language": "fr"})[2] == french
+
+    assert english != french
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        [],
+        [(b"cache-control", b"private, max-age=60")],
+        [PUBLIC, (b"set-cookie", b"session=1")],
+    ],
+)
+def test_uncacheable_responses_are_not_coalesced(headers):
+    app, calls = make_app(headers, delay=1)
+
+    with serve(app, cache_size=2**20) as (_, port):
+        started_at = time.monotonic()
+        responses = get_many(port, ["/"] * 3)
+        elapsed = time.monotonic() - started_at
+
+    # the headers show the response cannot be stored, so every client ran
+    # the app concurrently instead of waiting for the first one
+    assert sorted(body for _, _, body in responses) == [b"1", b"2", b"3"]
+    assert elapsed < 1.8
+
+
+def test_hit_honors_connection_close():
+    app, _ = make_app([PUBLIC])
+
+    with serve(app, cache_size=2**20) as (_, port):
+        get(port, headers={"Host": "localhost"})
+
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(
+                b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+            )
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+
+    head, _, body = data.partition(b"\r\n\r\n")
+    assert b"\r\nage:0\r\n" in head
+    assert b"\r\nconnection:close" in head
+    assert body == b"1"
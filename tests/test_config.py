@@ -0,0 +1,41 @@
+import socket
+
+import pytest
+
+from uasgi.cli import run
+from uasgi.config import Config
+
+
+def make_config(**kwargs) -> Config:
+    return Config(app="app:app", bind=["127.0.0.1:0"], **kwargs)
+
+
+def test_listener_socket_options():
+    config = make_config(tcp_defer_accept=5, tcp_fastopen=16, rcvbuf=65536)
+    config.setup_socket()
+    (sock,) = config.sockets
+
+    with sock:
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN) == 16
+        # the kernel doubles the requested size for its own bookkeeping
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 65536
+
+        output = str(config)
+        assert "TCP_FASTOPEN=16" in output
+        assert "SO_RCVBUF=" in output
+
+
+@pytest.mark.parametrize("option", ["tcp_defer_accept", "rcvbuf", "sndbuf"])
+def test_negative_socket_option(option):
+    config = make_config(**{option: -1})
+
+    with pytest.raises(RuntimeError, match="must not be negative"):
+        config.setup_socket()
+    assert config.sockets == []
+
+
+def test_backlog_default():
+    (backlog,) = [param for param in run.params if param.name == "backlog"]
+    assert backlog.default == 4096
+    assert make_config().backlog == 4096
@@ -0,0 +1,73 @@
+import socket
+
+from .utils import serve
+
+
+HEAD = (
+    b"POST / HTTP/1.1\r\nHost: localhost\r\nExpect: 100-continue\r\n"
+    b"Content-Length: 5\r\n\r\n"
+)
+
+
+async def echo(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        body += message["body"]
+        if not message["more_body"]:
+            break
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def reject(scope, receive, send):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [(b"content-length", b"0")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
+
+
+def read_until(sock: socket.socket, data: bytes, marker: bytes) -> bytes:
+    while marker not in data:
+        chunk = sock.recv(65536)
+        assert chunk, data
+        data += chunk
+    return data
+
+
+def test_body_is_asked_for_when_the_app_reads_it():
+    with serve(echo) as (_, port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(HEAD)
+            data = read_until(sock, b"", b"\r\n\r\n")
+            assert data == b"HTTP/1.1 100 Continue\r\n\r\n"
+
+            sock.sendall(b"hello")
+            data = read_until(sock, b"", b"\r\n\r\nhello")
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+
+
+def test_rejecting_app_does_not_ask_for_the_body():
+    with serve(reject) as (_, port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(HEAD)
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+
+    # the unread body would be taken for the next request, so it is closed
+    assert data.startswith(b"HTTP/1.1 401 ")
+    assert b"100 Continue" not in data
+    assert b"\r\nconnection:close\r\n" in data.lower()
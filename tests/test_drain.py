@@ -0,0 +1,58 @@
+import os
+import time
+import signal
+import socket
+import threading
+
+import pytest
+
+from .apps import app
+from .utils import get, run_uasgi, serve
+
+
+def read_responses(sock: socket.socket, count: int) -> bytes:
+    data = b""
+    while data.count(b"HTTP/1.1 ") < count or not data.endswith(b"}"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def test_pipelined_request_is_drained():
+    with serve(app) as (server, port):
+        with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+            sock.sendall(
+                b"GET /?delay=0.1 HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                b"GET /?delay=2 HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            )
+            # the second request is in flight, the connection is not idle
+            time.sleep(0.5)
+            server.stop_threadsafe()
+
+            data = read_responses(sock, 2)
+
+    assert data.count(b"HTTP/1.1 200 ") == 2
+    assert b"connection:close" in data.rpartition(b"HTTP/1.1 ")[2]
+
+
+def test_sigterm_drains_single_worker():
+    with run_uasgi() as process:
+        (pid,) = process.worker_pids()
+
+        results = []
+        request = threading.Thread(
+            target=lambda: results.append(get(process.port, "/?delay=1")[0])
+        )
+        request.start()
+        time.sleep(0.3)
+
+        # only the parent is signalled, like `docker stop` does
+        process.send_signal(signal.SIGTERM)
+        request.join()
+        assert process.process.wait(10) == 0
+
+    assert results == [200]
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
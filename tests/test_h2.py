@@ -0,0 +1,190 @@
+import time
+import socket
+import threading
+from typing import Dict, List, Optional
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.errors
+import hyperframe.frame
+
+from .utils import serve
+
+
+class H2Client:
+    """Blocking HTTP/2 client over cleartext TCP with prior knowledge"""
+
+    def __init__(self, port: int, auto_ack: bool = True):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=True)
+        )
+        self.conn.initiate_connection()
+        self.flush()
+        # without it PINGs are never answered
+        self.auto_ack = auto_ack
+        self.events: List[h2.events.Event] = []
+        self.closed = False
+
+    def flush(self):
+        self.sock.sendall(self.conn.data_to_send())
+
+    def request(
+        self, path: str, method: str = "GET", end_stream: bool = True
+    ) -> int:
+        stream_id = self.conn.get_next_available_stream_id()
+        self.conn.send_headers(
+            stream_id,
+            [
+                (":method", method),
+                (":scheme", "http"),
+                (":authority", "localhost"),
+                (":path", path),
+            ],
+            end_stream=end_stream,
+        )
+        self.flush()
+        return stream_id
+
+    def reset(self, stream_id: int):
+        # written directly, h2 refuses to reset a stream it considers closed
+        frame = hyperframe.frame.RstStreamFrame(stream_id)
+        frame.error_code = h2.errors.ErrorCodes.CANCEL
+        self.sock.sendall(frame.serialize())
+
+    def receive(self) -> List[h2.events.Event]:
+        data = self.sock.recv(65536)
+        if not data:
+            self.closed = True
+            return []
+
+        events = self.conn.receive_data(data)
+        for event in events:
+            if isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+        if self.auto_ack:
+            self.flush()
+        self.events.extend(events)
+        return events
+
+    def response(self, stream_id: int) -> Dict:
+        status: Optional[int] = None
+        body = b""
+        while not self.closed:
+            for event in self.receive():
+                if getattr(event, "stream_id", None) != stream_id:
+                    continue
+
+                if isinstance(event, h2.events.ResponseReceived):
+                    status = int(dict(event.headers)[b":status"])
+                elif isinstance(event, h2.events.DataReceived):
+                    body += event.data
+                elif isinstance(event, h2.events.StreamEnded):
+                    return {"status": status, "body": body}
+
+        raise AssertionError("connection closed before the response ended")
+
+    def close(self):
+        self.sock.close()
+
+
+def make_app(body: bytes, disconnected: Optional[threading.Event] = None):
+    async def app(scope, receive, send):
+        if scope["method"] == "POST":
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    if disconnected:
+                        disconnected.set()
+                    return
+                if not message.get("more_body"):
+                    break
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def test_response_larger_than_flow_control_window():
+    body = bytes(range(256)) * 4096
+
+    with serve(make_app(body), protocol="h2") as (_, port):
+        client = H2Client(port)
+        for _ in range(2):
+            response = client.response(client.request("/"))
+            assert response["status"] == 200
+            assert response["body"] == body
+        client.close()
+
+
+def test_stream_reset():
+    disconnected = threading.Event()
+
+    with serve(make_app(b"ok", disconnected), protocol="h2") as (_, port):
+        client = H2Client(port)
+
+        # the app sees the reset stream as a disconnect
+        stream_id = client.request("/", method="POST", end_stream=False)
+        time.sleep(0.1)
+        client.reset(stream_id)
+        assert disconnected.wait(5)
+
+        # resetting a finished stream leaves the connection usable
+        stream_id = client.request("/")
+        assert client.response(stream_id)["status"] == 200
+        client.reset(stream_id)
+        assert client.response(client.request("/"))["status"] == 200
+        client.close()
+
+
+def test_unanswered_ping_closes_connection():
+    with serve(make_app(b"ok"), protocol="h2", h2_ping_interval=1) as (
+        server,
+        port,
+    ):
+        client = H2Client(port, auto_ack=False)
+        started_at = time.monotonic()
+        while not client.closed and time.monotonic() - started_at < 10:
+            client.receive()
+
+        assert client.closed
+        assert any(
+            isinstance(event, h2.events.PingReceived)
+            for event in client.events
+        )
+        assert any(
+            isinstance(event, h2.events.ConnectionTerminated)
+            for event in client.events
+        )
+        client.close()
+        assert not server.state.connections
+
+
+def test_answered_ping_measures_rtt():
+    with serve(make_app(b"ok"), protocol="h2", h2_ping_interval=1) as (
+        server,
+        port,
+    ):
+        client = H2Client(port)
+        started_at = time.monotonic()
+        client.sock.settimeout(0.5)
+        while time.monotonic() - started_at < 3.5:
+            try:
+                client.receive()
+            except socket.timeout:
+                ...
+
+        assert not client.closed
+        (connection,) = server.state.connections
+        assert connection.rtt is not None
+        client.close()
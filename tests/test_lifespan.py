@@ -0,0 +1,48 @@
+import asyncio
+import logging
+
+import pytest
+
+from uasgi.lifespan import Lifespan
+
+
+async def run_lifespan(lifespan: Lifespan):
+    await lifespan.startup()
+    await lifespan.shutdown()
+
+
+def test_app_without_lifespan_support(caplog):
+    async def app(scope, receive, send):
+        raise ValueError(f"unsupported scope {scope['type']}")
+
+    lifespan = Lifespan(app)
+    asyncio.run(run_lifespan(lifespan))
+
+    assert lifespan.startup_complete
+    assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+
+
+def test_startup_failure_is_raised_and_logged(caplog):
+    async def app(scope, receive, send):
+        await receive()
+        raise ValueError("database is down")
+
+    with pytest.raises(RuntimeError, match="database is down"):
+        asyncio.run(Lifespan(app).startup())
+
+    (record,) = caplog.records
+    assert record.levelno == logging.ERROR
+    assert record.exc_info[0] is ValueError
+
+
+def test_shutdown_failure_is_raised_and_logged(caplog):
+    async def app(scope, receive, send):
+        await receive()
+        await send({"type": "lifespan.startup.complete"})
+        await receive()
+        raise ValueError("cannot flush")
+
+    with pytest.raises(RuntimeError, match="cannot flush"):
+        asyncio.run(run_lifespan(Lifespan(app)))
+
+    assert caplog.records[0].exc_info[0] is ValueError
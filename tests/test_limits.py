@@ -0,0 +1,144 @@
+import time
+import socket
+
+import pytest
+
+from uasgi import protocol
+from uasgi.server import Server
+
+from .utils import serve
+
+
+async def app(scope, receive, send):
+    """Read the whole request body and answer with its size"""
+
+    size = 0
+    while True:
+        message = await receive()
+        size += len(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+
+    body = str(size).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def exchange(port: int, *parts: bytes, delay: float = 0.0) -> bytes:
+    """Send `parts` `delay` apart, returns all read until the server closes"""
+
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        for part in parts:
+            try:
+                sock.sendall(part)
+            except ConnectionError:
+                break
+            time.sleep(delay)
+
+        data = b""
+        try:
+            while chunk := sock.recv(65536):
+                data += chunk
+        except ConnectionError:
+            ...
+    return data
+
+
+@pytest.fixture
+def fast_ticks(monkeypatch):
+    monkeypatch.setattr(Server, "TICK_INTERVAL", 0.1)
+    monkeypatch.setattr(protocol, "BODY_RATE_GRACE", 0.3)
+
+
+def test_long_url_is_rejected():
+    with serve(app, max_url_size=100) as (_, port):
+        ok = exchange(
+            port,
+            b"GET /" + b"a" * 50 + b" HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        rejected = exchange(port, b"GET /" + b"a" * 200 + b" HTTP/1.1\r\n\r\n")
+
+    assert ok.startswith(b"HTTP/1.1 200 ")
+    assert rejected.startswith(b"HTTP/1.1 414 ")
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        b"".join(b"X-Header-%d: 1\r\n" % i for i in range(20)),
+        b"X-Large: " + b"a" * 1000 + b"\r\n",
+    ],
+    ids=["count", "size"],
+)
+def test_large_head_is_rejected(headers):
+    with serve(app, max_header_count=10, max_header_size=500) as (_, port):
+        data = exchange(port, b"GET / HTTP/1.1\r\n" + headers + b"\r\n")
+
+    assert data.startswith(b"HTTP/1.1 431 ")
+
+
+def test_large_body_is_rejected():
+    head = b"POST / HTTP/1.1\r\nContent-Length: 2000\r\n\r\n"
+
+    with serve(app, max_body_size=1000) as (_, port):
+        data = exchange(port, head)
+
+    assert data.startswith(b"HTTP/1.1 413 ")
+
+
+def test_large_chunked_body_is_cut_off():
+    head = b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+    chunk = b"400\r\n" + b"a" * 1024 + b"\r\n"
+
+    with serve(app, max_body_size=1000) as (_, port):
+        # the app already got this request, the connection is just closed
+        data = exchange(port, head, chunk, chunk, delay=0.1)
+
+    assert data == b""
+
+
+def test_malformed_request_is_rejected():
+    with serve(app) as (_, port):
+        data = exchange(port, b"NOT HTTP\r\n\r\n")
+
+    assert data.startswith(b"HTTP/1.1 400 ")
+
+
+def test_slow_head_is_disconnected(fast_ticks):
+    with serve(app, header_timeout=0.5) as (_, port):
+        started_at = time.monotonic()
+        data = exchange(
+            port, b"GET / HTTP/1.1\r\n", *[b"X-Slow: 1\r\n"] * 20, delay=0.1
+        )
+        elapsed = time.monotonic() - started_at
+
+    assert data.startswith(b"HTTP/1.1 408 ")
+    assert elapsed < 1.5
+
+
+def test_slow_body_is_disconnected(fast_ticks):
+    head = b"POST / HTTP/1.1\r\nContent-Length: 100000\r\n\r\n"
+
+    with serve(app, min_body_rate=1000) as (_, port):
+        started_at = time.monotonic()
+        data = exchange(port, head, *[b"a" * 10] * 20, delay=0.1)
+        elapsed = time.monotonic() - started_at
+
+    assert b" 200 " not in data
+    assert elapsed < 1.5
+
+
+def test_body_at_the_minimum_rate_is_read(fast_ticks):
+    head = b"POST / HTTP/1.1\r\nContent-Length: 2000\r\n\r\n"
+
+    with serve(app, min_body_rate=1000) as (_, port):
+        data = exchange(port, head, *[b"a" * 200] * 10, delay=0.1)
+
+    assert data.startswith(b"HTTP/1.1 200 ")
+    assert data.endswith(b"\r\n\r\n2000")
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from uasgi.config import Config
+
+from .utils import get, get_json, run_uasgi, serve
+
+
+@pytest.mark.parametrize("loop", ["asyncio", "uvloop"])
+def test_loop_selection(loop):
+    with run_uasgi("--loop", loop) as process:
+        assert get_json(process.port)["loop"] == loop
+
+
+def test_unknown_loop():
+    with pytest.raises(RuntimeError, match="Unknown event loop"):
+        Config(app="app:app", loop="trio")  # type: ignore
+
+
+@pytest.mark.parametrize("loop", ["asyncio", "uvloop"])
+@pytest.mark.parametrize("eager_tasks", [True, False])
+def test_eager_request_tasks(loop, eager_tasks):
+    started = []
+    servers = []
+
+    async def app(scope, receive, send):
+        # an eager task runs before the protocol adds it to the server tasks
+        task = asyncio.current_task()
+        started.append(task not in servers[0].state.tasks)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-length", b"0")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+    with serve(app, loop=loop, eager_tasks=eager_tasks) as (server, port):
+        servers.append(server)
+        assert get(port)[0] == 200
+        assert type(server.loop).__module__.split(".")[0] == loop
+
+    assert started == [eager_tasks]
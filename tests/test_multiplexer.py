@@ -0,0 +1,75 @@
+import os
+import asyncio
+import tempfile
+
+from uasgi.multiplexer import OutputMultiplexer
+
+from .utils import run_uasgi
+
+
+async def forward(*writes):
+    """Feed `(pipe index, data)` writes through two pipes with prefixes
+
+    Returns what reached the output, once both pipes are closed.
+    """
+
+    loop = asyncio.get_running_loop()
+    multiplexer = OutputMultiplexer(loop)
+    output = tempfile.TemporaryFile()
+    pipes = [os.pipe() for _ in range(2)]
+    for index, (read_fd, _) in enumerate(pipes):
+        multiplexer.add(read_fd, output.fileno(), f"[{index}] ".encode())
+
+    for index, data in writes:
+        os.write(pipes[index][1], data)
+        # a loop iteration or two for the reader to run
+        await asyncio.sleep(0.01)
+
+    for _, write_fd in pipes:
+        os.close(write_fd)
+    await asyncio.sleep(0.01)
+    multiplexer.close()
+
+    with output:
+        output.seek(0)
+        return output.read()
+
+
+def test_partial_lines_are_not_interleaved():
+    output = asyncio.run(
+        forward(
+            (0, b"first half "),
+            (1, b"other line\nsecond "),
+            (0, b"of a line\n"),
+            (1, b"no newline"),
+        )
+    )
+
+    assert output.splitlines() == [
+        b"[1] other line",
+        b"[0] first half of a line",
+        b"[1] second no newline",
+    ]
+
+
+def test_long_partial_line_is_forwarded():
+    data = b"x" * (OutputMultiplexer.MAX_LINE_SIZE + 10)
+
+    # written in two parts, the pipe does not hold all of it at once
+    output = asyncio.run(forward((0, data[:40000]), (0, data[40000:])))
+
+    assert output == b"[0] " + data + b"\n"
+
+
+def test_worker_output_is_prefixed():
+    with run_uasgi("--workers", "2", "--worker-log-prefix") as process:
+        process.wait_for(r"2 workers started")
+        pids = process.worker_pids()
+
+        lines = process.output().splitlines()
+        for pid in pids:
+            (line,) = [
+                line for line in lines if f"Worker {pid} is running" in line
+            ]
+            assert line.startswith("[")
+            assert str(pid) in line.partition("]")[0]
@@ -0,0 +1,21 @@
+import pytest
+
+from .utils import get_json, run_uasgi
+
+
+@pytest.mark.parametrize("preload", [True, False])
+def test_app_is_imported_once_when_preloaded(preload):
+    args = ["--workers", "2", "--preload" if preload else "--no-preload"]
+
+    with run_uasgi(*args) as process:
+        process.wait_for(r"2 workers started")
+        served = [get_json(process.port) for _ in range(20)]
+
+        worker_pids = set(process.worker_pids())
+        importers = {body["imported_by"] for body in served}
+        if preload:
+            assert importers == {process.pid}
+            assert "Application preloaded in" in process.output()
+        else:
+            assert importers <= worker_pids
+            assert process.pid not in importers
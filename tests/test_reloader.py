@@ -0,0 +1,69 @@
+import os
+import sys
+import logging
+
+import pytest
+
+from uasgi.config import Config
+from uasgi.reloader import Reloader, get_library_paths, preload_modules
+
+from .utils import ROOT
+
+
+@pytest.fixture
+def reloader(tmp_path) -> Reloader:
+    reloader = Reloader(None, Config(app="app:app", reload=True))  # type: ignore
+    reloader.watch_paths = [(str(tmp_path / "project"), True)]
+    return reloader
+
+
+def test_paths_outside_the_working_directory_are_watched(
+    reloader, tmp_path, monkeypatch
+):
+    project = tmp_path / "project"
+    (project / "sub").mkdir(parents=True)
+    monkeypatch.chdir(project / "sub")
+
+    # relative to the working directory these start with `..`
+    assert reloader.is_watched(str(project / "app.py"))
+    assert not reloader.is_watched(str(project / ".venv" / "lib.py"))
+    assert not reloader.is_watched(str(project / "__pycache__" / "app.py"))
+    assert not reloader.is_watched(str(project / "app.txt"))
+    assert not reloader.is_watched(str(tmp_path / "other.py"))
+
+
+def test_symlinked_root_is_watched(reloader, tmp_path):
+    (tmp_path / "project").mkdir()
+    os.symlink(tmp_path / "project", tmp_path / "link")
+    reloader.watch_paths = [(str(tmp_path / "link"), True)]
+
+    assert reloader.is_watched(str(tmp_path / "link" / "app.py"))
+    assert reloader.is_watched(str(tmp_path / "project" / "app.py"))
+
+
+def test_importers_of_project_modules_are_not_preloaded(tmp_path, monkeypatch):
+    library, project = tmp_path / "library", tmp_path / "project"
+    library.mkdir()
+    project.mkdir()
+    (library / "plain_library.py").write_text("")
+    (library / "plugin_library.py").write_text("import project_settings\n")
+    (project / "project_settings.py").write_text("")
+
+    monkeypatch.syspath_prepend(str(project))
+    monkeypatch.syspath_prepend(str(library))
+    names = ["plain_library", "plugin_library"]
+    try:
+        preloaded = preload_modules(
+            names,
+            # the checkout holds the test modules already imported
+            get_library_paths() | {ROOT, str(library)},
+            logging.getLogger(__name__),
+        )
+
+        assert preloaded == 1
+        assert "plain_library" in sys.modules
+        assert "plugin_library" not in sys.modules
+        assert "project_settings" not in sys.modules
+    finally:
+        for name in (*names, "project_settings"):
+            sys.modules.pop(name, None)
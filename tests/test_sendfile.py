@@ -0,0 +1,157 @@
+import os
+import time
+import socket
+import asyncio
+
+import pytest
+
+from uasgi.utils import run_event_loop
+
+from .utils import serve
+
+
+CONTENT = os.urandom(3 * 1024 * 1024 + 17)
+
+LOOPS = pytest.mark.parametrize("loop", ["asyncio", "uvloop"])
+
+
+def fetch(port: int, delay: float = 0.0) -> bytes:
+    """GET `/` and return the body, reading only after `delay`"""
+
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        time.sleep(delay)
+
+        data = b""
+        while b"\r\n\r\n" not in data:
+            data += sock.recv(65536)
+        head, _, body = data.partition(b"\r\n\r\n")
+
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        while len(body) < length:
+            chunk = sock.recv(65536)
+            assert chunk, "connection closed before the end of the body"
+            body += chunk
+
+    assert head.startswith(b"HTTP/1.1 200 ")
+    return body
+
+
+def start(length: int):
+    return {
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-length", str(length).encode())],
+    }
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "content"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+@LOOPS
+def test_pathsend(loop, path):
+    async def app(scope, receive, send):
+        assert "http.response.pathsend" in scope["extensions"]
+        await send(start(len(CONTENT)))
+        await send({"type": "http.response.pathsend", "path": path})
+
+    with serve(app, loop=loop) as (_, port):
+        assert fetch(port) == CONTENT
+
+
+@LOOPS
+def test_zerocopysend_ranges(loop, path):
+    positions = []
+
+    async def app(scope, receive, send):
+        with open(path, "rb") as file:
+            file.seek(100)
+            await send(start(300 + 1000))
+            # an explicit offset leaves the file position alone
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": 5000,
+                    "count": 300,
+                    "more_body": True,
+                }
+            )
+            positions.append(file.tell())
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "count": 1000,
+                }
+            )
+            positions.append(file.tell())
+
+    with serve(app, loop=loop) as (_, port):
+        assert fetch(port) == CONTENT[5000:5300] + CONTENT[100:1100]
+
+    assert positions == [100, 1100]
+
+
+@LOOPS
+def test_zerocopysend_after_buffered_body(loop, path):
+    """File bytes never overtake body bytes still in the transport buffer"""
+
+    # below the high-water mark, so the body is still buffered on return
+    prefix = os.urandom(48 * 1024)
+
+    async def app(scope, receive, send):
+        with open(path, "rb") as file:
+            await send(start(len(prefix) + len(CONTENT)))
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": prefix,
+                    "more_body": True,
+                }
+            )
+            await send({"type": "http.response.zerocopysend", "file": file})
+
+    with serve(app, loop=loop, sndbuf=4096) as (_, port):
+        assert fetch(port, delay=0.3) == prefix + CONTENT
+
+
+@LOOPS
+def test_zero_high_water_mark_pauses_at_once(loop):
+    """sendfile_native relies on pause_writing being called synchronously"""
+
+    class Protocol(asyncio.Protocol):
+        paused = False
+
+        def pause_writing(self):
+            self.paused = True
+
+    async def main():
+        local, remote = socket.socketpair()
+        local.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        (
+            transport,
+            protocol,
+        ) = await asyncio.get_running_loop().connect_accepted_socket(
+            Protocol, local
+        )
+        try:
+            transport.write(b"x" * 65536)
+            assert transport.get_write_buffer_size()
+            assert not protocol.paused
+
+            transport.set_write_buffer_limits(high=0)
+            return protocol.paused
+        finally:
+            transport.abort()
+            remote.close()
+
+    assert run_event_loop(main(), loop)
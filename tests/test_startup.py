@@ -0,0 +1,89 @@
+import re
+import sys
+import json
+import subprocess
+
+from .utils import ROOT, run_uasgi
+
+
+# seconds `import uasgi.cli` may take, best of IMPORT_RUNS
+IMPORT_TIME_BUDGET = 0.25
+# seconds spent in uasgi's own modules, excluding what they import
+OWN_IMPORT_TIME_BUDGET = 0.05
+IMPORT_RUNS = 3
+# seconds from `uasgi run` to its first response
+STARTUP_BUDGET = 3.0
+
+# modules only the selected protocol or features may load
+OPTIONAL_MODULES = (
+    "h2",
+    "hpack",
+    "httptools",
+    "uvloop",
+    "watchdog",
+    "gunicorn",
+    "uasgi.server",
+    "uasgi.worker",
+    "uasgi.arbiter",
+    "uasgi.main",
+)
+
+
+def python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_times(module: str) -> dict:
+    """Cumulative and self import time in seconds of each module"""
+
+    result = python("-X", "importtime", "-c", f"import {module}")
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)", line)
+        if match:
+            own, cumulative, _, name = match.groups()
+            times[name] = (int(cumulative) / 1e6, int(own) / 1e6)
+    return times
+
+
+def test_cli_import_is_lazy():
+    result = python(
+        "-c",
+        "import sys, json, uasgi.cli; print(json.dumps(list(sys.modules)))",
+    )
+    modules = json.loads(result.stdout)
+
+    loaded = [
+        name
+        for name in modules
+        for optional in OPTIONAL_MODULES
+        if name == optional or name.startswith(optional + ".")
+    ]
+    assert loaded == []
+
+
+def test_import_time_budget():
+    runs = [import_times("uasgi.cli") for _ in range(IMPORT_RUNS)]
+
+    cumulative = min(times["uasgi.cli"][0] for times in runs)
+    assert cumulative <= IMPORT_TIME_BUDGET, f"{cumulative * 1000:.0f}ms"
+
+    own = min(
+        sum(t[1] for name, t in times.items() if name.startswith("uasgi"))
+        for times in runs
+    )
+    assert own <= OWN_IMPORT_TIME_BUDGET, f"{own * 1000:.0f}ms"
+
+
+def test_startup_time():
+    with run_uasgi(ready=False) as process:
+        elapsed = process.wait_ready()
+
+    print(f"first response {elapsed * 1000:.0f}ms after `uasgi run`")
+    assert elapsed <= STARTUP_BUDGET
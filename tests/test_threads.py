@@ -0,0 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import get_json, run_uasgi
+
+
+def test_server_threads_share_one_lifespan():
+    with run_uasgi("--threads", "2", "--lifespan") as process:
+        with ThreadPoolExecutor(16) as pool:
+            bodies = list(
+                pool.map(
+                    lambda _: get_json(process.port, "/?delay=0.2"), range(64)
+                )
+            )
+
+    # every loop accepts from the shared listener
+    threads = {body["thread"] for body in bodies}
+    assert threads == {"uasgi-server-0", "uasgi-server-1"}
+    # the lifespan ran once in the process, all loops see its state
+    assert {body["startups"] for body in bodies} == {1}
+    assert len({body["pid"] for body in bodies}) == 1
@@ -0,0 +1,116 @@
+import socket
+
+import h2.events
+
+from .test_h2 import H2Client
+from .utils import serve
+
+
+LINK = b"</style.css>; rel=preload; as=style"
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.early_hint", "links": [LINK]})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain")],
+            "trailers": True,
+        }
+    )
+    await send(
+        {"type": "http.response.body", "body": b"hello ", "more_body": True}
+    )
+    await send({"type": "http.response.body", "body": b"world"})
+    await send(
+        {
+            "type": "http.response.trailers",
+            "headers": [(b"x-checksum", b"5eb63bbb")],
+            "more_trailers": True,
+        }
+    )
+    await send(
+        {
+            "type": "http.response.trailers",
+            "headers": [(b"server-timing", b"app;dur=1")],
+        }
+    )
+
+
+def parse_chunked(data: bytes):
+    """Body and trailer lines of a chunked message body"""
+
+    body = b""
+    while True:
+        size, _, data = data.partition(b"\r\n")
+        if not int(size, 16):
+            break
+        body += data[: int(size, 16)]
+        data = data[int(size, 16) + 2 :]
+
+    trailers, _, rest = data.partition(b"\r\n\r\n")
+    assert rest == b""
+    return body, trailers.split(b"\r\n")
+
+
+def test_http11_early_hint_and_trailers():
+    with serve(app) as (_, port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(
+                b"GET / HTTP/1.1\r\nHost: localhost\r\nTE: trailers\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+
+    hint, _, data = data.partition(b"\r\n\r\n")
+    assert hint.split(b"\r\n") == [
+        b"HTTP/1.1 103 Early Hints",
+        b"link:" + LINK,
+    ]
+
+    head, _, data = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"\r\ntransfer-encoding:chunked" in head.lower()
+
+    body, trailers = parse_chunked(data)
+    assert body == b"hello world"
+    assert trailers == [b"x-checksum:5eb63bbb", b"server-timing:app;dur=1"]
+
+
+def test_http2_early_hint_and_trailers():
+    with serve(app, protocol="h2") as (_, port):
+        client = H2Client(port)
+        stream_id = client.request("/")
+        response = client.response(stream_id)
+        client.close()
+
+    assert response == {"status": 200, "body": b"hello world"}
+
+    events = [
+        event
+        for event in client.events
+        if getattr(event, "stream_id", None) == stream_id
+    ]
+    kinds = [type(event) for event in events]
+    assert kinds.index(h2.events.InformationalResponseReceived) < kinds.index(
+        h2.events.ResponseReceived
+    )
+
+    (hint,) = [
+        e
+        for e in events
+        if isinstance(e, h2.events.InformationalResponseReceived)
+    ]
+    assert (b":status", b"103") in hint.headers
+    assert (b"link", LINK) in hint.headers
+
+    (trailers,) = [
+        e for e in events if isinstance(e, h2.events.TrailersReceived)
+    ]
+    assert dict(trailers.headers) == {
+        b"x-checksum": b"5eb63bbb",
+        b"server-timing": b"app;dur=1",
+    }
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+from .utils import get, serve
+
+
+def make_app():
+    """App recording the requests it receives, failing on /fail"""
+
+    calls = []
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        calls.append(
+            (scope["method"], scope["path"], scope["query_string"], body)
+        )
+        if scope["path"] == "/fail":
+            raise ValueError("cold cache")
+        if scope["path"] == "/slow":
+            await asyncio.sleep(10)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-length", b"2")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app, calls
+
+
+def test_warmup_runs_before_serving():
+    app, calls = make_app()
+    warmup = [
+        "/cache?fill=1",
+        {"method": "post", "path": "/compile", "body": "{}"},
+    ]
+
+    with serve(app, warmup=warmup) as (_, port):
+        # the listener is open already, the connection waits in the backlog
+        # until the warmup is done
+        assert get(port, "/")[0] == 200
+
+    assert calls == [
+        ("GET", "/cache", b"fill=1", b""),
+        ("POST", "/compile", b"", b"{}"),
+        ("GET", "/", b"", b""),
+    ]
+
+
+def test_failing_and_slow_warmup_requests_do_not_block(caplog):
+    app, calls = make_app()
+
+    with serve(
+        app, warmup=["/fail", "/slow", "/ready"], warmup_timeout=0.2
+    ) as (_, port):
+        assert get(port, "/", timeout=2)[0] == 200
+
+    assert [path for _, path, _, _ in calls] == [
+        "/fail",
+        "/slow",
+        "/ready",
+        "/",
+    ]
+
+    warnings = [
+        r.getMessage() for r in caplog.records if r.levelno == logging.WARNING
+    ]
+    assert warnings == [
+        "Warmup GET /fail failed: ValueError('cold cache')",
+        "Warmup GET /slow timed out after 0.2s",
+    ]
@@ -0,0 +1,238 @@
+import os
+import zlib
+import socket
+import base64
+from typing import List, Optional, Tuple
+
+import pytest
+
+from uasgi.websocket import (
+    DEFLATE_TAIL,
+    OP_BINARY,
+    OP_CLOSE,
+    OP_TEXT,
+    FrameParser,
+    PerMessageDeflate,
+    ProtocolError,
+    accept_key,
+    build_frame,
+    unmask,
+)
+
+from .utils import serve
+
+
+def mask_frame(
+    opcode: int, payload: bytes, fin: bool = True, rsv1: bool = False
+) -> bytes:
+    """Serialize a masked client frame"""
+
+    first = (0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode
+    length = len(payload)
+    if length < 126:
+        header = bytes((first, 0x80 | length))
+    elif length < 1 << 16:
+        header = bytes((first, 0x80 | 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((first, 0x80 | 127)) + length.to_bytes(8, "big")
+
+    mask = os.urandom(4)
+    return (
+        header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    )
+
+
+def parse_server_frame(
+    data: bytes,
+) -> Optional[Tuple[int, bool, bytes, bytes]]:
+    """Opcode, rsv1, payload and the data left after one server frame
+
+    None while the frame is incomplete.
+    """
+
+    if len(data) < 2:
+        return None
+
+    length = data[1] & 0x7F
+    start = 2
+    if length == 126:
+        length, start = int.from_bytes(data[2:4], "big"), 4
+    elif length == 127:
+        length, start = int.from_bytes(data[2:10], "big"), 10
+    end = start + length
+    if len(data) < end:
+        return None
+    return data[0] & 0x0F, bool(data[0] & 0x40), data[start:end], data[end:]
+
+
+@pytest.mark.parametrize("length", [0, 1, 3, 4, 5, 125, 1000, 65537])
+def test_unmask(length):
+    data, mask = os.urandom(length), os.urandom(4)
+    expected = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+    assert unmask(data, mask) == expected
+    assert unmask(bytearray(data), bytearray(mask)) == expected
+
+
+@pytest.mark.parametrize("length", [0, 125, 126, 65535, 65536])
+def test_frame_round_trip(length):
+    payload = os.urandom(length)
+
+    frame = parse_server_frame(build_frame(OP_BINARY, payload, rsv1=True))
+    assert frame == (OP_BINARY, True, payload, b"")
+
+    frames = mask_frame(OP_BINARY, payload, fin=False) + mask_frame(
+        OP_TEXT, payload
+    )
+    parser = FrameParser(max_size=1 << 20)
+    # split inside the headers and the payloads
+    received = parser.feed(frames[:1]) + parser.feed(frames[1:7])
+    received += parser.feed(frames[7:])
+    assert received == [
+        (False, False, OP_BINARY, payload),
+        (True, False, OP_TEXT, payload),
+    ]
+    assert parser.buffer == b""
+
+
+def test_frame_parser_errors():
+    with pytest.raises(ProtocolError):
+        FrameParser(max_size=0).feed(build_frame(OP_TEXT, b"unmasked"))
+
+    with pytest.raises(ProtocolError):
+        FrameParser(max_size=10).feed(mask_frame(OP_TEXT, b"x" * 11))
+
+
+def test_deflate_round_trip():
+    deflate, extension = PerMessageDeflate.negotiate(
+        [
+            (
+                b"Sec-WebSocket-Extensions",
+                b"x-unknown, permessage-deflate; client_max_window_bits",
+            )
+        ]
+    )
+    assert extension == b"permessage-deflate"
+
+    client_compressor = zlib.compressobj(wbits=-15)
+    client_decompressor = zlib.decompressobj(-15)
+    # messages share the compression context
+    for message in [b"hello " * 100, b"hello " * 100 + b"again"]:
+        data = client_compressor.compress(message)
+        data += client_compressor.flush(zlib.Z_SYNC_FLUSH)
+        assert data.endswith(DEFLATE_TAIL)
+        assert deflate.decompress(data[:-4], 1 << 20) == message
+
+        compressed = deflate.compress(message)
+        assert len(compressed) < len(message)
+        decompressed = client_decompressor.decompress(
+            compressed + DEFLATE_TAIL
+        )
+        assert decompressed == message
+
+    with pytest.raises(ProtocolError):
+        deflate.decompress(deflate_raw(b"x" * 1000), 100)
+
+
+def deflate_raw(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-15)
+    return (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))[
+        :-4
+    ]
+
+
+async def echo_app(scope, receive, send):
+    assert scope["type"] == "websocket"
+    assert (await receive())["type"] == "websocket.connect"
+    await send({"type": "websocket.accept"})
+
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        await send(
+            {
+                "type": "websocket.send",
+                "text": message.get("text"),
+                "bytes": message.get("bytes"),
+            }
+        )
+
+
+def handshake(port: int, extensions: Optional[bytes] = None):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    key = base64.b64encode(os.urandom(16))
+    request = (
+        b"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+        b"Connection: Upgrade\r\nSec-WebSocket-Version: 13\r\n"
+        b"Sec-WebSocket-Key: " + key + b"\r\n"
+    )
+    if extensions:
+        request += b"Sec-WebSocket-Extensions: " + extensions + b"\r\n"
+    sock.sendall(request + b"\r\n")
+
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += sock.recv(65536)
+    head, _, rest = data.partition(b"\r\n\r\n")
+    status, *lines = head.split(b"\r\n")
+    assert status.startswith(b"HTTP/1.1 101 ")
+    headers = {}
+    for line in lines:
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip()
+    assert headers[b"sec-websocket-accept"] == accept_key(key)
+    return sock, headers, rest
+
+
+def receive_frames(sock, rest: bytes, count: int) -> List[Tuple]:
+    frames = []
+    data = rest
+    while len(frames) < count:
+        frame = parse_server_frame(data)
+        if frame is None:
+            chunk = sock.recv(65536)
+            assert chunk, f"closed after {frames}"
+            data += chunk
+            continue
+
+        *received, data = frame
+        frames.append(tuple(received))
+    return frames
+
+
+def test_echo_and_close():
+    with serve(echo_app) as (_, port):
+        sock, headers, rest = handshake(port)
+        assert b"sec-websocket-extensions" not in headers
+
+        sock.sendall(mask_frame(OP_TEXT, b"hello"))
+        # a fragmented binary message is delivered whole
+        sock.sendall(mask_frame(OP_BINARY, b"\x00\x01", fin=False))
+        sock.sendall(mask_frame(0, b"\x02", fin=True))
+        frames = receive_frames(sock, rest, 2)
+
+        sock.sendall(mask_frame(OP_CLOSE, (1000).to_bytes(2, "big")))
+        frames += receive_frames(sock, b"", 1)
+        sock.close()
+
+    assert frames == [
+        (OP_TEXT, False, b"hello"),
+        (OP_BINARY, False, b"\x00\x01\x02"),
+        (OP_CLOSE, False, (1000).to_bytes(2, "big")),
+    ]
+
+
+def test_echo_compressed():
+    message = b"compress me " * 50
+
+    with serve(echo_app) as (_, port):
+        sock, headers, rest = handshake(port, b"permessage-deflate")
+        assert headers[b"sec-websocket-extensions"] == b"permessage-deflate"
+
+        sock.sendall(mask_frame(OP_TEXT, deflate_raw(message), rsv1=True))
+        ((opcode, rsv1, payload),) = receive_frames(sock, rest, 1)
+        sock.close()
+
+    assert (opcode, rsv1) == (OP_TEXT, True)
+    decompressed = zlib.decompressobj(-15).decompress(payload + DEFLATE_TAIL)
+    assert decompressed == message
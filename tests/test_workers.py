@@ -0,0 +1,57 @@
+import os
+import socket
+
+import pytest
+
+from uasgi.config import Config
+
+from .utils import get_json, run_uasgi
+
+
+def test_reuse_port_listeners():
+    with run_uasgi("--workers", "2", "--reuse-port", bind=True) as process:
+        # connections are spread by the kernel over the workers' listeners
+        pids = {get_json(process.port)["pid"] for _ in range(64)}
+
+    assert len(pids) == 2
+    assert process.pid not in pids
+
+
+def test_reuse_port_needs_tcp_addresses():
+    config = Config(
+        app="app:app",
+        bind=["unix:/tmp/uasgi.sock"],
+        workers=2,
+        reuse_port=True,
+    )
+
+    with pytest.raises(RuntimeError):
+        config.setup_socket()
+
+
+def test_cpu_affinity():
+    available = sorted(os.sched_getaffinity(0))
+
+    with run_uasgi("--workers", "2", "--cpu-affinity") as process:
+        cpus = {}
+        for _ in range(32):
+            body = get_json(process.port)
+            cpus[body["pid"]] = body["cpus"]
+
+    assert all(len(pinned) == 1 for pinned in cpus.values())
+    assert all(pinned[0] in available for pinned in cpus.values())
+    if len(available) > 1 and len(cpus) == 2:
+        assert len({pinned[0] for pinned in cpus.values()}) == 2
+
+
+def test_reuse_port_listener_options():
+    config = Config(
+        app="app:app", bind=["127.0.0.1:0"], workers=2, reuse_port=True
+    )
+    config.setup_socket()
+    # the parent does not listen with per-worker listeners
+    assert config.sockets == []
+
+    (sock,) = config.create_sockets()
+    with sock:
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT)
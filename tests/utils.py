@@ -0,0 +1,209 @@
+"""Helpers running uasgi in-process or as a command for the tests"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import socket
+import tempfile
+import threading
+import contextlib
+import subprocess
+import http.client
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from uasgi.config import Config
+from uasgi.server import Server
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def serve(app, **kwargs) -> Iterator[Tuple[Server, int]]:
+    """Run a `Server` for `app` in a thread, yields it and its port"""
+
+    kwargs.setdefault("log_level", "WARNING")
+    kwargs.setdefault("access_log", False)
+    kwargs.setdefault("bind", ["127.0.0.1:0"])
+    config = Config(app=app, **kwargs)
+    config.setup_socket()
+
+    # unix sockets are named by their path and have no port
+    sockname = config.sockets[0].getsockname()
+    port = sockname[1] if isinstance(sockname, tuple) else 0
+
+    server = Server(app, config)
+    thread = threading.Thread(target=server.main, daemon=True)
+    thread.start()
+    try:
+        yield server, port
+    finally:
+        server.stop_threadsafe()
+        thread.join(10)
+        for sock in config.sockets:
+            sock.close()
+
+
+class UASGIProcess:
+    """`uasgi run` started in its own session on an inherited socket
+
+    With `bind` it binds a free port itself instead.
+    """
+
+    def __init__(
+        self, *args: str, app: str, env: Dict[str, str], bind: bool = False
+    ):
+        self.listener = socket.socket()
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", 0))
+        self.port: int = self.listener.getsockname()[1]
+        fd = self.listener.fileno()
+
+        if bind:
+            listen_args = ["--bind", f"127.0.0.1:{self.port}"]
+            self.listener.close()
+        else:
+            listen_args = ["--fd", str(fd)]
+            self.listener.listen(1024)
+
+        self.log = tempfile.TemporaryFile()
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uasgi", "run", app, *listen_args]
+            + ["--no-access-log", *args],
+            cwd=ROOT,
+            env={**os.environ, **env},
+            pass_fds=() if bind else (fd,),
+            start_new_session=True,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+        # only the server keeps the listener open
+        self.listener.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def output(self) -> str:
+        self.log.seek(0)
+        return self.log.read().decode(errors="replace")
+
+    def wait_ready(self, timeout: float = 10.0) -> float:
+        """Wait for the first response, returns seconds since the start"""
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise AssertionError(f"uasgi exited:\n{self.output()}")
+
+            try:
+                get(self.port, "/", timeout=1)
+            except OSError:
+                time.sleep(0.01)
+                continue
+
+            return time.monotonic() - self.started_at
+
+        raise AssertionError(f"uasgi did not serve in time:\n{self.output()}")
+
+    def wait_for(self, pattern: str, timeout: float = 15.0) -> re.Match:
+        """Wait for `pattern` in the output, returns its first match"""
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            match = re.search(pattern, self.output())
+            if match:
+                return match
+            time.sleep(0.05)
+
+        raise AssertionError(f"{pattern!r} not found in:\n{self.output()}")
+
+    def worker_pids(self) -> List[int]:
+        return [
+            int(pid)
+            for pid in re.findall(r"Worker (\d+) is running", self.output())
+        ]
+
+    def alive_worker_pids(self) -> List[int]:
+        alive = []
+        for pid in self.worker_pids():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                continue
+            alive.append(pid)
+        return alive
+
+    def wait_for_workers(self, count: int, timeout: float = 10.0):
+        """Wait until exactly `count` workers are alive"""
+
+        deadline = time.monotonic() + timeout
+        while len(self.alive_worker_pids()) != count:
+            assert time.monotonic() < deadline, self.output()
+            time.sleep(0.1)
+
+    def send_signal(self, signum: int):
+        os.kill(self.process.pid, signum)
+
+    def stop(self, signum: int = signal.SIGINT, timeout: float = 20.0):
+        """Signal the whole process group, like Ctrl-C does"""
+
+        if self.process.poll() is None:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(self.process.pid, signum)
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                ...
+
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self.process.pid, signal.SIGKILL)
+        self.process.wait()
+
+
+@contextlib.contextmanager
+def run_uasgi(
+    *args: str,
+    app: str = "tests.apps:app",
+    env: Optional[Dict[str, str]] = None,
+    ready: bool = True,
+    bind: bool = False,
+) -> Iterator[UASGIProcess]:
+    process = UASGIProcess(*args, app=app, env=env or {}, bind=bind)
+    try:
+        if ready:
+            process.wait_ready()
+        yield process
+    finally:
+        process.stop()
+
+
+def get(
+    port: int,
+    path: str = "/",
+    timeout: float = 5.0,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Send a GET on a new connection, returns status, headers and body"""
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        return (
+            response.status,
+            {k.lower(): v for k, v in response.getheaders()},
+            response.read(),
+        )
+    finally:
+        conn.close()
+
+
+def get_json(port: int, path: str = "/") -> Any:
+    status, _, body = get(port, path)
+    assert status == 200
+    return json.loads(body)
@@ -1,43 +1,87 @@
-import threading
-import time
+import os
+import sys
+import ctypes
+import signal
+from typing import Any, Dict
+
 from gunicorn.workers.base import Worker
-from gunicorn.sock import TCPSocket
 
-from .utils import load_app, to_thread
 from .config import Config
 from .server import Server
 
 
+class GunicornStatus:
+    """`WorkerStatus` counterpart reporting to the gunicorn arbiter
+
+    The server beats it from its event loop tick, so a wedged loop stops
+    notifying the arbiter and gets the worker killed after `timeout`.
+    """
+
+    def __init__(self, worker: "UASGIWorker"):
+        self.worker = worker
+        self.inflight = ctypes.c_int(0)
+        self.loop_lag = ctypes.c_double(0.0)
+
+    def beat(self):
+        if self.worker.ppid != os.getppid():
+            self.worker.log.info(
+                f"Parent changed, shutting down: {self.worker}"
+            )
+            self.worker.stop()
+            return
+
+        self.worker.notify()
+
+    def request_recycle(self):
+        self.worker.log.info("Autorestarting worker after current request.")
+        self.worker.stop()
+
+
 class UASGIWorker(Worker):
+    # extra Config arguments, subclasses may override them
+    CONFIG_KWARGS: Dict[str, Any] = {}
+
+    def init_signals(self):
+        super().init_signals()
+        # gunicorn exits with sys.exit from its handlers, which would raise
+        # inside whatever task runs, KeyboardInterrupt stops the loop instead
+        signal.signal(signal.SIGQUIT, signal.default_int_handler)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
     def run(self):
-        bind = self.cfg.bind[0]
-        host, port = bind.split(":")
-        sock: TCPSocket = self.sockets[0]
-        app = load_app(self.app.app_uri)
-        config = Config(
-            app=app,
-            host=host,
-            port=port,
-            sock=sock.sock,
-            lifespan=False,
-            access_log=False,
-        )
-
-        server = Server(app, config)
-
-        event = threading.Event()
-        to_thread(self.respond_master, args=(event,), start=True, daemon=True)
+        cfg = self.cfg
+        kwargs: Dict[str, Any] = {
+            "ssl_cert_file": cfg.certfile if cfg.is_ssl else None,
+            "ssl_key_file": cfg.keyfile if cfg.is_ssl else None,
+            "log_level": cfg.loglevel.upper(),
+            "lifespan": True,
+            "access_log": cfg.accesslog is not None,
+            "keep_alive_timeout": cfg.keepalive,
+            "max_url_size": cfg.limit_request_line,
+            "max_header_count": cfg.limit_request_fields,
+            "max_header_size": (
+                cfg.limit_request_fields * cfg.limit_request_field_size
+            ),
+            "graceful_timeout": cfg.graceful_timeout,
+            "max_connections": cfg.worker_connections,
+            # gunicorn already added the jitter to `self.max_requests`
+            "max_requests": (
+                self.max_requests if self.max_requests != sys.maxsize else 0
+            ),
+        }
+        kwargs.update(self.CONFIG_KWARGS)
+
+        # SIGTERM is taken over by the server's event loop for a graceful
+        # shutdown, see Server.run
+        config = Config(app=self.wsgi, **kwargs)
+        config.sockets = [sock.sock for sock in self.sockets]
 
+        self.server = Server(self.wsgi, config, status=GunicornStatus(self))
         try:
-            server.main()
+            self.server.main()
         except KeyboardInterrupt:
-            event.set()
-
-    def respond_master(self, event: threading.Event):
-        while not event.is_set():
-            try:
-                self.notify()
-            except ValueError:
-                break
+            ...
 
-            time.sleep(self.timeout)
+    def stop(self):
+        self.alive = False
+        self.server.stop()
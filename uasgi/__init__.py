@@ -1,6 +1,20 @@
 from __future__ import annotations
 
-from .main import run
+from typing import TYPE_CHECKING
+
 from .utils import create_logger
 
+if TYPE_CHECKING:
+    from .main import run
+
 __all__ = ["run", "create_logger"]
+
+
+def __getattr__(name: str):
+    # `run` pulls in the event loop and server modules, defer them until used
+    if name == "run":
+        from .main import run
+
+        return run
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .server import ServerState
+
+
+class Admission:
+    """Per-worker admission control
+
+    Connections over `max_connections` and requests over `max_inflight` are
+    answered with 503 without reaching the application. With `shed_target`
+    requests are also shed CoDel-style: once the delay between a request
+    being dispatched and its task starting stayed above the target for a
+    whole INTERVAL, requests waiting longer than the target are rejected
+    until one gets through below it.
+    """
+
+    # seconds the queue delay must stay above target before shedding
+    INTERVAL = 0.1
+    # seconds clients are told to wait before retrying
+    RETRY_AFTER = 1
+
+    def __init__(self, config: "Config", state: "ServerState"):
+        self.config = config
+        self.state = state
+        self.first_above_time = 0.0
+        self.dropping = False
+
+    @staticmethod
+    def enabled(config: "Config") -> bool:
+        return bool(
+            config.max_connections or config.max_inflight or config.shed_target
+        )
+
+    def accept_connection(self) -> bool:
+        limit = self.config.max_connections
+        return not limit or len(self.state.connections) < limit
+
+    def accept_request(self) -> bool:
+        """Called from the request's own task
+
+        An eagerly started task runs before it is added to `tasks`.
+        """
+
+        limit = self.config.max_inflight
+        if not limit:
+            return True
+
+        tasks = self.state.tasks
+        return len(tasks) + (asyncio.current_task() not in tasks) <= limit
+
+    def should_shed(self, delay: float, now: float) -> bool:
+        target = self.config.shed_target
+        if not target:
+            return False
+
+        if delay < target:
+            self.first_above_time = 0.0
+            self.dropping = False
+            return False
+
+        if not self.first_above_time:
+            self.first_above_time = now + self.INTERVAL
+
+        elif now >= self.first_above_time:
+            self.dropping = True
+
+        return self.dropping
+
+    async def reject(self, scope, receive, send):
+        """ASGI app answering 503 in place of the application"""
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"retry-after", str(self.RETRY_AFTER).encode()),
+                    (b"content-length", b"0"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
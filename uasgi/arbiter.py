@@ -1,20 +1,53 @@
 from __future__ import annotations
 
+import gc
 import os
 import sys
+import time
+import select
+import signal
+import socket
 import asyncio
-import multiprocessing as mp
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-from .utils import create_logger, to_thread
+from .utils import (
+    create_logger,
+    get_accept_queue_length,
+    get_memory_usage,
+    load_app,
+    to_thread,
+)
 from .worker import Worker
+from .multiplexer import OutputMultiplexer
 
 
 if TYPE_CHECKING:
     from .config import Config
+    from .uhttp import ASGIHandler
 
 
 class Arbiter:
+    # seconds between two supervision passes when no child has exited
+    SUPERVISE_INTERVAL = 1.0
+    # a worker exiting sooner than this after its start counts as a failure
+    # and delays the next respawn exponentially
+    MIN_WORKER_LIFETIME = 5.0
+    MAX_RESPAWN_DELAY = 30.0
+    # seconds a replacement worker gets to start serving, it is polled for
+    # every READY_POLL_INTERVAL meanwhile
+    READY_TIMEOUT = 60.0
+    READY_POLL_INTERVAL = 0.05
+    # autoscaling thresholds, a sample is busy when connections wait in the
+    # accept queue, a worker loop lags or workers average many in-flight
+    # requests, it is idle when all of these are low
+    SCALE_UP_LAG = 0.1
+    SCALE_DOWN_LAG = 0.02
+    SCALE_UP_INFLIGHT = 64
+    SCALE_DOWN_INFLIGHT = 8
+    # consecutive busy/idle samples (one per supervise pass) before scaling
+    SCALE_UP_SAMPLES = 3
+    SCALE_DOWN_SAMPLES = 30
+
     def __init__(
         self,
         config: "Config",
@@ -27,22 +60,76 @@ class Arbiter:
         self.app = config.app
         self.config = config
         self.logger = create_logger(__name__, config.log_level, config.log_fmt)
-        self.stop_event = mp.Event()
+        # signal handlers only set plain flags, the signal itself wakes the
+        # main loop up through the set_wakeup_fd pipe: a handler taking a
+        # lock the interrupted main thread holds would deadlock
+        self.stopping = False
+        self.wakeup_fds: Optional[Tuple[int, int]] = None
         self.workers: List[Worker] = []
         self.loop = asyncio.new_event_loop()
+        self.multiplexer = OutputMultiplexer(self.loop)
+        # (deadline, worker index) of workers waiting to be respawned
+        self.respawn_at: List[Tuple[float, int]] = []
+        self.failures = 0
+        # workers draining after SIGTERM, mapped to their kill deadline
+        self.retiring: Dict[Worker, float] = {}
+        self.restart_requested = False
+        # replacements still starting, mapped to the worker they replace
+        self.replacing: Dict[Worker, Worker] = {}
+        # workers left to replace by the rolling restart in progress
+        self.restart_queue: List[Worker] = []
+        self.restarting = False
+        self.preloaded_app: Optional["ASGIHandler"] = None
+        self.started_at = time.monotonic()
+        self.booted = False
+        self.num_workers = config.workers
+        if self.autoscaling:
+            self.num_workers = min(
+                max(config.workers, config.min_workers), config.max_workers
+            )
+        self.busy_samples = 0
+        self.idle_samples = 0
+
+    @property
+    def autoscaling(self) -> bool:
+        return bool(self.config.max_workers)
 
     def main(self):
         self._validate_config()
 
         self.logger.debug("Arbitter is running")
 
+        if self.config.preload:
+            self.preload()
+
         to_thread(self.loop.run_forever, daemon=True, start=True)
+        read_fd, write_fd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.wakeup_fds = (read_fd, write_fd)
+        signal.set_wakeup_fd(write_fd, warn_on_full_buffer=False)
+        signal.signal(signal.SIGCHLD, self._on_sigchld)
+        signal.signal(signal.SIGHUP, self._on_sighup)
+        signal.signal(signal.SIGTTIN, self._on_sigttin)
+        signal.signal(signal.SIGTTOU, self._on_sigttou)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
 
-        for _ in range(self.config.workers):
-            self._spawn_worker()
+        for index in range(self.num_workers):
+            self._spawn_worker(index)
 
         try:
-            self.stop_event.wait()
+            while not self.stopping:
+                self._wait_signal(self._supervise_timeout())
+
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+
+                self.supervise()
+
+                if self.autoscaling:
+                    self.autoscale()
+
+                self.scale()
         except KeyboardInterrupt:
             ...
         finally:
@@ -50,35 +137,389 @@ class Arbiter:
 
         self.logger.debug("Arbiter was stopped")
 
+    def preload(self):
+        """Import the app once so workers share its pages copy-on-write"""
+
+        started_at = time.monotonic()
+        self.preloaded_app = load_app(self.app)
+
+        # move every object imported so far to the permanent generation, the
+        # collector of a worker then never touches and un-shares their pages
+        gc.freeze()
+
+        self.logger.info(
+            f"Application preloaded in "
+            f"{(time.monotonic() - started_at) * 1000:.0f}ms"
+        )
+
     def stop(self):
-        self.stop_event.set()
-        for worker in self.workers:
-            worker.join()
-        self.loop.stop()
+        """Drain every worker within the graceful timeout, then kill them"""
+
+        self.stopping = True
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        workers = [*self.workers, *self.replacing, *self.retiring]
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+        deadline = (
+            time.monotonic() + self.config.graceful_timeout + Worker.EXIT_GRACE
+        )
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                self.logger.warning(
+                    f"Worker {worker.pid} did not drain in time, killing it"
+                )
+                worker.kill()
+                worker.join()
+
+        self.loop.call_soon_threadsafe(self.multiplexer.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+        if self.wakeup_fds:
+            signal.set_wakeup_fd(-1)
+            for fd in self.wakeup_fds:
+                os.close(fd)
+            self.wakeup_fds = None
+
+    def supervise(self):
+        """Replace workers which died or whose event loop stopped beating"""
+
+        now = time.monotonic()
+        timeout = self.config.worker_timeout
+
+        self._check_replacements(now)
+
+        for worker in list(self.workers):
+            if not worker.booted and worker.is_ready():
+                worker.booted = True
+                self._report_boot(worker)
+
+            if not worker.is_alive():
+                self.logger.warning(
+                    f"Worker {worker.pid} exited with code {worker.exitcode}"
+                )
+                self._remove_worker(worker)
+                # a worker being replaced leaves its place to the replacement
+                if worker not in self.replacing.values():
+                    self._schedule_respawn(
+                        worker.index, now - worker.started_at
+                    )
+
+            elif timeout and worker.is_hung(timeout):
+                self.logger.warning(
+                    f"Worker {worker.pid} missed its heartbeat, killing it"
+                )
+                worker.kill()
+
+            elif worker.status.recycle.value:
+                worker.status.recycle.value = 0
+                if worker in self.replacing.values():
+                    # already being replaced by a rolling restart
+                    continue
+
+                if now - worker.started_at < self.MIN_WORKER_LIFETIME:
+                    # limits reached right after boot would recycle forever
+                    self.logger.warning(
+                        f"Worker {worker.pid} asked to be recycled right "
+                        "after starting, check --max-requests/--max-rss"
+                    )
+                else:
+                    self.logger.info(f"Worker {worker.pid} recycling")
+                    self._replace_worker(worker)
+
+        for worker, deadline in list(self.retiring.items()):
+            if not worker.is_alive():
+                self.logger.info(f"Worker {worker.pid} retired")
+                del self.retiring[worker]
+
+            elif now > deadline:
+                self.logger.warning(
+                    f"Worker {worker.pid} did not drain in time, killing it"
+                )
+                worker.kill()
+
+        while self.respawn_at and self.respawn_at[0][0] <= now:
+            _, index = self.respawn_at.pop(0)
+            self._spawn_worker(index)
+
+        if self.restarting and not self.replacing:
+            self._restart_next()
+
+    def autoscale(self):
+        """Adjust the number of workers to the load they publish"""
+
+        workers = [worker for worker in self.workers if worker.booted]
+        if not workers:
+            return
+
+        queue = get_accept_queue_length(self.config.sockets, self.config.port)
+        lag = max(worker.status.loop_lag.value for worker in workers)
+        inflight = sum(worker.status.inflight.value for worker in workers)
+        inflight /= len(workers)
+
+        if (
+            queue > 0
+            or lag > self.SCALE_UP_LAG
+            or inflight > self.SCALE_UP_INFLIGHT
+        ):
+            self.busy_samples += 1
+            self.idle_samples = 0
+
+        elif lag < self.SCALE_DOWN_LAG and inflight < self.SCALE_DOWN_INFLIGHT:
+            self.idle_samples += 1
+            self.busy_samples = 0
+
+        else:
+            self.busy_samples = self.idle_samples = 0
+
+        if (
+            self.busy_samples >= self.SCALE_UP_SAMPLES
+            and self.num_workers < self.config.max_workers
+        ):
+            self.logger.info(
+                f"Scaling up (queue {queue}, lag {lag * 1000:.0f}ms, "
+                f"{inflight:.1f} in-flight per worker)"
+            )
+            self.num_workers += 1
+            self.busy_samples = 0
+
+        elif (
+            self.idle_samples >= self.SCALE_DOWN_SAMPLES
+            and self.num_workers > self.config.min_workers
+        ):
+            self.logger.info("Scaling down, workers are idle")
+            self.num_workers -= 1
+            self.idle_samples = 0
+
+    def scale(self):
+        """Spawn or retire workers until `num_workers` are running"""
+
+        while len(self.workers) + len(self.respawn_at) < self.num_workers:
+            self._spawn_worker(self._free_index())
+
+        while self.respawn_at and (
+            len(self.workers) + len(self.respawn_at) > self.num_workers
+        ):
+            self.respawn_at.pop()
+
+        while len(self.workers) > self.num_workers:
+            worker = max(self.workers, key=lambda w: w.index)
+            self.logger.info(f"Retiring worker {worker.pid}")
+            self._retire_worker(worker)
+
+    def _free_index(self) -> int:
+        used = {worker.index for worker in self.workers}
+        used.update(index for _, index in self.respawn_at)
+        index = 0
+        while index in used:
+            index += 1
+        return index
+
+    def _report_boot(self, worker: Worker):
+        usage = get_memory_usage(worker.pid or "self")
+        memory = ""
+        if usage:
+            rss, private = usage
+            memory = f", RSS {rss / 2**20:.1f}MiB (private {private / 2**20:.1f}MiB)"
+
+        self.logger.info(
+            f"Worker {worker.pid} booted in "
+            f"{worker.boot_time * 1000:.0f}ms{memory}"
+        )
+
+        if not self.booted and all(w.booted for w in self.workers):
+            self.booted = True
+            booted_at = max(w.status.booted_at.value for w in self.workers)
+            self.logger.info(
+                f"{len(self.workers)} workers started in "
+                f"{(booted_at - self.started_at) * 1000:.0f}ms"
+            )
 
-    def _spawn_worker(self):
-        worker = Worker(self.config)
+    def rolling_restart(self):
+        """Replace every worker one at a time without losing capacity
+
+        Each replacement is started on the shared socket and must be serving
+        before the worker it replaces is asked to drain and exit. The restart
+        progresses from `supervise`, so workers keep being supervised.
+        """
+
+        self.logger.info("Rolling restart of workers")
+        if self.preloaded_app:
+            self.logger.warning(
+                "Application is preloaded, new workers run the code "
+                "loaded when the arbiter started"
+            )
+
+        self.restart_queue = [
+            worker
+            for worker in self.workers
+            if worker not in self.replacing.values()
+        ]
+        self.restarting = True
+
+    def _restart_next(self):
+        while self.restart_queue:
+            old = self.restart_queue.pop(0)
+            if old in self.workers:
+                self._replace_worker(old)
+                return
+
+        self.restarting = False
+        self.logger.info("Rolling restart completed")
+
+    def _replace_worker(self, old: Worker):
+        """Start a replacement of `old`, which is retired once it serves"""
+
+        new = self._start_worker(old.index)
+        self.replacing[new] = old
+
+    def _check_replacements(self, now: float):
+        for new, old in list(self.replacing.items()):
+            if new.is_ready():
+                del self.replacing[new]
+                self.workers.append(new)
+                if old in self.workers:
+                    self._retire_worker(old)
+
+            elif (
+                not new.is_alive() or now - new.started_at > self.READY_TIMEOUT
+            ):
+                self.logger.error(f"Worker {new.pid} did not become ready")
+                del self.replacing[new]
+                if new.is_alive():
+                    new.kill()
+                    self.retiring[new] = now
+
+                # the replaced worker died meanwhile
+                if old not in self.workers:
+                    self._schedule_respawn(old.index, 0.0)
+
+                if self.restarting:
+                    self.logger.error("Aborting rolling restart")
+                    self.restart_queue.clear()
+                    self.restarting = False
+
+    def _retire_worker(self, worker: Worker):
+        self.workers.remove(worker)
+        self.retiring[worker] = (
+            time.monotonic() + self.config.graceful_timeout + 5
+        )
+        worker.terminate()
+
+    def _supervise_timeout(self) -> float:
+        timeout = self.SUPERVISE_INTERVAL
+        if self.replacing:
+            timeout = self.READY_POLL_INTERVAL
+
+        if not self.respawn_at:
+            return timeout
+
+        return max(0.0, min(timeout, self.respawn_at[0][0] - time.monotonic()))
+
+    def _schedule_respawn(self, index: int, lifetime: float):
+        if lifetime < self.MIN_WORKER_LIFETIME:
+            self.failures += 1
+        else:
+            self.failures = 0
+
+        delay = 0.0
+        if self.failures:
+            delay = min(0.1 * 2 ** (self.failures - 1), self.MAX_RESPAWN_DELAY)
+            self.logger.info(f"Respawning worker in {delay:.1f}s")
+
+        self.respawn_at.append((time.monotonic() + delay, index))
+        self.respawn_at.sort()
+
+    def _wait_signal(self, timeout: float):
+        """Sleep until `timeout` passed or a signal was received"""
+
+        assert self.wakeup_fds is not None
+        read_fd = self.wakeup_fds[0]
+        ready, _, _ = select.select([read_fd], [], [], timeout)
+        if not ready:
+            return
+
+        try:
+            while os.read(read_fd, 4096):
+                ...
+        except BlockingIOError:
+            ...
+
+    def _on_sigchld(self, signum, frame):
+        # the wakeup fd already got the signal, supervise() reaps
+        ...
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_sighup(self, signum, frame):
+        self.restart_requested = True
+
+    def _on_sigttin(self, signum, frame):
+        limit = self.config.max_workers or sys.maxsize
+        self.num_workers = min(self.num_workers + 1, limit)
+
+    def _on_sigttou(self, signum, frame):
+        limit = self.config.min_workers or 1
+        self.num_workers = max(self.num_workers - 1, limit)
+
+    def _remove_worker(self, worker: Worker):
+        self.workers.remove(worker)
+
+    def _spawn_worker(self, index: int) -> Worker:
+        worker = self._start_worker(index)
         self.workers.append(worker)
-        self._sync_stdio_worker(worker)
-        worker.run()
+        return worker
 
-    def _pipe_fd(self, out_fd, in_fd):
-        os.sendfile(out_fd, in_fd, 0, 1024)
+    def _start_worker(self, index: int) -> Worker:
+        worker = Worker(
+            self.config,
+            index=index,
+            preloaded_app=self.preloaded_app,
+            capture_output=True,
+        )
+        worker.run()
+        self._sync_stdio_worker(worker)
+        return worker
 
     def _sync_stdio_worker(self, worker: Worker):
-        self.loop.add_reader(
+        prefix = b""
+        if self.config.worker_log_prefix:
+            prefix = f"[{worker.pid}] ".encode()
+
+        self.loop.call_soon_threadsafe(
+            self.multiplexer.add,
             worker.stdout_fd,
-            self._pipe_fd,
             sys.stdout.fileno(),
-            worker.stdout_fd,
+            prefix,
         )
-        self.loop.add_reader(
+        self.loop.call_soon_threadsafe(
+            self.multiplexer.add,
             worker.stderr_fd,
-            self._pipe_fd,
             sys.stderr.fileno(),
-            worker.stderr_fd,
+            prefix,
         )
 
     def _validate_config(self):
         if not self.config.workers:
             raise RuntimeError("Number of workers must be greater than 0")
+
+        if self.config.max_workers and not (
+            0 < self.config.min_workers <= self.config.max_workers
+        ):
+            raise RuntimeError(
+                "min_workers must be greater than 0 and at most max_workers"
+            )
+
+        if self.config.reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError(
+                "SO_REUSEPORT is not supported on this platform"
+            )
+
+        if self.config.cpu_affinity and not hasattr(os, "sched_setaffinity"):
+            raise RuntimeError(
+                "CPU affinity is not supported on this platform"
+            )
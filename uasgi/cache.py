@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .uhttp import HttpScopeRunner
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .uhttp import ASGIHandler
+
+
+CacheKey = Tuple[bytes, ...]
+
+# response headers never stored, content-length is rebuilt
+HOP_BY_HOP_HEADERS = {
+    b"connection",
+    b"keep-alive",
+    b"transfer-encoding",
+    b"content-length",
+}
+
+
+class CachePolicy:
+    """How long a response may be shared, parsed from its headers"""
+
+    __slots__ = ("headers", "max_age", "stale", "age", "vary")
+
+    def __init__(
+        self,
+        headers: List[Tuple[bytes, bytes]],
+        max_age: int,
+        stale: int,
+        age: int,
+        vary: Tuple[bytes, ...],
+    ):
+        self.headers = headers
+        self.max_age = max_age
+        self.stale = stale
+        self.age = age
+        self.vary = vary
+
+    @classmethod
+    def parse(
+        cls, headers: List[Tuple[bytes, bytes]]
+    ) -> Optional["CachePolicy"]:
+        """The policy of a shared-cacheable response, None otherwise"""
+
+        cache_control: Dict[bytes, bytes] = {}
+        vary: List[bytes] = []
+        age = 0
+        stored = []
+
+        for name, value in headers:
+            lower = name.lower()
+            if lower == b"set-cookie":
+                return None
+            elif lower == b"cache-control":
+                for directive in value.split(b","):
+                    k, _, v = directive.strip().partition(b"=")
+                    cache_control[k.lower()] = v.strip(b'"')
+            elif lower == b"vary":
+                vary.extend(v.strip().lower() for v in value.split(b","))
+            elif lower == b"age":
+                # the app may answer from a cache of its own, the entry is
+                # that much older already
+                age = int(value) if value.isdigit() else 0
+                continue
+
+            if lower not in HOP_BY_HOP_HEADERS:
+                stored.append((name, value))
+
+        if (
+            b"*" in vary
+            or b"private" in cache_control
+            or b"no-store" in cache_control
+            or b"no-cache" in cache_control
+        ):
+            return None
+
+        max_age = cache_control.get(b"s-maxage")
+        if max_age is None and b"public" in cache_control:
+            max_age = cache_control.get(b"max-age")
+        if not max_age or not max_age.isdigit() or not int(max_age):
+            return None
+
+        stale = cache_control.get(b"stale-while-revalidate", b"0")
+        return cls(
+            stored,
+            max_age=int(max_age),
+            stale=int(stale) if stale.isdigit() else 0,
+            age=age,
+            vary=tuple(v for v in vary if v),
+        )
+
+
+class CacheEntry:
+    """A stored response, prebuilt for a single `transport.write`"""
+
+    __slots__ = (
+        "status",
+        "headers",
+        "body",
+        "response",
+        "head",
+        "expires",
+        "stale_until",
+        "vary",
+        "size",
+        "stored_headers",
+        "stored_at",
+        "age",
+    )
+
+    def __init__(
+        self,
+        status: int,
+        headers: List[Tuple[bytes, bytes]],
+        body: bytes,
+        stored_at: float,
+        expires: float,
+        stale_until: float,
+        vary: Tuple[bytes, ...],
+    ):
+        self.status = status
+        self.stored_headers = headers + [
+            (b"content-length", str(len(body)).encode())
+        ]
+        self.body = body
+        self.stored_at = stored_at
+        self.age = -1
+        self.set_age(stored_at)
+        self.expires = expires
+        self.stale_until = stale_until
+        self.vary = vary
+        # an `Age` growing by a few digits is not accounted
+        self.size = len(self.response) + len(self.head)
+
+    def set_age(self, now: float):
+        """Rebuild the response with the `Age` it has at `now`
+
+        Ages are whole seconds (RFC 9111 section 5.1) so this happens at
+        most once a second for an entry served continuously.
+        """
+
+        age = max(int(now - self.stored_at), 0)
+        if age == self.age:
+            return
+
+        self.age = age
+        self.headers = self.stored_headers + [(b"age", str(age).encode())]
+        self.head = HttpScopeRunner.build_http_response_header(
+            status=self.status, http_version="1.1", headers=self.headers
+        )
+        self.response = self.head + self.body
+
+
+class ResponseCache:
+    """In-process cache of public GET responses, an ASGI app around `app`
+
+    A response is stored when the app marks it shared-cacheable with
+    `s-maxage`, or `public` and `max-age`, and it has no `Set-Cookie`.
+    Entries are keyed by host, path, query and the request headers named
+    in `Vary`, and evicted least recently used once `config.cache_size`
+    bytes are held. Responses served from the cache carry their `Age`.
+
+    Expired entries are served for the response's `stale-while-revalidate`
+    seconds while one background request refreshes them, and concurrent
+    misses for a key wait for the first one instead of calling the app.
+    """
+
+    METHODS = ("GET", "HEAD")
+    # a single response may take at most this share of the cache
+    MAX_ENTRY_RATIO = 8
+    # resources whose Vary is remembered beyond the number of entries
+    MAX_VARY_SLACK = 1024
+
+    def __init__(
+        self,
+        app: "ASGIHandler",
+        config: "Config",
+        tasks: Set[asyncio.Task],
+        logger: logging.Logger,
+    ):
+        self.app = app
+        self.config = config
+        self.tasks = tasks
+        self.logger = logger
+        self.max_size = config.cache_size
+        self.max_entry_size = config.cache_size // self.MAX_ENTRY_RATIO
+        self.entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+        self.size = 0
+        # request headers named by the last `Vary` of each resource
+        self.vary: OrderedDict[CacheKey, Tuple[bytes, ...]] = OrderedDict()
+        # responses being fetched, waited for by concurrent misses
+        self.pending: Dict[CacheKey, asyncio.Future] = {}
+
+    def resource(self, scope: Mapping[str, Any]) -> Optional[CacheKey]:
+        """Host, path and query of a request that may be served from cache"""
+
+        host = b""
+        for name, value in scope["headers"]:
+            name = name.lower()
+            if name == b"host":
+                host = value
+            elif name == b"authorization":
+                return None
+
+        return (host, scope["raw_path"], scope["query_string"])
+
+    def key(self, scope: Mapping[str, Any]) -> Optional[CacheKey]:
+        resource = self.resource(scope)
+        if resource is None:
+            return None
+
+        vary = self.vary.get(resource)
+        if not vary:
+            return resource
+
+        values = dict.fromkeys(vary, b"")
+        for name, value in scope["headers"]:
+            name = name.lower()
+            if name in values:
+                values[name] = value
+        return resource + tuple(values.values())
+
+    def lookup(self, scope: Mapping[str, Any]) -> Optional[CacheEntry]:
+        """The entry to answer `scope` with, fresh or still servable stale
+
+        Serving a stale entry starts its revalidation.
+        """
+
+        if scope["method"] not in self.METHODS:
+            return None
+
+        key = self.key(scope)
+        if key is None:
+            return None
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        now = asyncio.get_running_loop().time()
+        if now >= entry.expires:
+            if now >= entry.stale_until:
+                self.remove(key)
+                return None
+            self.revalidate(key, scope)
+
+        self.entries.move_to_end(key)
+        entry.set_age(now)
+        return entry
+
+    def store(self, key: CacheKey, entry: CacheEntry):
+        self.remove(key)
+        if entry.size > self.max_entry_size:
+            return
+
+        self.entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def remove(self, key: CacheKey):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    async def __call__(self, scope, receive, send):
+        key = self.key(scope) if scope["method"] in self.METHODS else None
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        entry = self.lookup(scope)
+        if entry is None:
+            pending = self.pending.get(key)
+            if pending is None:
+                # a HEAD response has no body to store
+                if scope["method"] != "GET":
+                    return await self.app(scope, receive, send)
+                return await self.fetch(key, scope, receive, send)
+
+            entry = await asyncio.shield(pending)
+            if entry is None:
+                return await self.app(scope, receive, send)
+
+        return await self.send_entry(scope, entry, send)
+
+    async def send_entry(self, scope, entry: CacheEntry, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": entry.status,
+                "headers": entry.headers,
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": entry.body if scope["method"] == "GET" else b"",
+            }
+        )
+
+    async def fetch(self, key: CacheKey, scope, receive, send):
+        """Run the app for a miss and store the response if cacheable
+
+        Concurrent misses wait for this response only while it may still be
+        stored, they are released as soon as it cannot, so a slow or
+        streamed uncacheable response does not serialize its clients.
+        """
+
+        pending = asyncio.get_running_loop().create_future()
+        self.pending[key] = pending
+        entry: Optional[CacheEntry] = None
+        status = 0
+        policy: Optional[CachePolicy] = None
+        body: List[bytes] = []
+        body_size = 0
+        complete = False
+
+        def release():
+            nonlocal policy
+            policy = None
+            if self.pending.get(key) is pending:
+                del self.pending[key]
+            if not pending.done():
+                pending.set_result(None)
+
+        async def capture(event):
+            nonlocal status, policy, body_size, complete
+            _type = event["type"]
+
+            if _type == "http.response.start":
+                status = event["status"]
+                if status == 200 and not event.get("trailers", False):
+                    policy = CachePolicy.parse(list(event.get("headers", [])))
+                if policy is None:
+                    release()
+
+            elif _type == "http.response.body" and policy is not None:
+                chunk = event.get("body", b"")
+                body.append(chunk)
+                body_size += len(chunk)
+                complete = not event.get("more_body", False)
+                if body_size > self.max_entry_size:
+                    release()
+
+            elif policy is not None:
+                release()
+
+            await send(event)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if policy is not None and complete:
+                entry = self.build_entry(status, policy, b"".join(body))
+                self.set_vary(self.resource(scope) or key, entry.vary)
+                self.store(self.key(scope) or key, entry)
+            if self.pending.get(key) is pending:
+                del self.pending[key]
+            if not pending.done():
+                pending.set_result(entry)
+
+    def set_vary(self, resource: CacheKey, vary: Tuple[bytes, ...]):
+        self.vary.pop(resource, None)
+        if not vary:
+            return
+
+        self.vary[resource] = vary
+        # forget the oldest resources once there are more than entries
+        while len(self.vary) > len(self.entries) + self.MAX_VARY_SLACK:
+            self.vary.popitem(last=False)
+
+    def build_entry(
+        self, status: int, policy: CachePolicy, body: bytes
+    ) -> CacheEntry:
+        stored_at = asyncio.get_running_loop().time() - policy.age
+        expires = stored_at + policy.max_age
+        return CacheEntry(
+            status,
+            policy.headers,
+            body,
+            stored_at=stored_at,
+            expires=expires,
+            stale_until=expires + policy.stale,
+            vary=policy.vary,
+        )
+
+    def revalidate(self, key: CacheKey, scope):
+        if key in self.pending:
+            return
+
+        request_sent = False
+        complete = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b""}
+
+            await complete.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(event):
+            if event["type"] == "http.response.body" and not event.get(
+                "more_body"
+            ):
+                complete.set()
+
+        async def run():
+            try:
+                await self.fetch(
+                    key, {**scope, "method": "GET"}, receive, send
+                )
+            except Exception as e:
+                self.logger.warning(
+                    f"Revalidating {scope['path']} failed: {e!r}"
+                )
+
+        task = asyncio.get_running_loop().create_task(run())
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Optional, Tuple
 import click
 
 from uasgi.config import Protocol
 
-from .main import run as _run
-from .utils import LOG_LEVEL
+from .utils import EVENT_LOOP, LOG_LEVEL
+
+
+def parse_mode(ctx, param, value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+
+    try:
+        return int(value, 8)
+    except ValueError:
+        raise click.BadParameter(f"{value} is not an octal mode")
 
 
 cli = click.Group(name="uasgi", help="A High-Performance ASGI Web Server")
@@ -32,19 +41,210 @@ cli = click.Group(name="uasgi", help="A High-Performance ASGI Web Server")
     show_default=True,
     help="The port to listen on.",
 )
+@click.option(
+    "--bind",
+    "-b",
+    type=str,
+    multiple=True,
+    help="Address to listen on as HOST:PORT, [IPV6]:PORT or unix:PATH, "
+    "can be repeated. Overrides --host/--port.",
+)
+@click.option(
+    "--fd",
+    type=int,
+    multiple=True,
+    help="Listen on an inherited socket file descriptor, can be repeated. "
+    "Sockets passed by systemd socket activation are used automatically.",
+)
+@click.option(
+    "--uds-mode",
+    type=str,
+    default=None,
+    callback=parse_mode,
+    help="Permissions of unix domain sockets as an octal mode, e.g. 660.",
+)
 @click.option(
     "--backlog",
     type=int,
-    default=1024,
+    default=4096,
     show_default=True,
     help="The maximum number of pending connections.",
 )
+@click.option(
+    "--tcp-defer-accept",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Seconds a connection may wait for its first data before being "
+    "accepted (TCP_DEFER_ACCEPT), 0 disables.",
+)
+@click.option(
+    "--tcp-fastopen",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Queue length of TCP Fast Open requests, 0 disables.",
+)
+@click.option(
+    "--tcp-quickack/--no-tcp-quickack",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Disable delayed ACKs for incoming requests (TCP_QUICKACK).",
+)
+@click.option(
+    "--rcvbuf",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Receive buffer size of connections in bytes, 0 keeps the "
+    "system default.",
+)
+@click.option(
+    "--sndbuf",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Send buffer size of connections in bytes, 0 keeps the "
+    "system default.",
+)
+@click.option(
+    "--busy-poll",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Microseconds to busy poll the device queue on reads "
+    "(SO_BUSY_POLL), 0 disables.",
+)
 @click.option(
     "--workers",
     type=int,
     default=1,
     help="The number of worker processes to use. Defaults to 1 worker.",
 )
+@click.option(
+    "--worker-timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Seconds without heartbeat, once serving, before a worker is "
+    "killed and replaced, 0 disables.",
+)
+@click.option(
+    "--graceful-timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Seconds a stopping worker waits for in-flight requests.",
+)
+@click.option(
+    "--reuse-port/--no-reuse-port",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Give each worker its own SO_REUSEPORT listening socket.",
+)
+@click.option(
+    "--threads",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Event loops run in threads of each worker, "
+    "meant for free-threaded Python.",
+)
+@click.option(
+    "--cpu-affinity/--no-cpu-affinity",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Pin worker N to CPU N.",
+)
+@click.option(
+    "--preload/--no-preload",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Import the application in the arbiter before forking workers.",
+)
+@click.option(
+    "--worker-log-prefix/--no-worker-log-prefix",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Prefix every line of worker output with the worker PID.",
+)
+@click.option(
+    "--max-requests",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Recycle a worker after this many requests, 0 disables.",
+)
+@click.option(
+    "--max-requests-jitter",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Random extra requests added to --max-requests per worker.",
+)
+@click.option(
+    "--max-rss",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Recycle a worker once its RSS exceeds this many MiB, 0 disables.",
+)
+@click.option(
+    "--warmup",
+    type=str,
+    multiple=True,
+    help='Request run through the app before serving, as "METHOD /path", '
+    "can be repeated.",
+)
+@click.option(
+    "--warmup-timeout",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Seconds each warmup request may take.",
+)
+@click.option(
+    "--max-connections",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Connections per worker above which requests get a 503, 0 disables.",
+)
+@click.option(
+    "--max-inflight",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Requests running at once per worker above which requests get a "
+    "503, 0 disables.",
+)
+@click.option(
+    "--shed-target",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Seconds of queueing delay above which requests are shed with a "
+    "503, 0 disables.",
+)
+@click.option(
+    "--min-workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Lower bound of the number of workers when autoscaling.",
+)
+@click.option(
+    "--max-workers",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Upper bound of the number of workers, enables autoscaling.",
+)
 @click.option(
     "--ssl-cert-file",
     type=click.Path(exists=True, dir_okay=False),
@@ -85,40 +285,282 @@ cli = click.Group(name="uasgi", help="A High-Performance ASGI Web Server")
     show_default=True,
     help="Enable/disable auto reloader.",
 )
+@click.option(
+    "--reload-include",
+    type=str,
+    multiple=True,
+    help="Glob of files whose changes trigger a reload, can be repeated. "
+    "Defaults to *.py.",
+)
+@click.option(
+    "--reload-exclude",
+    type=str,
+    multiple=True,
+    help="Glob of files or directories ignored by the reloader, can be "
+    "repeated. Defaults to hidden directories, __pycache__, node_modules "
+    "and virtualenvs.",
+)
+@click.option(
+    "--loop",
+    type=click.Choice(["auto", "uvloop", "asyncio"]),
+    default="auto",
+    show_default=True,
+    help="Event loop implementation, auto prefers uvloop.",
+)
+@click.option(
+    "--eager-tasks/--no-eager-tasks",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Start request tasks eagerly (Python 3.12+).",
+)
 @click.option(
     "--protocol",
     default="h11",
     show_default=True,
     help="HTTP protocol",
 )
+@click.option(
+    "--keep-alive-timeout",
+    type=float,
+    default=5.0,
+    show_default=True,
+    help="Seconds before an idle HTTP/1.1 connection is closed, 0 disables.",
+)
+@click.option(
+    "--max-url-size",
+    type=int,
+    default=8192,
+    show_default=True,
+    help="Bytes of request target above which HTTP/1.1 requests get a 414, "
+    "0 disables.",
+)
+@click.option(
+    "--max-header-count",
+    type=int,
+    default=100,
+    show_default=True,
+    help="Request headers above which HTTP/1.1 requests get a 431, "
+    "0 disables.",
+)
+@click.option(
+    "--max-header-size",
+    type=int,
+    default=65536,
+    show_default=True,
+    help="Bytes of request headers above which HTTP/1.1 requests get a 431, "
+    "0 disables.",
+)
+@click.option(
+    "--max-body-size",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Bytes of request body above which HTTP/1.1 requests get a 413, "
+    "0 disables.",
+)
+@click.option(
+    "--header-timeout",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Seconds a client has to send a request head, 0 disables.",
+)
+@click.option(
+    "--min-body-rate",
+    type=int,
+    default=240,
+    show_default=True,
+    help="Bytes per second a request body must arrive at, 0 disables.",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Bytes of shared-cacheable GET responses kept per worker, "
+    "0 disables.",
+)
+@click.option(
+    "--write-buffer-high",
+    type=int,
+    default=64 * 1024,
+    show_default=True,
+    help="Bytes buffered for a slow HTTP/1.1 client before the app's "
+    "send() waits.",
+)
+@click.option(
+    "--write-buffer-low",
+    type=int,
+    help="Bytes the buffer must drain to before send() resumes. "
+    "Defaults to a quarter of --write-buffer-high.",
+)
+@click.option(
+    "--ws-max-size",
+    type=int,
+    default=16 * 1024 * 1024,
+    show_default=True,
+    help="Bytes of a WebSocket message above which the connection is "
+    "closed, 0 disables.",
+)
+@click.option(
+    "--ws-ping-interval",
+    type=float,
+    default=20.0,
+    show_default=True,
+    help="Seconds between WebSocket keepalive pings, 0 disables.",
+)
+@click.option(
+    "--ws-ping-timeout",
+    type=float,
+    default=20.0,
+    show_default=True,
+    help="Seconds to wait for a WebSocket pong before closing.",
+)
+@click.option(
+    "--ws-per-message-deflate/--no-ws-per-message-deflate",
+    is_flag=True,
+    default=True,
+    show_default=True,
+    help="Enable/disable WebSocket permessage-deflate compression.",
+)
+@click.option(
+    "--h2-idle-timeout",
+    type=float,
+    default=300.0,
+    show_default=True,
+    help="Seconds before an idle HTTP/2 connection is closed, 0 disables.",
+)
+@click.option(
+    "--h2-ping-interval",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Seconds between HTTP/2 PINGs measuring RTT, 0 disables.",
+)
 def run(
     app: str,
     host: str,
     port: int,
+    bind: Tuple[str, ...],
+    fd: Tuple[int, ...],
+    uds_mode: Optional[int],
     backlog: Optional[int],
+    tcp_defer_accept: int,
+    tcp_fastopen: int,
+    tcp_quickack: bool,
+    rcvbuf: int,
+    sndbuf: int,
+    busy_poll: int,
     workers: Optional[int],
+    worker_timeout: float,
+    graceful_timeout: float,
+    reuse_port: bool,
+    threads: int,
+    cpu_affinity: bool,
+    preload: bool,
+    worker_log_prefix: bool,
+    max_requests: int,
+    max_requests_jitter: int,
+    max_rss: int,
+    warmup: Tuple[str, ...],
+    warmup_timeout: float,
+    max_connections: int,
+    max_inflight: int,
+    shed_target: float,
+    min_workers: int,
+    max_workers: int,
     ssl_cert_file: Optional[str],
     ssl_key_file: Optional[str],
     log_level: LOG_LEVEL,
     access_log: bool,
     lifespan: bool,
     reload: Optional[bool],
+    reload_include: Tuple[str, ...],
+    reload_exclude: Tuple[str, ...],
+    loop: EVENT_LOOP,
+    eager_tasks: bool,
     protocol: Optional[Protocol],
+    keep_alive_timeout: float,
+    max_url_size: int,
+    max_header_count: int,
+    max_header_size: int,
+    max_body_size: int,
+    header_timeout: float,
+    min_body_rate: int,
+    cache_size: int,
+    write_buffer_high: int,
+    write_buffer_low: Optional[int],
+    ws_max_size: int,
+    ws_ping_interval: float,
+    ws_ping_timeout: float,
+    ws_per_message_deflate: bool,
+    h2_idle_timeout: float,
+    h2_ping_interval: float,
 ):
     try:
+        # the server modules are imported only once a command runs
+        from .main import run as _run
+
         _run(
             app=app,
             host=host,
             port=port,
+            bind=list(bind),
+            fds=list(fd),
+            uds_mode=uds_mode,
             backlog=backlog,
+            tcp_defer_accept=tcp_defer_accept,
+            tcp_fastopen=tcp_fastopen,
+            tcp_quickack=tcp_quickack,
+            rcvbuf=rcvbuf,
+            sndbuf=sndbuf,
+            busy_poll=busy_poll,
             workers=workers,
+            worker_timeout=worker_timeout,
+            graceful_timeout=graceful_timeout,
+            reuse_port=reuse_port,
+            threads=threads,
+            cpu_affinity=cpu_affinity,
+            preload=preload,
+            worker_log_prefix=worker_log_prefix,
+            max_requests=max_requests,
+            max_requests_jitter=max_requests_jitter,
+            max_rss=max_rss,
+            warmup=list(warmup),
+            warmup_timeout=warmup_timeout,
+            max_connections=max_connections,
+            max_inflight=max_inflight,
+            shed_target=shed_target,
+            min_workers=min_workers,
+            max_workers=max_workers,
             ssl_key_file=ssl_key_file,
             ssl_cert_file=ssl_cert_file,
             log_level=log_level,
             access_log=access_log,
             lifespan=lifespan,
             reload=reload,
+            reload_include=list(reload_include),
+            reload_exclude=list(reload_exclude),
+            loop=loop,
+            eager_tasks=eager_tasks,
             protocol=protocol,
+            keep_alive_timeout=keep_alive_timeout,
+            max_url_size=max_url_size,
+            max_header_count=max_header_count,
+            max_header_size=max_header_size,
+            max_body_size=max_body_size,
+            header_timeout=header_timeout,
+            min_body_rate=min_body_rate,
+            cache_size=cache_size,
+            write_buffer_high=write_buffer_high,
+            write_buffer_low=write_buffer_low,
+            ws_max_size=ws_max_size,
+            ws_ping_interval=ws_ping_interval,
+            ws_ping_timeout=ws_ping_timeout,
+            ws_per_message_deflate=ws_per_message_deflate,
+            h2_idle_timeout=h2_idle_timeout,
+            h2_ping_interval=h2_ping_interval,
         )
     except RuntimeError as e:
         click.echo(str(e), err=True)
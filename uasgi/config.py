@@ -1,19 +1,29 @@
 from __future__ import annotations
 
+import os
+import sys
+import stat
 import socket
-from typing import TYPE_CHECKING, Literal, Optional, Callable
+from typing import TYPE_CHECKING, List, Literal, Optional, Callable, Tuple
 
 from .utils import DEFAULT_LOG_FMT
 
 
 if TYPE_CHECKING:
     from ssl import SSLContext
-    from .utils import LOG_LEVEL
+    from .utils import EVENT_LOOP, LOG_LEVEL
     from .uhttp import ASGIHandler
+    from .warmup import WarmupSpec
 
 
 Protocol = Literal["h11", "h2"]
 
+# first file descriptor passed by systemd socket activation
+SD_LISTEN_FDS_START = 3
+
+# not exported by the socket module, from <asm-generic/socket.h>
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+
 
 class Config:
     def __init__(
@@ -22,7 +32,16 @@ class Config:
         host: Optional[str] = None,
         port: Optional[int] = None,
         sock: Optional["socket.socket"] = None,
+        bind: Optional[List[str]] = None,
+        fds: Optional[List[int]] = None,
+        uds_mode: Optional[int] = None,
         backlog: Optional[int] = None,
+        tcp_defer_accept: Optional[int] = None,
+        tcp_fastopen: Optional[int] = None,
+        tcp_quickack: bool = False,
+        rcvbuf: Optional[int] = None,
+        sndbuf: Optional[int] = None,
+        busy_poll: Optional[int] = None,
         workers: Optional[int] = None,
         ssl_cert_file: Optional[str] = None,
         ssl_key_file: Optional[str] = None,
@@ -33,13 +52,59 @@ class Config:
         log_fmt: Optional[str] = None,
         access_log_fmt: Optional[str] = None,
         reload: Optional[bool] = False,
+        reload_include: Optional[List[str]] = None,
+        reload_exclude: Optional[List[str]] = None,
         protocol: Optional[Protocol] = "h11",
+        keep_alive_timeout: Optional[float] = None,
+        h2_idle_timeout: Optional[float] = None,
+        h2_ping_interval: Optional[float] = None,
+        worker_timeout: Optional[float] = None,
+        graceful_timeout: Optional[float] = None,
+        reuse_port: bool = False,
+        threads: Optional[int] = None,
+        cpu_affinity: bool = False,
+        preload: bool = False,
+        worker_log_prefix: bool = False,
+        max_requests: Optional[int] = None,
+        max_requests_jitter: Optional[int] = None,
+        max_rss: Optional[int] = None,
+        min_workers: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        warmup: Optional[List["WarmupSpec"]] = None,
+        warmup_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        shed_target: Optional[float] = None,
+        max_url_size: Optional[int] = None,
+        max_header_count: Optional[int] = None,
+        max_header_size: Optional[int] = None,
+        max_body_size: Optional[int] = None,
+        header_timeout: Optional[float] = None,
+        min_body_rate: Optional[int] = None,
+        ws_max_size: Optional[int] = None,
+        ws_ping_interval: Optional[float] = None,
+        ws_ping_timeout: Optional[float] = None,
+        ws_per_message_deflate: bool = True,
+        write_buffer_high: Optional[int] = None,
+        write_buffer_low: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        loop: Optional["EVENT_LOOP"] = None,
+        eager_tasks: bool = False,
     ):
         self.app = app
         self.host = host or "127.0.0.1"
         self.port = port or 5000
-        self.socket: Optional["socket.socket"] = sock
+        self.sockets: List["socket.socket"] = [sock] if sock else []
+        self.bind = bind or []
+        self.fds = fds or []
+        self.uds_mode = uds_mode
         self.backlog = backlog or 4096
+        self.tcp_defer_accept = tcp_defer_accept or 0
+        self.tcp_fastopen = tcp_fastopen or 0
+        self.tcp_quickack = tcp_quickack
+        self.rcvbuf = rcvbuf or 0
+        self.sndbuf = sndbuf or 0
+        self.busy_poll = busy_poll or 0
         self.workers = workers or 1
         self.ssl = ssl
         self.ssl_cert_file = ssl_cert_file
@@ -50,7 +115,87 @@ class Config:
         self.log_fmt = log_fmt or DEFAULT_LOG_FMT
         self.access_log_fmt = access_log_fmt or DEFAULT_LOG_FMT
         self.reload = reload or False
+        self.reload_include = reload_include or ["*.py"]
+        self.reload_exclude = reload_exclude or [
+            ".*",
+            "__pycache__",
+            "node_modules",
+            "*venv*",
+        ]
         self.protocol = protocol
+        self.keep_alive_timeout = (
+            5.0 if keep_alive_timeout is None else keep_alive_timeout
+        )
+        self.h2_idle_timeout = (
+            300.0 if h2_idle_timeout is None else h2_idle_timeout
+        )
+        self.h2_ping_interval = (
+            30.0 if h2_ping_interval is None else h2_ping_interval
+        )
+        self.worker_timeout = (
+            30.0 if worker_timeout is None else worker_timeout
+        )
+        self.graceful_timeout = (
+            30.0 if graceful_timeout is None else graceful_timeout
+        )
+        self.reuse_port = reuse_port
+        self.threads = threads or 1
+        self.cpu_affinity = cpu_affinity
+        self.preload = preload
+        self.worker_log_prefix = worker_log_prefix
+        self.max_requests = max_requests or 0
+        self.max_requests_jitter = max_requests_jitter or 0
+        self.max_rss = max_rss or 0
+        self.min_workers = min_workers or 1
+        self.max_workers = max_workers or 0
+        self.warmup = warmup or []
+        self.warmup_timeout = (
+            10.0 if warmup_timeout is None else warmup_timeout
+        )
+        self.max_connections = max_connections or 0
+        self.max_inflight = max_inflight or 0
+        self.shed_target = shed_target or 0.0
+        self.max_url_size = 8192 if max_url_size is None else max_url_size
+        self.max_header_count = (
+            100 if max_header_count is None else max_header_count
+        )
+        self.max_header_size = (
+            65536 if max_header_size is None else max_header_size
+        )
+        self.max_body_size = max_body_size or 0
+        self.header_timeout = (
+            10.0 if header_timeout is None else header_timeout
+        )
+        self.min_body_rate = 240 if min_body_rate is None else min_body_rate
+        self.ws_max_size = (
+            16 * 1024 * 1024 if ws_max_size is None else ws_max_size
+        )
+        self.ws_ping_interval = (
+            20.0 if ws_ping_interval is None else ws_ping_interval
+        )
+        self.ws_ping_timeout = (
+            20.0 if ws_ping_timeout is None else ws_ping_timeout
+        )
+        self.ws_per_message_deflate = ws_per_message_deflate
+        self.write_buffer_high = (
+            64 * 1024 if write_buffer_high is None else write_buffer_high
+        )
+        self.write_buffer_low = (
+            self.write_buffer_high // 4
+            if write_buffer_low is None
+            else write_buffer_low
+        )
+        self.cache_size = cache_size or 0
+        self.loop: "EVENT_LOOP" = loop or "auto"
+        if self.loop not in ("auto", "uvloop", "asyncio"):
+            raise RuntimeError(f"Unknown event loop {self.loop}")
+        self.eager_tasks = eager_tasks
+        if self.eager_tasks and sys.version_info < (3, 12):
+            raise RuntimeError("Eager tasks require Python 3.12 or newer")
+        if self.write_buffer_low > self.write_buffer_high:
+            raise RuntimeError(
+                "write_buffer_low must not be greater than write_buffer_high"
+            )
 
     def get_ssl(self):
         from .utils import create_ssl_context
@@ -67,27 +212,155 @@ class Config:
 
         return self.ssl
 
-    def create_socket(self):
-        host = self.host
-        port = self.port
-        sock = socket.create_server(
-            address=(host, port),
-            family=socket.AF_INET,
-            backlog=self.backlog,
-            reuse_port=True,
-        )
+    @property
+    def first_socket(self) -> Optional["socket.socket"]:
+        """The first listener, kept for code serving a single socket"""
 
-        sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+        return self.sockets[0] if self.sockets else None
+
+    @property
+    def addresses(self) -> List[str]:
+        return self.bind or [format_address(self.host, self.port)]
+
+    def create_sockets(self) -> List["socket.socket"]:
+        return [self.create_socket(address) for address in self.addresses]
+
+    def create_socket(self, address: str) -> "socket.socket":
+        if address.startswith("unix:"):
+            return self.create_unix_socket(address[len("unix:") :])
+
+        host, port = parse_address(address, self.port)
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if family == socket.AF_INET6:
+            # "::" accepts IPv4 connections too where the system supports it
+            dualstack = host == "::" and socket.has_dualstack_ipv6()
+            sock.setsockopt(
+                socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, int(not dualstack)
+            )
+
+        # buffer sizes must be set before listen() to be taken into account
+        # for the window scale advertised to clients
+        self.tune_socket(sock)
+
+        try:
+            sock.bind((host, port))
+        except OSError:
+            sock.close()
+            raise
+        sock.listen(self.backlog)
+
+        sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+
+        sock.set_inheritable(True)
+
+        return sock
+
+    def tune_socket(self, sock: "socket.socket"):
+        """Apply the configured options to a TCP listening socket"""
+
+        options = [
+            (socket.IPPROTO_TCP, "TCP_DEFER_ACCEPT", self.tcp_defer_accept),
+            (socket.IPPROTO_TCP, "TCP_FASTOPEN", self.tcp_fastopen),
+            (socket.SOL_SOCKET, "SO_RCVBUF", self.rcvbuf),
+            (socket.SOL_SOCKET, "SO_SNDBUF", self.sndbuf),
+            (socket.SOL_SOCKET, "SO_BUSY_POLL", self.busy_poll),
+        ]
+
+        for level, name, value in options:
+            if not value:
+                continue
+
+            try:
+                sock.setsockopt(level, socket_option(name), value)
+            except OSError as e:
+                raise RuntimeError(f"Cannot set {name} to {value}: {e}")
+
+    def validate_socket_options(self):
+        options = {
+            "TCP_DEFER_ACCEPT": self.tcp_defer_accept,
+            "TCP_FASTOPEN": self.tcp_fastopen,
+            "SO_RCVBUF": self.rcvbuf,
+            "SO_SNDBUF": self.sndbuf,
+            "SO_BUSY_POLL": self.busy_poll,
+            "TCP_QUICKACK": self.tcp_quickack,
+        }
+
+        for name, value in options.items():
+            if value < 0:
+                raise RuntimeError(f"{name} must not be negative")
+
+            if value:
+                socket_option(name)
+
+    def create_unix_socket(self, path: str) -> "socket.socket":
+        # a socket file left by a previous run would make bind fail
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            ...
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        if self.uds_mode is not None:
+            os.chmod(path, self.uds_mode)
+        sock.listen(self.backlog)
         sock.setblocking(False)
 
         sock.set_inheritable(True)
 
         return sock
 
+    def adopt_sockets(self) -> List["socket.socket"]:
+        """Return listeners inherited through --fd or socket activation"""
+
+        fds = list(self.fds)
+
+        # https://www.freedesktop.org/software/systemd/man/sd_listen_fds.html
+        if os.environ.get("LISTEN_PID") == str(os.getpid()):
+            count = int(os.environ.get("LISTEN_FDS", 0))
+            fds.extend(range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count))
+            for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+                os.environ.pop(name, None)
+
+        sockets = []
+        for fd in fds:
+            sock = socket.socket(fileno=fd)
+            if sock.family != socket.AF_UNIX:
+                self.tune_socket(sock)
+            sock.setblocking(False)
+            sock.set_inheritable(True)
+            sockets.append(sock)
+
+        return sockets
+
     def setup_socket(self):
-        if not self.socket:
-            self.socket = self.create_socket()
+        self.validate_socket_options()
+
+        if self.sockets:
+            return
+
+        inherited = self.adopt_sockets()
+
+        if self.reuse_port and (
+            inherited or any(a.startswith("unix:") for a in self.addresses)
+        ):
+            raise RuntimeError(
+                "Per-worker listeners only support TCP addresses"
+            )
+
+        # with per-worker listeners the parent must not listen itself, the
+        # kernel would hand it connections that nobody accepts
+        if self.reuse_port and self.workers > 1:
+            return
+
+        self.sockets = inherited
+        if not inherited or self.bind:
+            self.sockets.extend(self.create_sockets())
 
     def __str__(self) -> str:
         output = ""
@@ -102,11 +375,34 @@ class Config:
         output += "=" * len(title) + "\n"
 
         entries = {
-            "Host": self.host,
-            "Port": self.port,
-            "Socket": self.socket,
+            "Listeners": ", ".join(
+                format_socket(sock) for sock in self.sockets
+            )
+            or ", ".join(self.addresses),
             "Backlog": self.backlog,
+            "Socket Options": describe_socket_options(
+                self.sockets, self.tcp_quickack
+            ),
             "Workers": self.workers,
+            "Worker Timeout": self.worker_timeout,
+            "Graceful Timeout": self.graceful_timeout,
+            "Per-worker Listeners": self.reuse_port,
+            "Threads per Worker": self.threads,
+            "CPU Affinity": self.cpu_affinity,
+            "Preload": self.preload,
+            "Worker Log Prefix": self.worker_log_prefix,
+            "Max Requests": self.max_requests,
+            "Max Requests Jitter": self.max_requests_jitter,
+            "Max RSS (MiB)": self.max_rss,
+            "Autoscaling": (
+                f"{self.min_workers}-{self.max_workers} workers"
+                if self.max_workers
+                else False
+            ),
+            "Warmup Requests": len(self.warmup),
+            "Max Connections": self.max_connections,
+            "Max Inflight Requests": self.max_inflight,
+            "Shed Target (s)": self.shed_target,
             "Auto reloading": self.reload,
             "SSL Enabled": self.ssl is not None,
             "SSL Cert File": self.ssl_cert_file,
@@ -116,8 +412,36 @@ class Config:
             "Access Log Format": self.access_log_fmt or DEFAULT_LOG_FMT,
             "Log Format": self.log_fmt or DEFAULT_LOG_FMT,
             "Lifespan": self.lifespan,
+            "Protocol": self.protocol,
+            "Event Loop": self.loop,
+            "Eager Tasks": self.eager_tasks,
         }
 
+        if self.protocol == "h11":
+            entries["Keep-Alive Timeout"] = self.keep_alive_timeout
+            entries["Response Cache (bytes)"] = self.cache_size
+            entries["Write Buffer Limits"] = (
+                f"{self.write_buffer_low}-{self.write_buffer_high} bytes"
+            )
+            entries["Max URL Size"] = self.max_url_size
+            entries["Max Header Count"] = self.max_header_count
+            entries["Max Header Size"] = self.max_header_size
+            entries["Max Body Size"] = self.max_body_size
+            entries["Header Timeout"] = self.header_timeout
+            entries["Min Body Rate (B/s)"] = self.min_body_rate
+            entries["WebSocket Max Size"] = self.ws_max_size
+            entries["WebSocket Ping Interval"] = self.ws_ping_interval
+            entries["WebSocket Ping Timeout"] = self.ws_ping_timeout
+            entries["WebSocket Compression"] = self.ws_per_message_deflate
+
+        if self.reload:
+            entries["Reload Include"] = " ".join(self.reload_include)
+            entries["Reload Exclude"] = " ".join(self.reload_exclude)
+
+        if self.protocol == "h2":
+            entries["HTTP/2 Idle Timeout"] = self.h2_idle_timeout
+            entries["HTTP/2 Ping Interval"] = self.h2_ping_interval
+
         max_key_len = max(len(k) for k in entries)
 
         for key, val in entries.items():
@@ -126,3 +450,74 @@ class Config:
 
         output += "=" * len(title) + "\n"
         return output
+
+
+def parse_address(address: str, default_port: int) -> Tuple[str, int]:
+    """Split `host:port`, `[v6host]:port` or a bare host"""
+
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif address.count(":") == 1:
+        host, port = address.split(":")
+    else:
+        host, port = address, ""
+
+    return host, int(port) if port else default_port
+
+
+def format_address(host: str, port: int) -> str:
+    if ":" in host:
+        return f"[{host}]:{port}"
+
+    return f"{host}:{port}"
+
+
+def format_socket(sock: "socket.socket") -> str:
+    if sock.family == socket.AF_UNIX:
+        return f"unix:{sock.getsockname()}"
+
+    host, port = sock.getsockname()[:2]
+    return format_address(host, port)
+
+
+def socket_option(name: str) -> int:
+    """Return the constant of a socket option supported by this platform"""
+
+    if name == "SO_BUSY_POLL" and sys.platform == "linux":
+        return SO_BUSY_POLL
+
+    value = getattr(socket, name, None)
+    if value is None:
+        raise RuntimeError(f"{name} is not supported on this platform")
+
+    return value
+
+
+def describe_socket_options(
+    sockets: List["socket.socket"], tcp_quickack: bool
+) -> str:
+    """Read back the options in effect on the first TCP listener"""
+
+    sock = next(
+        (sock for sock in sockets if sock.family != socket.AF_UNIX), None
+    )
+    if sock is None:
+        return "-"
+
+    values = []
+    for level, name in (
+        (socket.IPPROTO_TCP, "TCP_DEFER_ACCEPT"),
+        (socket.IPPROTO_TCP, "TCP_FASTOPEN"),
+        (socket.SOL_SOCKET, "SO_RCVBUF"),
+        (socket.SOL_SOCKET, "SO_SNDBUF"),
+        (socket.SOL_SOCKET, "SO_BUSY_POLL"),
+    ):
+        try:
+            value = sock.getsockopt(level, socket_option(name))
+        except (OSError, RuntimeError):
+            continue
+        values.append(f"{name}={value}")
+
+    values.append(f"TCP_QUICKACK={int(tcp_quickack)}")
+    return " ".join(values)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+import logging
 import asyncio
 from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 import urllib.parse
@@ -12,38 +14,80 @@ import h2.settings
 import h2.errors
 import hpack
 import httptools
+import hyperframe.frame
+
+from .utils import get_addresses, set_tcp_quickack
 
 if TYPE_CHECKING:
     from .server import ServerState
+    from .config import Config
     from .uhttp import ASGIHandler
 
 
+# last-stream-id of the first GOAWAY of a graceful shutdown, the client
+# learns that no new streams are accepted while in-flight ones still finish
+MAX_STREAM_ID = 2**31 - 1
+
+
 class H2Protocol(asyncio.Protocol):
-    def __init__(self, app, server_state: "ServerState"):
+    def __init__(
+        self,
+        app,
+        server_state: "ServerState",
+        logger: logging.Logger,
+        config: "Config",
+    ):
         # global scope
         self.app: "ASGIHandler" = app
         self.tasks: Set[asyncio.Task] = server_state.tasks
-        self.connections: Set[asyncio.Protocol] = server_state.connections
+        self.connections = server_state.connections
         self.loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
         self.root_path = server_state.root_path
         self.lifespan = server_state.lifespan
+        self.server_state = server_state
+        self.logger = logger
+        self.config = config
+        self.admission = server_state.admission
 
         # connection scope
-        config = h2.config.H2Configuration(client_side=False)
-        self.h2conn = h2.connection.H2Connection(config)
+        h2_config = h2.config.H2Configuration(client_side=False)
+        self.h2conn = h2.connection.H2Connection(h2_config)
         self.streams: Dict[int, "AppRunner"] = dict()
-        self.client: Tuple[str, int]
-        self.server: Tuple[str, int]
+        self.client: Optional[Tuple[str, int]]
+        self.server: Optional[Tuple[str, Optional[int]]]
         self.transport: asyncio.Transport
 
+        # liveness
+        self.last_activity: float = self.loop.time()
+        self.last_ping: float = self.last_activity
+        self.ping_sent_at: Optional[float] = None
+        self.ping_data: bytes = b""
+        self.rtt: Optional[float] = None
+        self.closing = False
+        self.last_stream_id: int = MAX_STREAM_ID
+
     def connection_made(self, transport: asyncio.Transport) -> None:  # type:ignore
         self.transport = transport
         self.h2conn.initiate_connection()
         self.transport.write(self.h2conn.data_to_send())
+        if self.admission and not self.admission.accept_connection():
+            self.h2conn.close_connection(
+                error_code=h2.errors.ErrorCodes.ENHANCE_YOUR_CALM
+            )
+            self.transport.write(self.h2conn.data_to_send())
+            self.transport.close()
+            return
         self.connections.add(self)
 
-        self.server = transport.get_extra_info("socket").getsockname()
-        self.client = transport.get_extra_info("peername")
+        self.server, self.client = get_addresses(transport)
+        if self.config.tcp_quickack:
+            set_tcp_quickack(transport)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.connections.discard(self)
+        for runner in self.streams.values():
+            runner.disconnect()
+        return super().connection_lost(exc)
 
     def data_received(self, data: bytes) -> None:
         try:
@@ -60,7 +104,10 @@ class H2Protocol(asyncio.Protocol):
 
             for event in events:
                 if isinstance(event, h2.events.RequestReceived):
-                    self.request_received(event.headers, event.stream_id)  # type:ignore
+                    if event.stream_id > self.last_stream_id:
+                        self.refuse_stream(event.stream_id)
+                    else:
+                        self.request_received(event.headers, event.stream_id)  # type:ignore
 
                 elif isinstance(event, h2.events.DataReceived):
                     self.receive_data(event.data, event.stream_id)  # type:ignore
@@ -84,6 +131,9 @@ class H2Protocol(asyncio.Protocol):
                     ):
                         self.window_updated(None, 0)
 
+                elif isinstance(event, h2.events.PingAckReceived):
+                    self.ping_acked(event.ping_data)
+
                 self.transport.write(self.h2conn.data_to_send())
 
     def request_received(
@@ -97,6 +147,9 @@ class H2Protocol(asyncio.Protocol):
         if "%" in path:
             path = urllib.parse.unquote(path)
 
+        self.last_activity = self.loop.time()
+        self.server_state.total_requests += 1
+
         # Store off the request data.
         scope = {
             "type": "http",
@@ -115,6 +168,10 @@ class H2Protocol(asyncio.Protocol):
             "client": self.client,
             "server": self.server,
             "state": self.lifespan.app_state,
+            "extensions": {
+                "http.response.trailers": {},
+                "http.response.early_hint": {},
+            },
         }
         runner = AppRunner(
             scope=scope,
@@ -124,13 +181,37 @@ class H2Protocol(asyncio.Protocol):
             stream_id=stream_id,
         )
         self.streams[stream_id] = runner
-        task = asyncio.create_task(runner.run())
+        if self.admission:
+            coro = self.admit(runner, self.loop.time())
+        else:
+            coro = runner.run()
+        task = asyncio.create_task(coro)
         self.tasks.add(task)
         task.add_done_callback(self.tasks.discard)
+        task.add_done_callback(lambda _: self.stream_done(stream_id))
         runner.task = task
 
+    async def admit(self, runner: "AppRunner", queued_at: float):
+        assert self.admission is not None
+
+        now = self.loop.time()
+        if not self.admission.accept_request() or self.admission.should_shed(
+            now - queued_at, now
+        ):
+            return await runner.run(self.admission.reject)
+
+        return await runner.run()
+
+    def refuse_stream(self, stream_id: int):
+        try:
+            self.h2conn.reset_stream(
+                stream_id, h2.errors.ErrorCodes.REFUSED_STREAM
+            )
+        except h2.exceptions.StreamClosedError:
+            ...
+
     def receive_data(self, data: bytes | None, stream_id: int):
-        if not data:
+        if not data or stream_id not in self.streams:
             return
 
         runner = self.streams[stream_id]
@@ -138,45 +219,71 @@ class H2Protocol(asyncio.Protocol):
         runner.message_event.set()
 
     def stream_complete(self, stream_id: int):
-        self.streams.pop(stream_id)
+        runner = self.streams.get(stream_id)
+        if runner:
+            runner.message_complete = True
+            runner.message_event.set()
+
+    def stream_done(self, stream_id: int):
+        self.streams.pop(stream_id, None)
+        self.last_activity = self.loop.time()
+
+        if self.closing and not self.streams:
+            self.close()
 
     def stream_reset(self, stream_id: int):
-        runner = self.streams[stream_id]
-        if runner.flow_control:
-            runner.flow_control.cancel()
-            runner.flow_control = None
+        # the stream may be unknown or its runner already done
+        runner = self.streams.get(stream_id)
+        if runner:
+            runner.disconnect()
 
     def window_updated(self, stream_id: int | None, delta: int | None):
-        if stream_id and stream_id in self.streams:
-            runner = self.streams[stream_id]
+        if stream_id:
+            runner = self.streams.get(stream_id)
+            runners = [runner] if runner else []
+        else:
+            runners = list(self.streams.values())
+
+        # an update may come while the runner is not waiting for one
+        for runner in runners:
             f = runner.flow_control
-            f.set_result(delta)  # type: ignore
+            if f is not None and not f.done():
+                f.set_result(delta)
+            runner.flow_control = None
+
+    async def send_data(
+        self, data: bytes, stream_id: int, end_stream: bool = False
+    ):
+        if not data and end_stream:
+            try:
+                self.h2conn.end_stream(stream_id)
+            except (
+                h2.exceptions.StreamClosedError,
+                h2.exceptions.ProtocolError,
+            ):
+                return
 
-        elif not stream_id:
-            for runner in self.streams.values():
-                if runner.flow_control:
-                    runner.flow_control.set_result(delta)
-                    runner.flow_control = None
+            self.transport.write(self.h2conn.data_to_send())
+            return
 
-    async def send_data(self, data: bytes, stream_id: int):
         while data:
-            while self.h2conn.local_flow_control_window(stream_id) < 1:
-                try:
-                    await self.wait_for_flow_control(stream_id)
-                except asyncio.CancelledError:
-                    return data
-
-            chunk_size = min(
-                self.h2conn.local_flow_control_window(stream_id),
-                len(data),
-                self.h2conn.max_outbound_frame_size,
-            )
-
             try:
+                while self.h2conn.local_flow_control_window(stream_id) < 1:
+                    try:
+                        await self.wait_for_flow_control(stream_id)
+                    except asyncio.CancelledError:
+                        return data
+
+                chunk_size = min(
+                    self.h2conn.local_flow_control_window(stream_id),
+                    len(data),
+                    self.h2conn.max_outbound_frame_size,
+                )
+
                 self.h2conn.send_data(
                     stream_id,
                     data[:chunk_size],
-                    end_stream=(chunk_size == len(data)),
+                    end_stream=end_stream and chunk_size == len(data),
                 )
             except (
                 h2.exceptions.StreamClosedError,
@@ -192,6 +299,94 @@ class H2Protocol(asyncio.Protocol):
         self.streams[stream_id].flow_control = f
         await f
 
+    def on_tick(self, now: float):
+        """Called periodically by the server to manage connection liveness"""
+
+        if self.closing or self.transport.is_closing():
+            return
+
+        idle_timeout = self.config.h2_idle_timeout
+        if (
+            idle_timeout
+            and not self.streams
+            and now - self.last_activity >= idle_timeout
+        ):
+            self.logger.debug(f"Closing idle HTTP/2 connection {self.client}")
+            self.shutdown()
+            return
+
+        ping_interval = self.config.h2_ping_interval
+        if not ping_interval:
+            return
+
+        if self.ping_sent_at is None:
+            if now - self.last_ping >= ping_interval:
+                self.ping(now)
+
+        # a peer not acknowledging within an interval is considered dead
+        elif now - self.ping_sent_at >= ping_interval:
+            self.logger.debug(
+                f"HTTP/2 connection {self.client} missed its PING ack"
+            )
+            self.closing = True
+            self.last_stream_id = self.h2conn.highest_inbound_stream_id
+            self.close()
+
+    def ping(self, now: float):
+        self.ping_data = os.urandom(8)
+        self.ping_sent_at = self.last_ping = now
+        self.h2conn.ping(self.ping_data)
+        self.transport.write(self.h2conn.data_to_send())
+
+    def ping_acked(self, data: bytes):
+        if self.ping_sent_at is None or data != self.ping_data:
+            return
+
+        self.rtt = self.loop.time() - self.ping_sent_at
+        self.ping_sent_at = None
+        self.logger.debug(
+            f"HTTP/2 connection {self.client} rtt {self.rtt * 1000:.2f}ms"
+        )
+
+    def shutdown(self):
+        """Start a graceful shutdown of the connection
+
+        A GOAWAY with the maximum stream id is sent first so in-flight
+        streams can finish, the final GOAWAY carrying the real last stream
+        id is sent from `close` once every stream is done.
+        """
+
+        if self.closing:
+            return
+
+        self.closing = True
+        self.last_stream_id = self.h2conn.highest_inbound_stream_id
+
+        if self.transport.is_closing():
+            return
+
+        frame = hyperframe.frame.GoAwayFrame(
+            stream_id=0,
+            last_stream_id=MAX_STREAM_ID,
+            error_code=h2.errors.ErrorCodes.NO_ERROR,
+        )
+        self.transport.write(frame.serialize())
+
+        if not self.streams:
+            self.close()
+
+    def close(self):
+        if self.transport.is_closing():
+            return
+
+        try:
+            self.h2conn.close_connection(last_stream_id=self.last_stream_id)
+            self.transport.write(self.h2conn.data_to_send())
+        except h2.exceptions.ProtocolError:
+            ...
+
+        self.transport.close()
+
 
 class AppRunner:
     __slots__ = (
@@ -203,6 +398,10 @@ class AppRunner:
         "stream_id",
         "task",
         "flow_control",
+        "message_complete",
+        "trailers",
+        "pending_trailers",
+        "disconnected",
     )
 
     def __init__(
@@ -219,21 +418,39 @@ class AppRunner:
         self.body = b""
         self.protocol = protocol
         self.stream_id = stream_id
-        self.task: asyncio.Task
+        # set once created, an eagerly started task may send before that
+        self.task: Optional[asyncio.Task] = None
         self.flow_control: Optional[asyncio.Future] = None
+        self.message_complete: bool = False
+        self.trailers: bool = False
+        self.pending_trailers: List[Tuple[bytes, bytes]] = []
+        self.disconnected: bool = False
+
+    def disconnect(self):
+        """The stream was reset or the connection lost"""
 
-    async def run(self):
+        self.disconnected = True
+        self.message_event.set()
+        if self.flow_control:
+            self.flow_control.cancel()
+            self.flow_control = None
+
+    async def run(self, app: Optional["ASGIHandler"] = None):
         try:
-            return await self.app(self.scope, self.receive, self.send)
+            return await (app or self.app)(self.scope, self.receive, self.send)
         except asyncio.CancelledError:
             ...
 
     async def receive(self):
         await self.message_event.wait()
+        if self.disconnected and not self.body:
+            return {"type": "http.disconnect"}
+
         self.message_event.clear()
         event = {
             "type": "http.request",
             "body": self.body,
+            "more_body": not self.message_complete,
         }
         self.body = b""
         return event
@@ -242,24 +459,49 @@ class AppRunner:
         _type = event["type"]
 
         if _type == "http.response.start":
+            self.trailers = event.get("trailers", False)
             data = [
                 (b":status", str(event["status"]).encode("ascii")),
-                *event["headers"],
+                *event.get("headers", []),
             ]
 
             await self.send_headers(data)
 
         elif _type == "http.response.body":
-            body = event.get("body")
-            if body:
-                await self.send_body(body)
+            body = event.get("body") or b""
+            more_body = event.get("more_body", False)
+            end_stream = not more_body and not self.trailers
+            if body or end_stream:
+                await self.send_body(body, end_stream)
+
+        elif _type == "http.response.trailers":
+            self.pending_trailers.extend(event.get("headers", []))
+            if not event.get("more_trailers", False):
+                await self.send_headers(self.pending_trailers, end_stream=True)
+                self.pending_trailers = []
+
+        elif _type == "http.response.early_hint":
+            data = [
+                (b":status", b"103"),
+                *((b"link", link) for link in event.get("links", [])),
+            ]
+            await self.send_headers(data)
 
-    async def send_headers(self, headers: List[Tuple[bytes, bytes]]):
+    async def send_headers(
+        self, headers: List[Tuple[bytes, bytes]], end_stream: bool = False
+    ):
         try:
-            self.protocol.h2conn.send_headers(self.stream_id, headers)
+            self.protocol.h2conn.send_headers(
+                self.stream_id, headers, end_stream=end_stream
+            )
         except h2.exceptions.ProtocolError:
             if self.task:
                 self.task.cancel("Error when sending headers")
+        else:
+            self.protocol.transport.write(self.protocol.h2conn.data_to_send())
+
+    async def send_body(self, data: bytes, end_stream: bool = False):
+        if self.disconnected:
+            return
 
-    async def send_body(self, data: bytes):
-        await self.protocol.send_data(data, self.stream_id)
+        await self.protocol.send_data(data, self.stream_id, end_stream)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, Literal
+import logging
+from typing import Any, Dict, Literal, Optional
 
 from .uhttp import ASGIScope
 
@@ -12,8 +13,9 @@ class LifespanScope(ASGIScope):
 
 
 class Lifespan:
-    def __init__(self, app):
+    def __init__(self, app, logger: Optional[logging.Logger] = None):
         self.app = app
+        self.logger = logger or logging.getLogger(__name__)
         self.app_state = dict()
         self.event_queue = asyncio.Queue()
         self.startup_done = asyncio.Event()
@@ -21,6 +23,10 @@ class Lifespan:
         self.shutdown_complete = True
         self.startup_complete = True
         self.message = None
+        # whether the application called receive(), one raising before is
+        # taken as not supporting lifespan
+        self.received = False
+        self.shutting_down = False
         self.scope: LifespanScope = {
             "type": "lifespan",
             "asgi": {"version": "2.5", "spec_version": "2.0"},
@@ -58,16 +64,36 @@ class Lifespan:
             raise RuntimeError(f"Event {_type} is invalid")
 
     async def receive(self):
+        self.received = True
         return await self.event_queue.get()
 
     async def main(self):
         try:
             await self.app(self.scope, self.receive, self.send)
 
-        except Exception:
-            ...
+        except Exception as e:
+            if not self.received:
+                self.logger.debug(f"Lifespan is not supported: {e!r}")
+
+            elif not self.startup_done.is_set():
+                self.logger.exception("Lifespan startup failed")
+                self.startup_complete = False
+                self.message = repr(e)
+
+            else:
+                self.logger.exception("Lifespan failed")
+                if self.shutting_down:
+                    self.shutdown_complete = False
+                    self.message = repr(e)
+
+        finally:
+            # an application without lifespan support returns or raises
+            # without completing startup, it is served without lifespan
+            self.startup_done.set()
+            self.shutdown_done.set()
 
     async def shutdown(self):
+        self.shutting_down = True
         await self.event_queue.put({"type": "lifespan.shutdown"})
         await self.shutdown_done.wait()
 
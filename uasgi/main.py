@@ -1,26 +1,32 @@
 from __future__ import annotations
 
 import sys
-from typing import TYPE_CHECKING, Callable, Optional
-
-import uvloop
-
-from uasgi.worker import Worker
+from typing import TYPE_CHECKING, Callable, List, Optional
 
 from .config import Config, Protocol
-from .arbiter import Arbiter
+from .utils import event_loop_factory
 
 
 if TYPE_CHECKING:
     from .uhttp import ASGIHandler
-    from .utils import LOG_LEVEL
+    from .utils import EVENT_LOOP, LOG_LEVEL
+    from .warmup import WarmupSpec
 
 
 def run(
     app: str | Callable[[], "ASGIHandler"] | "ASGIHandler",
     host: str = "127.0.0.1",
     port: int = 5000,
-    backlog: Optional[int] = 1024,
+    bind: Optional[List[str]] = None,
+    fds: Optional[List[int]] = None,
+    uds_mode: Optional[int] = None,
+    backlog: Optional[int] = None,
+    tcp_defer_accept: Optional[int] = None,
+    tcp_fastopen: Optional[int] = None,
+    tcp_quickack: bool = False,
+    rcvbuf: Optional[int] = None,
+    sndbuf: Optional[int] = None,
+    busy_poll: Optional[int] = None,
     workers: Optional[int] = 1,
     ssl_cert_file: Optional[str] = None,
     ssl_key_file: Optional[str] = None,
@@ -28,17 +34,61 @@ def run(
     access_log: bool = True,
     lifespan: bool = True,
     reload: Optional[bool] = False,
+    reload_include: Optional[List[str]] = None,
+    reload_exclude: Optional[List[str]] = None,
     log_fmt: Optional[str] = None,
     access_log_fmt: Optional[str] = None,
     protocol: Optional[Protocol] = "h11",
+    keep_alive_timeout: Optional[float] = None,
+    h2_idle_timeout: Optional[float] = None,
+    h2_ping_interval: Optional[float] = None,
+    worker_timeout: Optional[float] = None,
+    graceful_timeout: Optional[float] = None,
+    reuse_port: bool = False,
+    threads: Optional[int] = None,
+    cpu_affinity: bool = False,
+    preload: bool = False,
+    worker_log_prefix: bool = False,
+    max_requests: Optional[int] = None,
+    max_requests_jitter: Optional[int] = None,
+    max_rss: Optional[int] = None,
+    min_workers: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    warmup: Optional[List["WarmupSpec"]] = None,
+    warmup_timeout: Optional[float] = None,
+    max_connections: Optional[int] = None,
+    max_inflight: Optional[int] = None,
+    shed_target: Optional[float] = None,
+    max_url_size: Optional[int] = None,
+    max_header_count: Optional[int] = None,
+    max_header_size: Optional[int] = None,
+    max_body_size: Optional[int] = None,
+    header_timeout: Optional[float] = None,
+    min_body_rate: Optional[int] = None,
+    ws_max_size: Optional[int] = None,
+    ws_ping_interval: Optional[float] = None,
+    ws_ping_timeout: Optional[float] = None,
+    ws_per_message_deflate: bool = True,
+    write_buffer_high: Optional[int] = None,
+    write_buffer_low: Optional[int] = None,
+    cache_size: Optional[int] = None,
+    loop: Optional["EVENT_LOOP"] = None,
+    eager_tasks: bool = False,
 ):
-    uvloop.install()
-
     config = Config(
         app,
         host=host,
         port=port,
+        bind=bind,
+        fds=fds,
+        uds_mode=uds_mode,
         backlog=backlog,
+        tcp_defer_accept=tcp_defer_accept,
+        tcp_fastopen=tcp_fastopen,
+        tcp_quickack=tcp_quickack,
+        rcvbuf=rcvbuf,
+        sndbuf=sndbuf,
+        busy_poll=busy_poll,
         workers=workers,
         ssl_key_file=ssl_key_file,
         ssl_cert_file=ssl_cert_file,
@@ -48,17 +98,62 @@ def run(
         access_log_fmt=access_log_fmt,
         log_fmt=log_fmt,
         reload=reload,
+        reload_include=reload_include,
+        reload_exclude=reload_exclude,
         protocol=protocol,
+        keep_alive_timeout=keep_alive_timeout,
+        h2_idle_timeout=h2_idle_timeout,
+        h2_ping_interval=h2_ping_interval,
+        worker_timeout=worker_timeout,
+        graceful_timeout=graceful_timeout,
+        reuse_port=reuse_port,
+        threads=threads,
+        cpu_affinity=cpu_affinity,
+        preload=preload,
+        worker_log_prefix=worker_log_prefix,
+        max_requests=max_requests,
+        max_requests_jitter=max_requests_jitter,
+        max_rss=max_rss,
+        min_workers=min_workers,
+        max_workers=max_workers,
+        warmup=warmup,
+        warmup_timeout=warmup_timeout,
+        max_connections=max_connections,
+        max_inflight=max_inflight,
+        shed_target=shed_target,
+        max_url_size=max_url_size,
+        max_header_count=max_header_count,
+        max_header_size=max_header_size,
+        max_body_size=max_body_size,
+        header_timeout=header_timeout,
+        min_body_rate=min_body_rate,
+        ws_max_size=ws_max_size,
+        ws_ping_interval=ws_ping_interval,
+        ws_ping_timeout=ws_ping_timeout,
+        ws_per_message_deflate=ws_per_message_deflate,
+        write_buffer_high=write_buffer_high,
+        write_buffer_low=write_buffer_low,
+        cache_size=cache_size,
+        loop=loop,
+        eager_tasks=eager_tasks,
     )
+    # a missing uvloop fails here rather than in every worker
+    event_loop_factory(config.loop)
     config.setup_socket()
 
     sys.stdout.write(str(config))
 
-    if config.workers == 1:
+    # recycling and autoscaling need the arbiter to start workers
+    supervised = config.max_requests or config.max_rss or config.max_workers
+    if config.workers == 1 and (config.reload or not supervised):
+        from .worker import Worker
+
         return Worker(
             config=config,
         ).run(blocking=True)
 
+    from .arbiter import Arbiter
+
     Arbiter(
         config=config,
     ).main()
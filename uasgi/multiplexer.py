@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import select
+import asyncio
+from typing import Dict, List
+
+
+class Pipe:
+    __slots__ = ("fd", "out_fd", "prefix", "partial")
+
+    def __init__(self, fd: int, out_fd: int, prefix: bytes):
+        self.fd = fd
+        self.out_fd = out_fd
+        self.prefix = prefix
+        self.partial = b""
+
+
+class OutputMultiplexer:
+    """Forward the output of worker pipes to the arbiter's stdio
+
+    Pipes are drained with large non-blocking reads, incomplete lines are
+    kept per pipe until their newline arrives so lines of different workers
+    never interleave, and everything read in one loop iteration is written
+    to each output with a single write.
+    """
+
+    READ_SIZE = 64 * 1024
+    # a partial line longer than this is forwarded without waiting for its
+    # newline so one worker cannot grow the buffer without bound
+    MAX_LINE_SIZE = 64 * 1024
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pipes: Dict[int, Pipe] = {}
+        self.buffers: Dict[int, List[bytes]] = {}
+        self.flush_scheduled = False
+
+    def add(self, fd: int, out_fd: int, prefix: bytes = b""):
+        os.set_blocking(fd, False)
+        self.pipes[fd] = Pipe(fd, out_fd, prefix)
+        self.loop.add_reader(fd, self.read, fd)
+
+    def remove(self, fd: int):
+        pipe = self.pipes.pop(fd, None)
+        if pipe is None:
+            return
+
+        self.loop.remove_reader(fd)
+        if pipe.partial:
+            self.feed(pipe, b"\n")
+        os.close(fd)
+
+    def read(self, fd: int):
+        pipe = self.pipes[fd]
+
+        while True:
+            try:
+                data = os.read(fd, self.READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+
+            if not data:
+                self.remove(fd)
+                break
+
+            self.feed(pipe, data)
+
+            if len(data) < self.READ_SIZE:
+                break
+
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def feed(self, pipe: Pipe, data: bytes):
+        data = pipe.partial + data
+        end = data.rfind(b"\n") + 1
+
+        if not end:
+            if len(data) < self.MAX_LINE_SIZE:
+                pipe.partial = data
+                return
+
+            data += b"\n"
+            end = len(data)
+
+        lines, pipe.partial = data[:end], data[end:]
+
+        if pipe.prefix:
+            lines = (
+                pipe.prefix
+                + lines[:-1].replace(b"\n", b"\n" + pipe.prefix)
+                + b"\n"
+            )
+
+        self.buffers.setdefault(pipe.out_fd, []).append(lines)
+
+    def flush(self):
+        self.flush_scheduled = False
+        buffers, self.buffers = self.buffers, {}
+
+        for out_fd, chunks in buffers.items():
+            view = memoryview(b"".join(chunks))
+            while view:
+                try:
+                    written = os.write(out_fd, view)
+                except BlockingIOError:
+                    select.select([], [out_fd], [])
+                    continue
+                except OSError:
+                    break
+                view = view[written:]
+
+    def close(self):
+        for fd in list(self.pipes):
+            self.read(fd)
+            self.remove(fd)
+        self.flush()
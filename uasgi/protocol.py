@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 import logging
 import asyncio
 import urllib.parse
@@ -8,9 +9,18 @@ from typing import TYPE_CHECKING, List, Literal, Optional, Set, Tuple
 
 import httptools
 
-from .uhttp import HTTPScope, HttpScopeRunner, ASGIHandler
+from .uhttp import (
+    HTTPScope,
+    HttpScopeRunner,
+    ASGIHandler,
+    WebSocketScope,
+    log_access,
+)
+from .websocket import WebSocketProtocol, is_websocket_upgrade
+from .utils import get_addresses, set_tcp_quickack
 
 if TYPE_CHECKING:
+    from .cache import CacheEntry
     from .server import ServerState
     from .config import Config
 
@@ -21,6 +31,22 @@ NO_BODY_METHOD = {
     "HEAD",
 }
 
+# seconds an idle connection stays open once the server is draining, so a
+# request already on the wire is answered instead of reset
+DRAIN_IDLE_TIMEOUT = 1.0
+# seconds a request body may arrive below `min_body_rate` before it counts
+BODY_RATE_GRACE = 5.0
+# bytes of request body buffered for the app before reading is paused
+MAX_BUFFERED_BODY = 64 * 1024
+
+
+class RequestRejected(Exception):
+    """Raised from parser callbacks to answer with `status` and close"""
+
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
 
 class H11Protocol(asyncio.Protocol):
     def __init__(
@@ -35,7 +61,7 @@ class H11Protocol(asyncio.Protocol):
         # global scope
         self.app: "ASGIHandler" = app
         self.tasks: Set[asyncio.Task] = server_state.tasks
-        self.connections: Set[asyncio.Protocol] = server_state.connections
+        self.connections = server_state.connections
         self.loop: asyncio.AbstractEventLoop = (
             loop or asyncio.get_running_loop()
         )
@@ -48,8 +74,8 @@ class H11Protocol(asyncio.Protocol):
         # connection scope
         self.parser = httptools.HttpRequestParser(self)  # type: ignore
         self.parser.set_dangerous_leniencies(lenient_data_after_close=True)
-        self.client: Tuple[str, int]
-        self.server: Tuple[str, int]
+        self.client: Optional[Tuple[str, int]]
+        self.server: Optional[Tuple[str, Optional[int]]]
         self.transport: asyncio.Transport
         self.pipeline: deque["HttpScopeRunner"] = deque()
         self.ready_write: asyncio.Event
@@ -59,15 +85,36 @@ class H11Protocol(asyncio.Protocol):
         self.scope: "HTTPScope"
         self.scheme: Optional[Literal["https", "http"]]
         self.headers: List[Tuple[bytes, bytes]]
+        self.header_size: int = 0
+        self.head_size: int = 0
+        self.head_started: Optional[float] = None
+        self.body_size: int = 0
+        self.body_started: Optional[float] = None
+        self.body_received: int = 0
+        self.reading_paused = False
+        self.websocket: Optional[WebSocketProtocol] = None
+        self.upgrade_data = b""
         self.current_runner: Optional["HttpScopeRunner"] = None
+        self.closing = False
+        self.last_activity: float = self.loop.time()
+        self.admission = server_state.admission
+        self.cache = server_state.cache
+        # requests of a connection over the connection limit are rejected
+        self.rejected = False
 
     def connection_made(self, transport: asyncio.Transport) -> None:  # type:ignore
         self.transport = transport
-        self.server = transport.get_extra_info("socket").getsockname()
-        self.client = transport.get_extra_info("peername")
+        self.server, self.client = get_addresses(transport)
         self.ssl = transport.get_extra_info("sslcontext")
         self.ready_write = asyncio.Event()
         self.ready_write.set()
+        transport.set_write_buffer_limits(
+            high=self.config.write_buffer_high,
+            low=self.config.write_buffer_low,
+        )
+        if self.admission and not self.admission.accept_connection():
+            self.rejected = True
+        self.connections.add(self)
         if self.ssl:
             self.scheme = "https"
         else:
@@ -81,18 +128,88 @@ class H11Protocol(asyncio.Protocol):
 
     def connection_lost(self, exc: Exception | None) -> None:
         self.connections.discard(self)
+        self.ready_write.set()
+        if self.current_runner:
+            self.current_runner.disconnect()
         return super().connection_lost(exc)
 
     def data_received(self, data: bytes) -> None:
-        self.parser.feed_data(data)
+        self.last_activity = self.loop.time()
+        try:
+            self.parser.feed_data(data)
+        except httptools.HttpParserUpgrade as e:
+            self.upgrade(data[e.args[0] :])
+            return
+        except httptools.HttpParserCallbackError as e:
+            if not isinstance(e.__context__, RequestRejected):
+                raise
+            self.reject(e.__context__.status)
+            return
+        except httptools.HttpParserError as e:
+            self.logger.debug(f"Invalid request from {self.client}: {e}")
+            self.reject(400)
+            return
+
+        # bounds what the parser buffers for a head still incomplete
+        if self.head_started is not None:
+            self.head_size += len(data)
+            limit = self.config.max_url_size + self.config.max_header_size
+            if self.config.max_header_size and self.head_size > limit:
+                self.reject(431)
+
+    def reject(self, status: int):
+        """Answer with an empty `status` response and close
+
+        The response is only written when no other response can be in
+        flight on the connection, otherwise it is just closed.
+        """
+
+        self.closing = True
+        if self.current_runner is None and not self.pipeline:
+            self.transport.write(
+                HttpScopeRunner.build_http_response_header(
+                    status=status,
+                    http_version="1.1",
+                    headers=[
+                        (b"content-length", b"0"),
+                        (b"connection", b"close"),
+                    ],
+                )
+            )
+        self.transport.close()
+
+    def pause_reading(self):
+        if not self.reading_paused:
+            self.reading_paused = True
+            self.transport.pause_reading()
+
+    def resume_reading(self):
+        if self.reading_paused:
+            self.reading_paused = False
+            self.transport.resume_reading()
+            # time spent paused does not count against the client
+            if self.body_started is not None:
+                self.body_started = self.loop.time()
+                self.body_received = 0
 
     # -------------------- for parser ------------------------
     def on_url(self, url: bytes):
         self.url += url
+        if (
+            self.config.max_url_size
+            and len(self.url) > self.config.max_url_size
+        ):
+            raise RequestRejected(414)
 
     def on_message_begin(self):
         self.url = b""
         self.headers = []
+        self.header_size = 0
+        self.head_size = 0
+        self.head_started = self.loop.time()
+        self.body_size = 0
+        if self.config.tcp_quickack:
+            set_tcp_quickack(self.transport)
 
         self.scope = {
             "method": b"",
@@ -111,12 +228,43 @@ class H11Protocol(asyncio.Protocol):
             "client": self.client,
             "server": self.server,
             "state": self.lifespan.app_state,
+            "extensions": {
+                "http.response.trailers": {},
+                "http.response.early_hint": {},
+                "http.response.pathsend": {},
+                "http.response.zerocopysend": {},
+            },
         }
 
     def on_header(self, name: bytes, value: bytes):
         self.headers.append((name, value))
+        self.header_size += len(name) + len(value)
+        config = self.config
+        if (
+            config.max_header_count
+            and len(self.headers) > config.max_header_count
+        ) or (
+            config.max_header_size
+            and self.header_size > config.max_header_size
+        ):
+            raise RequestRejected(431)
 
     def on_headers_complete(self):
+        self.head_started = None
+        self.body_started = self.loop.time()
+        self.body_received = 0
+
+        max_body_size = self.config.max_body_size
+        if max_body_size:
+            for name, value in self.headers:
+                if (
+                    name.lower() == b"content-length"
+                    and value.isdigit()
+                    and int(value) > max_body_size
+                ):
+                    raise RequestRejected(413)
+
+        self.server_state.total_requests += 1
         parsed_url = httptools.parse_url(self.url)  # type: ignore
         raw_path = parsed_url.path
         path = raw_path.decode("ascii")
@@ -128,17 +276,43 @@ class H11Protocol(asyncio.Protocol):
         self.scope["raw_path"] = raw_path
         self.scope["query_string"] = parsed_url.query or b""
 
+        if self.parser.should_upgrade() and is_websocket_upgrade(self.headers):
+            self.websocket = self.create_websocket()
+            return
+
+        # HTTP/1.0 without keep-alive and `Connection: close` end here
+        keep_alive = self.parser.should_keep_alive() and not (
+            self.closing or self.rejected
+        )
+
+        if (
+            self.cache
+            and self.current_runner is None
+            and not (self.closing or self.rejected)
+        ):
+            entry = self.cache.lookup(self.scope)
+            if entry is not None:
+                self.send_cached(entry, keep_alive)
+                return
+
         runner = HttpScopeRunner(
             scope=self.scope,
-            app=self.app,
+            app=self.cache or self.app,
             transport=self.transport,
             message_event=asyncio.Event(),
             message_complete=self.scope["method"] in NO_BODY_METHOD,
             on_response_complete=self.on_response_complete,
+            resume_reading=self.resume_reading,
             ready_write=self.ready_write,
             config=self.config,
             access_logger=self.access_logger,
         )
+        runner.keep_alive = keep_alive
+
+        # the body is only asked for once the app wants it, see `receive`
+        if self.expects_continue():
+            runner.expect_continue = True
+            self.pause_reading()
 
         if self.current_runner:
             self.pipeline.appendleft(runner)
@@ -147,23 +321,248 @@ class H11Protocol(asyncio.Protocol):
             self.current_runner = runner
             self.schedule_runner(runner)
 
+    def expects_continue(self) -> bool:
+        if self.parser.get_http_version() != "1.1":
+            return False
+
+        for name, value in self.headers:
+            if name.lower() == b"expect":
+                return value.strip().lower() == b"100-continue"
+        return False
+
+    def send_cached(self, entry: "CacheEntry", keep_alive: bool):
+        """Answer straight from the cache without starting a task"""
+
+        start_time = time.perf_counter_ns()
+        head = self.scope["method"] == "HEAD"
+        if keep_alive:
+            self.transport.write(entry.head if head else entry.response)
+        else:
+            # the prebuilt head ends with its blank line
+            self.transport.write(entry.head[:-2] + b"connection:close\r\n\r\n")
+            if not head:
+                self.transport.write(entry.body)
+        self.last_activity = self.loop.time()
+
+        if self.config.access_log:
+            log_access(
+                self.access_logger,
+                self.scope,
+                entry.status,
+                0 if head else len(entry.body),
+                start_time,
+            )
+
+        if not keep_alive:
+            self.closing = True
+            self.transport.close()
+
+    def create_websocket(self) -> WebSocketProtocol:
+        if self.rejected:
+            raise RequestRejected(503)
+
+        version = key = b""
+        subprotocols = []
+        for name, value in self.headers:
+            name = name.lower()
+            if name == b"sec-websocket-key":
+                key = value
+            elif name == b"sec-websocket-version":
+                version = value.strip()
+            elif name == b"sec-websocket-protocol":
+                subprotocols.extend(
+                    p.strip().decode("latin-1") for p in value.split(b",")
+                )
+        if not key or version != b"13":
+            raise RequestRejected(400)
+
+        scope: WebSocketScope = {
+            "type": "websocket",
+            "asgi": self.scope["asgi"],
+            "http_version": "1.1",
+            "scheme": "wss" if self.ssl else "ws",
+            "path": self.scope["path"],
+            "raw_path": self.scope["raw_path"],
+            "query_string": self.scope["query_string"],
+            "root_path": self.scope["root_path"],
+            "headers": self.headers,
+            "client": self.client,
+            "server": self.server,
+            "subprotocols": subprotocols,
+            "state": self.scope["state"],
+            "extensions": {},
+        }
+        return WebSocketProtocol(
+            app=self.app,
+            scope=scope,
+            server_state=self.server_state,
+            logger=self.logger,
+            access_logger=self.access_logger,
+            config=self.config,
+            loop=self.loop,
+        )
+
+    def upgrade(self, data: bytes):
+        """Called once the parser stopped at an Upgrade request
+
+        A WebSocket takes the transport over as soon as the responses before
+        it are sent, other upgrades are ignored and the connection is closed
+        after the response.
+        """
+
+        if self.websocket is None:
+            self.closing = True
+            if self.current_runner:
+                self.current_runner.keep_alive = False
+            return
+
+        self.upgrade_data = data
+        if self.current_runner is None:
+            self.switch_to_websocket()
+        else:
+            self.pause_reading()
+
+    def switch_to_websocket(self):
+        websocket = self.websocket
+        assert websocket is not None
+
+        self.connections.discard(self)
+        self.transport.set_protocol(websocket)
+        websocket.connection_made(self.transport)
+        if self.reading_paused:
+            self.reading_paused = False
+            self.transport.resume_reading()
+        if self.upgrade_data:
+            websocket.data_received(self.upgrade_data)
+
     def schedule_runner(self, runner: "HttpScopeRunner"):
-        task = self.loop.create_task(runner.run())
+        # a pipelined request waiting for the previous response is not
+        # queued by the server yet
+        runner.queued_at = self.loop.time()
+        if self.admission:
+            coro = self.admit(runner)
+        else:
+            coro = runner.run()
+
+        task = self.loop.create_task(coro)
         runner.task = task
         task.add_done_callback(self.tasks.discard)
         self.tasks.add(task)
 
+    async def admit(self, runner: "HttpScopeRunner"):
+        assert self.admission is not None
+
+        now = self.loop.time()
+        if (
+            self.rejected
+            or not self.admission.accept_request()
+            or self.admission.should_shed(now - runner.queued_at, now)
+        ):
+            return await runner.run(self.admission.reject)
+
+        return await runner.run()
+
     def on_response_complete(self):
-        self.current_runner = None
+        runner, self.current_runner = self.current_runner, None
+        self.last_activity = self.loop.time()
+        self.resume_reading()
+
+        if self.closing or (runner and not runner.keep_alive):
+            self.transport.close()
+            return
 
         if self.pipeline:
             runner = self.pipeline.pop()
+            self.current_runner = runner
             self.schedule_runner(runner)
 
+        elif self.websocket:
+            self.switch_to_websocket()
+
+    def on_tick(self, now: float):
+        if self.too_slow(now):
+            self.logger.debug(f"Closing slow connection {self.client}")
+            self.reject(408)
+            return
+
+        if self.current_runner is not None:
+            return
+
+        idle = now - self.last_activity
+        if self.closing and idle >= DRAIN_IDLE_TIMEOUT:
+            self.transport.close()
+
+        elif (
+            self.config.keep_alive_timeout
+            and idle >= self.config.keep_alive_timeout
+        ):
+            self.logger.debug(f"Closing idle connection {self.client}")
+            self.transport.close()
+
+    def too_slow(self, now: float) -> bool:
+        """Whether the client sends its request slower than allowed
+
+        A request head must be complete within `header_timeout` and, after
+        BODY_RATE_GRACE, its body must arrive at `min_body_rate` at least
+        while the server is reading it.
+        """
+
+        config = self.config
+        if self.head_started is not None:
+            return bool(
+                config.header_timeout
+                and now - self.head_started >= config.header_timeout
+            )
+
+        if (
+            self.body_started is None
+            or self.reading_paused
+            or not config.min_body_rate
+        ):
+            return False
+
+        elapsed = now - self.body_started
+        return (
+            elapsed >= BODY_RATE_GRACE
+            and self.body_received < elapsed * config.min_body_rate
+        )
+
+    def shutdown(self):
+        """Stop keeping the connection alive
+
+        A busy connection is closed once its response is sent, with a
+        `Connection: close` header if the response has not started yet. An
+        idle one is closed at once, unless it was active within the last
+        DRAIN_IDLE_TIMEOUT, then `on_tick` closes it once that has passed.
+        """
+
+        if self.closing:
+            return
+
+        self.closing = True
+
+        if self.current_runner:
+            self.current_runner.keep_alive = False
+
+        else:
+            self.on_tick(self.loop.time())
+
     def on_body(self, body: bytes):
+        self.body_size += len(body)
+        self.body_received += len(body)
+        if (
+            self.config.max_body_size
+            and self.body_size > self.config.max_body_size
+        ):
+            raise RequestRejected(413)
+
         if self.current_runner:
             self.current_runner.set_body(body)
+            if len(self.current_runner.body) >= MAX_BUFFERED_BODY:
+                self.pause_reading()
 
     def on_message_complete(self):
+        self.body_started = None
         if self.current_runner:
             self.current_runner.message_complete = True
+            self.current_runner.message_event.set()
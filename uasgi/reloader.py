@@ -1,7 +1,16 @@
 import os
+import sys
+import json
+import site
+import logging
 import time
+import signal
+import fnmatch
+import sysconfig
+import importlib
 import threading
-from typing import TYPE_CHECKING
+import traceback
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 
 from watchdog.events import (
     FileSystemEvent,
@@ -17,7 +26,7 @@ from watchdog.events import (
 )
 from watchdog.observers import Observer
 
-from .utils import create_logger
+from .utils import create_logger, load_app
 
 
 if TYPE_CHECKING:
@@ -52,12 +61,93 @@ class Reloader(FileSystemEventHandler):
         self.stop_event = threading.Event()
         self.observer = Observer()
         self.reload_last_time = time.time()
+        self.ignored_prefixes = get_library_paths()
+        # (path, recursive) of the directories holding project modules
+        self.watch_paths: List[Tuple[str, bool]] = []
 
         self.worker: "Worker"
 
+    def discover(self):
+        """Find the project directories to watch and the modules to preload
+
+        The application is imported once in a forked child which reports the
+        modules it imported; project modules decide what is watched and every
+        other module is imported once by the template process.
+        """
+
+        # Worker.run refuses to reload an app that is not an import string
+        assert isinstance(self.worker.app, str)
+
+        started_at = time.monotonic()
+        modules = import_in_child(self.worker.app)
+        if modules is None:
+            self.logger.warning(
+                "Could not import the application to find its modules, "
+                "watching the current directory"
+            )
+            self.watch_paths = [(os.getcwd(), True)]
+            return
+
+        watch_paths: Dict[str, bool] = {}
+        for name, filename in modules.items():
+            if not filename or self.is_ignored(filename):
+                self.worker.preimport_modules.append(name)
+                continue
+
+            top_level = name.partition(".")[0]
+            top_filename = modules.get(top_level) or filename
+            if os.path.basename(top_filename) == "__init__.py":
+                # packages are watched as a whole so new submodules count
+                watch_paths[os.path.dirname(top_filename)] = True
+            else:
+                path = os.path.dirname(top_filename)
+                watch_paths[path] = watch_paths.get(path, False)
+
+        self.watch_paths = sorted(watch_paths.items())
+        self.logger.debug(
+            f"Found {len(modules)} modules in "
+            f"{(time.monotonic() - started_at) * 1000:.0f}ms, watching "
+            + ", ".join(path for path, _ in self.watch_paths)
+        )
+
+    def is_ignored(self, path: str) -> bool:
+        """Whether `path` belongs to the interpreter or installed packages"""
+
+        return is_library_file(path, self.ignored_prefixes)
+
+    def watched_roots(self) -> List[Tuple[str, bool]]:
+        return self.watch_paths or [(os.getcwd(), True)]
+
+    def relative_parts(self, path: str) -> Optional[List[str]]:
+        """Parts of `path` below the deepest watched root holding it
+
+        Both the path and the roots are resolved, so symlinks and a working
+        directory outside the project do not yield `..` parts. None is
+        returned for a path outside every root.
+        """
+
+        for candidate in dict.fromkeys(
+            (os.path.abspath(path), os.path.realpath(path))
+        ):
+            roots = [
+                resolved
+                for root, _ in self.watched_roots()
+                for resolved in (os.path.abspath(root), os.path.realpath(root))
+                if is_relative_to(candidate, resolved)
+            ]
+            if roots:
+                relpath = os.path.relpath(candidate, max(roots, key=len))
+                return [
+                    part
+                    for part in relpath.split(os.sep)
+                    if part not in (os.curdir, os.pardir)
+                ]
+
+        return None
+
     def on_any_event(self, event: FileSystemEvent) -> None:
         if self.should_reload(event):
-            filename = event.src_path
+            filename = getattr(event, "dest_path", "") or event.src_path
             self.logger.info(f"{filename} changed")
             self.changed_event.set()
 
@@ -74,11 +164,32 @@ class Reloader(FileSystemEventHandler):
         if event.is_directory:
             return False
 
-        filename = str(os.path.basename(event.src_path))
-        if filename.endswith(".py"):
-            return True
+        # editors and tools often save through a rename of a temporary file
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        return any(
+            self.is_watched(os.fsdecode(path)) for path in paths if path
+        )
 
-        return False
+    def is_watched(self, path: str) -> bool:
+        if self.is_ignored(path):
+            return False
+
+        parts = self.relative_parts(path)
+        if not parts:
+            return False
+
+        relpath = os.path.join(*parts)
+        for pattern in self.config.reload_exclude:
+            if fnmatch.fnmatch(relpath, pattern) or any(
+                fnmatch.fnmatch(part, pattern) for part in parts
+            ):
+                return False
+
+        return any(
+            fnmatch.fnmatch(relpath, pattern)
+            or fnmatch.fnmatch(parts[-1], pattern)
+            for pattern in self.config.reload_include
+        )
 
     def reload_server(self):
         self.worker.reload()
@@ -86,13 +197,13 @@ class Reloader(FileSystemEventHandler):
 
     def main(self):
         self.logger.debug("Reloader is running")
-        cwd = os.getcwd()
-        self.observer.schedule(
-            event_handler=self,
-            path=cwd,
-            recursive=True,
-            event_filter=Reloader.CHANGED_EVENT_TYPES,
-        )
+        for path, recursive in self.watched_roots():
+            self.observer.schedule(
+                event_handler=self,
+                path=path,
+                recursive=recursive,
+                event_filter=Reloader.CHANGED_EVENT_TYPES,
+            )
         self.observer.start()
 
         while not self.stop_event.is_set():
@@ -109,3 +220,193 @@ class Reloader(FileSystemEventHandler):
     def stop(self):
         self.worker.join()
         self.stop_event.set()
+
+
+def get_library_paths() -> Set[str]:
+    """Return the directories of the interpreter, virtualenv and packages"""
+
+    paths = {sys.prefix, sys.base_prefix, sys.exec_prefix}
+    paths.update(
+        sysconfig.get_paths()[name]
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    )
+    paths.update(site.getsitepackages())
+    paths.add(site.getusersitepackages())
+    if os.environ.get("VIRTUAL_ENV"):
+        paths.add(os.environ["VIRTUAL_ENV"])
+
+    return {os.path.realpath(path) for path in paths if path}
+
+
+def is_relative_to(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def is_library_file(path: str, library_paths: Set[str]) -> bool:
+    """Whether `path` is inside one of the `get_library_paths()`"""
+
+    path = os.path.realpath(path)
+    return any(is_relative_to(path, prefix) for prefix in library_paths)
+
+
+def drop_project_modules(library_paths: Set[str]) -> List[str]:
+    """Remove the modules loaded from project files from `sys.modules`
+
+    A worker forked from the template imports them again, so it sees the
+    changes which triggered the reload. uasgi itself is kept even when it
+    runs from a checkout.
+    """
+
+    dropped = []
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, "__file__", None)
+        if (
+            not filename
+            or name in ("__main__", "__mp_main__")
+            or name.partition(".")[0] == __package__
+            or is_library_file(filename, library_paths)
+        ):
+            continue
+
+        del sys.modules[name]
+        dropped.append(name)
+
+    return dropped
+
+
+def preload_modules(
+    names: List[str], library_paths: Set[str], logger: logging.Logger
+) -> int:
+    """Import the library modules `names`, returns how many were loaded
+
+    A library importing project modules, e.g. through a plugin or a
+    settings module, would keep them frozen in the template, so it is left
+    to the worker along with everything it imported.
+    """
+
+    preloaded = 0
+    for name in names:
+        if name in sys.modules:
+            continue
+
+        loaded = set(sys.modules)
+        try:
+            importlib.import_module(name)
+        except Exception:
+            ...
+
+        dropped = drop_project_modules(library_paths)
+        if dropped:
+            for added in set(sys.modules) - loaded:
+                del sys.modules[added]
+            logger.debug(
+                f"Not preloading {name}, it imports {', '.join(dropped)}"
+            )
+        elif name in sys.modules:
+            preloaded += 1
+
+    return preloaded
+
+
+def import_in_child(app: str) -> Optional[Dict[str, Optional[str]]]:
+    """Import `app` in a forked child and return the modules it loaded
+
+    Modules are mapped to their file, None for built-in modules. The child
+    exits right after so the reloader process itself stays free of
+    application code. None is returned when the import fails.
+    """
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        code = 1
+        try:
+            load_app(app)
+            modules = {
+                name: getattr(module, "__file__", None)
+                for name, module in list(sys.modules.items())
+                if name not in ("__main__", "__mp_main__")
+            }
+            with os.fdopen(write_fd, "w") as f:
+                json.dump(modules, f)
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+
+    return json.loads(data) if data else None
+
+
+def serve_template(worker: "Worker"):
+    """Entrypoint of the template process of the reloader
+
+    The template imports the third-party modules of the application once
+    and forks a worker from itself on every reload, the worker then only
+    has to import the project's own modules. SIGHUP replaces the worker,
+    SIGINT and SIGTERM stop both.
+    """
+
+    logger = create_logger(
+        __name__, worker.config.log_level, worker.config.log_fmt
+    )
+
+    library_paths = get_library_paths()
+    # inherited from a parent which imported the project, e.g. `uasgi.run()`
+    drop_project_modules(library_paths)
+
+    started_at = time.monotonic()
+    preloaded = preload_modules(
+        worker.preimport_modules, library_paths, logger
+    )
+    logger.debug(
+        f"Template preloaded {preloaded} modules in "
+        f"{(time.monotonic() - started_at) * 1000:.0f}ms"
+    )
+
+    child = 0
+    restart = stopping = False
+
+    def on_sighup(signum, frame):
+        nonlocal restart
+        restart = True
+        if child:
+            os.kill(child, signal.SIGINT)
+
+    def on_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if child:
+            os.kill(child, signum)
+
+    signal.signal(signal.SIGHUP, on_sighup)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+
+    while not stopping:
+        restart = False
+        child = os.fork()
+        if child == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            code = 0
+            try:
+                worker.main(None, None)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.waitpid(child, 0)
+        child = 0
+
+        # a worker which crashed is only started again on the next change
+        while not (restart or stopping):
+            time.sleep(0.1)
@@ -1,105 +1,345 @@
 from __future__ import annotations
 
 import os
+import time
+import random
+import signal
 import socket
 import asyncio
-from typing import Set, TYPE_CHECKING
+import threading
+from typing import Callable, List, Optional, Protocol, Set, TYPE_CHECKING
 
-from .utils import create_logger
-from .protocol import H11Protocol
-from .h2_protocol import H2Protocol
+from .utils import (
+    create_logger,
+    eager_task_factory,
+    get_rss,
+    run_event_loop,
+)
 from .lifespan import Lifespan
+from .admission import Admission
 
 
 if TYPE_CHECKING:
+    from .protocol import H11Protocol
+    from .h2_protocol import H2Protocol
+    from .websocket import WebSocketProtocol
+    from .cache import ResponseCache
     from .uhttp import ASGIHandler
     from .config import Config
 
 
+class SharedInt(Protocol):
+    """A multiprocessing `RawValue` or a plain ctypes value"""
+
+    value: int
+
+
+class SharedFloat(Protocol):
+    value: float
+
+
+class StatusReporter(Protocol):
+    """What a server publishes about its worker to the process managing it
+
+    `WorkerStatus` reports to the uasgi arbiter, `GunicornStatus` to the
+    gunicorn one.
+    """
+
+    @property
+    def inflight(self) -> SharedInt: ...
+
+    @property
+    def loop_lag(self) -> SharedFloat: ...
+
+    def beat(self) -> None: ...
+
+    def request_recycle(self) -> None: ...
+
+
 class ServerState:
     def __init__(self, lifespan: "Lifespan"):
-        self.connections: Set[asyncio.Protocol] = set()
+        self.connections: Set[H11Protocol | H2Protocol | WebSocketProtocol] = (
+            set()
+        )
         self.tasks: Set[asyncio.Task] = set()
+        self.total_requests = 0
         self.root_path = os.getcwd()
         self.lifespan: "Lifespan" = lifespan
+        self.admission: Optional["Admission"] = None
+        self.cache: Optional["ResponseCache"] = None
 
 
 class Server:
+    # interval in seconds of the coarse timer driving connection liveness
+    TICK_INTERVAL = 1.0
+
     def __init__(
         self,
         app: "ASGIHandler",
         config: "Config",
+        status: Optional[StatusReporter] = None,
+        lifespan: Optional[Lifespan] = None,
     ):
         self.config = config
+        self.status = status
         self.app = app
-        self.server: asyncio.Server
+        self.servers: List[asyncio.Server] = []
         self.logger = create_logger(__name__, config.log_level, config.log_fmt)
         self.access_logger = create_logger(
             "uasgi.access", "INFO", config.access_log_fmt
         )
-        self.lifespan = Lifespan(self.app)
+        # a lifespan passed in is shared by the servers of a process and
+        # started and shut down by their owner
+        self.shared_lifespan = lifespan is not None
+        self.lifespan = lifespan or Lifespan(self.app, self.logger)
         self.state = ServerState(self.lifespan)
+        if Admission.enabled(config):
+            self.state.admission = Admission(config, self.state)
+        if config.cache_size:
+            from .cache import ResponseCache
+
+            self.state.cache = ResponseCache(
+                self.app, config, self.state.tasks, self.logger
+            )
+        self.create_protocol = self.load_protocol()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.ticker: Optional[asyncio.TimerHandle] = None
+        self.stopped: Optional[asyncio.Future] = None
+        self.stop_requested = False
+        self.recycling = False
+        self.next_tick: float = 0.0
+        self.last_tick: float = 0.0
+        self.loop_lag: float = 0.0
+        # servers running in other threads of this process, the one holding
+        # `status` publishes their combined state
+        self.siblings: List[Server] = [self]
+        self.max_requests = 0
+        if config.max_requests:
+            # jitter spreads the recycling of workers started together
+            self.max_requests = config.max_requests + random.randint(
+                0, config.max_requests_jitter
+            )
 
     def main(self):
         """Entrypoint where server starts and runs"""
 
-        if self.config.socket is None:
+        if not self.config.sockets:
             raise RuntimeError("Socket must be binded before starting server")
 
-        asyncio.run(self.run(self.config.socket))
+        run_event_loop(self.run(self.config.sockets), self.config.loop)
 
-    async def run(self, sock: socket.socket):
+    async def run(self, sockets: List[socket.socket]):
         loop = asyncio.get_running_loop()
+        if self.config.eager_tasks:
+            # request tasks run synchronously until their first suspension,
+            # an app answering without awaiting I/O is done in data_received
+            loop.set_task_factory(eager_task_factory)
+        self.loop = loop
+        self.stopped = loop.create_future()
+        if self.stop_requested:
+            self.stopped.set_result(None)
 
-        self.server = await loop.create_server(
-            protocol_factory=self.create_protocol,
-            sock=sock,
-            ssl=self.config.get_ssl(),
-            start_serving=False,
-        )
+        for sock in sockets:
+            self.servers.append(
+                await loop.create_server(
+                    protocol_factory=self.create_protocol,
+                    sock=sock,
+                    ssl=self.config.get_ssl(),
+                    start_serving=False,
+                )
+            )
 
         await self.startup()
 
+        if self.config.warmup:
+            from .warmup import warmup
+
+            await warmup(self.app, self.config, self.state, self.logger)
+
+        self.tick()
+
+        # serve_forever would wait for every connection to be closed once it
+        # is cancelled, so serving is stopped by resolving `stopped` instead
+        # and connections are shut down gracefully in `shutdown`
+        if threading.current_thread() is threading.main_thread():
+            loop.add_signal_handler(signal.SIGTERM, self.stop)
+        for server in self.servers:
+            await server.start_serving()
+
         try:
-            await self.server.serve_forever()
+            await self.stopped
         except asyncio.CancelledError:
             ...
         finally:
             await self.shutdown()
 
-    def create_protocol(
-        self, loop: asyncio.AbstractEventLoop | None = None
-    ) -> asyncio.Protocol:
+    def load_protocol(self) -> Callable[[], asyncio.Protocol]:
+        """Import only the implementation of the configured protocol
+
+        Returns the factory creating its protocol for every connection.
+        """
+
         if self.config.protocol == "h11":
-            return H11Protocol(
-                app=self.app,
-                server_state=self.state,
-                logger=self.logger,
-                access_logger=self.access_logger,
-                config=self.config,
-                loop=loop,
-            )
+            from .protocol import H11Protocol
+
+            def create_h11() -> asyncio.Protocol:
+                return H11Protocol(
+                    app=self.app,
+                    server_state=self.state,
+                    logger=self.logger,
+                    access_logger=self.access_logger,
+                    config=self.config,
+                    loop=self.loop,
+                )
+
+            return create_h11
 
         if self.config.protocol == "h2":
-            return H2Protocol(
-                app=self.app,
-                server_state=self.state,
-            )
+            from .h2_protocol import H2Protocol
+
+            def create_h2() -> asyncio.Protocol:
+                return H2Protocol(
+                    app=self.app,
+                    server_state=self.state,
+                    logger=self.logger,
+                    config=self.config,
+                )
+
+            return create_h2
 
         raise RuntimeError(f"{self.config.protocol} is not support")
 
+    def tick(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        if self.next_tick:
+            self.loop_lag = max(0.0, now - self.next_tick)
+        self.last_tick = time.monotonic()
+
+        if self.status:
+            self.publish_status()
+
+        for connection in list(self.state.connections):
+            connection.on_tick(now)
+
+        self.next_tick = now + self.TICK_INTERVAL
+        self.ticker = loop.call_later(self.TICK_INTERVAL, self.tick)
+
+    def publish_status(self):
+        assert self.status is not None
+
+        # a loop of any thread missing its ticks stops the heartbeat so the
+        # arbiter replaces the whole process
+        now = time.monotonic()
+        if not any(
+            server.last_tick
+            and now - server.last_tick > 2 * self.TICK_INTERVAL
+            for server in self.siblings
+        ):
+            self.status.beat()
+
+        self.status.inflight.value = sum(
+            len(server.state.tasks) for server in self.siblings
+        )
+        self.status.loop_lag.value = max(
+            server.loop_lag for server in self.siblings
+        )
+        self.check_recycle()
+
+    def check_recycle(self):
+        if self.recycling or self.status is None:
+            return
+
+        total_requests = sum(
+            server.state.total_requests for server in self.siblings
+        )
+
+        reason = None
+        if self.max_requests and total_requests >= self.max_requests:
+            reason = f"served {total_requests} requests"
+
+        elif self.config.max_rss and get_rss() >= self.config.max_rss * 2**20:
+            reason = f"RSS exceeded {self.config.max_rss}MiB"
+
+        if reason:
+            self.logger.info(f"Worker {os.getpid()} {reason}, recycling")
+            self.recycling = True
+            self.status.request_recycle()
+
     async def startup(self):
         self.logger.debug("Server is starting up")
-        if self.config.lifespan:
+        if self.config.lifespan and not self.shared_lifespan:
             await self.lifespan.startup()
 
     async def shutdown(self):
         self.logger.debug("Server is shutting down")
-        if self.config.lifespan:
+
+        for server in self.servers:
+            server.close()
+        self.close_connections()
+        aborted = await self.drain(self.config.graceful_timeout)
+        if aborted:
+            self.logger.warning(
+                f"Graceful timeout exceeded, aborted {aborted} "
+                "in-flight requests"
+            )
+
+        if self.ticker:
+            self.ticker.cancel()
+            self.ticker = None
+
+        if self.config.lifespan and not self.shared_lifespan:
             await self.lifespan.shutdown()
 
-        await self.server.wait_closed()
+        for server in self.servers:
+            await server.wait_closed()
+
+    async def drain(self, timeout: float) -> int:
+        """Wait for in-flight requests to finish and connections to close
+
+        Requests still running at the deadline are cancelled and their
+        connections aborted, the number of cancelled requests is returned.
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while loop.time() < deadline and (
+            self.state.tasks or self.state.connections
+        ):
+            await asyncio.sleep(0.1)
+
+        tasks = [task for task in self.state.tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+
+        for connection in list(self.state.connections):
+            connection.transport.abort()
+
+        if tasks:
+            await asyncio.wait(tasks, timeout=1)
+
+        return len(tasks)
+
+    def close_connections(self):
+        for connection in list(self.state.connections):
+            connection.shutdown()
+
+    def stop_threadsafe(self):
+        """Stop a server running its loop in another thread"""
+
+        self.stop_requested = True
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self.stop)
+            except RuntimeError:
+                # the loop already finished
+                ...
 
     def stop(self):
+        """Stop serving, connections are drained by `shutdown`"""
+
         self.logger.debug("Server is stopping")
-        self.server.close()
+        if self.stopped and not self.stopped.done():
+            self.stopped.set_result(None)
@@ -1,11 +1,11 @@
 import os
 import time
 import socket
-import errno
 import asyncio
 import logging
 from typing import (
     TYPE_CHECKING,
+    Any,
     Callable,
     Optional,
     List,
@@ -13,6 +13,7 @@ from typing import (
     Literal,
     Iterable,
     Dict,
+    Mapping,
     TypedDict,
     Coroutine,
 )
@@ -33,11 +34,10 @@ class ASGIScope(TypedDict):
 ASGIHandler = Callable[[ASGIScope, Callable, Callable], Coroutine]
 
 
-NO_BODY_METHODS = {
-    b"GET",
-    b"HEAD",
-    b"OPTIONS",
-}
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+# bytes sent per os.sendfile call or read per chunk over TLS
+SENDFILE_CHUNK = 256 * 1024
 
 
 class HTTPScope(ASGIScope):
@@ -51,8 +51,53 @@ class HTTPScope(ASGIScope):
     root_path: Optional[str]
     headers: Iterable[Tuple[bytes, bytes]]
     client: Optional[Tuple[str, int]]
-    server: Optional[Tuple[str, int]]
+    server: Optional[Tuple[str, Optional[int]]]
     state: Optional[Dict]
+    extensions: Optional[Dict[str, Dict]]
+
+
+class WebSocketScope(ASGIScope):
+    type: Literal["websocket"]
+    http_version: str
+    scheme: Literal["wss", "ws"]
+    path: str
+    raw_path: Optional[bytes]
+    query_string: bytes
+    root_path: Optional[str]
+    headers: Iterable[Tuple[bytes, bytes]]
+    client: Optional[Tuple[str, int]]
+    server: Optional[Tuple[str, Optional[int]]]
+    subprotocols: List[str]
+    state: Optional[Dict]
+    extensions: Optional[Dict[str, Dict]]
+
+
+def log_access(
+    access_logger: logging.Logger,
+    scope: Mapping[str, Any],
+    status: int,
+    content_length: int,
+    start_time: int,
+):
+    """Log a response, `start_time` is from time.perf_counter_ns"""
+
+    response_time = (time.perf_counter_ns() - start_time) / 1_000_000
+    client = scope["client"]
+    access_logger.info(
+        '{} - {:.2f} "{} {} {}" {} {}'.format(
+            client[0] if client else "-",
+            response_time,
+            scope.get("method", "GET"),
+            scope["path"],
+            scope["http_version"],
+            status,
+            content_length,
+        )
+    )
+
+
+class ClientDisconnected(OSError):
+    """Raised by `send` once the client is gone"""
 
 
 class HttpScopeRunner:
@@ -71,6 +116,14 @@ class HttpScopeRunner:
         "access_logger",
         "status",
         "content_length",
+        "trailers",
+        "chunked",
+        "pending_trailers",
+        "keep_alive",
+        "queued_at",
+        "resume_reading",
+        "disconnected",
+        "expect_continue",
     )
 
     def __init__(
@@ -84,6 +137,7 @@ class HttpScopeRunner:
         ready_write: asyncio.Event,
         config: "Config",
         access_logger: logging.Logger,
+        resume_reading: Optional[Callable[[], None]] = None,
     ) -> None:
         self.app = app
         self.transport = transport
@@ -99,6 +153,14 @@ class HttpScopeRunner:
         self.access_logger = access_logger
         self.status: int = 200
         self.content_length: int = 0
+        self.trailers: bool = False
+        self.chunked: bool = False
+        self.pending_trailers: List[Tuple[bytes, bytes]] = []
+        self.keep_alive: bool = True
+        self.queued_at: float = 0.0
+        self.resume_reading = resume_reading
+        self.disconnected: bool = False
+        self.expect_continue: bool = False
 
     def set_body(self, body: bytes):
         self.body += body
@@ -107,13 +169,20 @@ class HttpScopeRunner:
     def drain_body(self) -> bytes:
         drain = self.body
         self.body = b""
-        self.message_event.clear()
+        if not self.disconnected:
+            self.message_event.clear()
+        if self.resume_reading:
+            self.resume_reading()
         return drain
 
-    async def run(self):
+    def disconnect(self):
+        self.disconnected = True
+        self.message_event.set()
+
+    async def run(self, app: Optional["ASGIHandler"] = None):
         start_time = time.perf_counter_ns()
         try:
-            return await self.app(self.scope, self.receive, self.send)
+            return await (app or self.app)(self.scope, self.receive, self.send)
         except asyncio.CancelledError:
             ...
         except OSError:
@@ -124,30 +193,28 @@ class HttpScopeRunner:
             if not self.more_body:
                 self.on_response_complete()
                 if self.config.access_log:
-                    response_time = (
-                        time.perf_counter_ns() - start_time
-                    ) / 1_000_000
-                    log = '{} - {:.2f} "{} {} {}" {} {}'.format(
-                        self.scope["client"][0],  # type: ignore
-                        response_time,
-                        self.scope["method"],
-                        self.scope["path"],
-                        self.scope["http_version"],
+                    log_access(
+                        self.access_logger,
+                        self.scope,
                         self.status,
                         self.content_length,
+                        start_time,
                     )
-                    self.access_logger.info(log)
 
     async def receive(self):
-        if self.scope["method"] in NO_BODY_METHODS:
-            event = {
-                "type": "http.request",
-                "body": None,
-                "more_body": not self.message_complete,
-            }
-            return event
-
-        await self.message_event.wait()
+        if self.expect_continue:
+            self.expect_continue = False
+            if not self.message_complete:
+                self.transport.write(CONTINUE_RESPONSE)
+            if self.resume_reading:
+                self.resume_reading()
+
+        # a complete request, like one without a body, is answered at once
+        if not self.message_complete:
+            await self.message_event.wait()
+        if self.disconnected and not self.body:
+            return {"type": "http.disconnect"}
+
         body = self.drain_body()
         event = {
             "type": "http.request",
@@ -160,10 +227,29 @@ class HttpScopeRunner:
         _type = event["type"]
 
         if _type == "http.response.start":
+            headers = list(event.get("headers", []))
+            self.trailers = event.get("trailers", False)
+
+            # trailers can only follow a chunked body
+            if self.trailers:
+                if any(k.lower() == b"content-length" for k, _ in headers):
+                    self.trailers = False
+                else:
+                    headers.append((b"transfer-encoding", b"chunked"))
+                    self.chunked = True
+
+            # a body the client was never asked for is not read at all
+            if self.expect_continue and not self.message_complete:
+                self.keep_alive = False
+            self.expect_continue = False
+
+            if not self.keep_alive:
+                headers.append((b"connection", b"close"))
+
             data = HttpScopeRunner.build_http_response_header(
                 status=event["status"],
                 http_version="1.1",
-                headers=event["headers"],
+                headers=headers,
             )
             self.status = event["status"]
             self.transport.write(data)
@@ -173,49 +259,176 @@ class HttpScopeRunner:
             more_body = event.get("more_body", False)
             self.more_body = more_body
 
+            if self.disconnected:
+                raise ClientDisconnected()
+
             if body:
-                self.transport.write(body)
+                if self.chunked:
+                    self.transport.write(b"%x\r\n" % len(body))
+                    self.transport.write(body)
+                    self.transport.write(b"\r\n")
+                else:
+                    self.transport.write(body)
                 self.content_length += len(body)
 
+            if self.chunked and not more_body and not self.trailers:
+                self.transport.write(b"0\r\n\r\n")
+
+            # wait for the transport to drain below its low-water mark
+            if not self.ready_write.is_set():
+                await self.ready_write.wait()
+
+        elif _type == "http.response.trailers":
+            self.pending_trailers.extend(event.get("headers", []))
+            if not event.get("more_trailers", False) and self.chunked:
+                buffer = bytearray(b"0\r\n")
+                for k, v in self.pending_trailers:
+                    buffer.extend(k)
+                    buffer.extend(b":")
+                    buffer.extend(v)
+                    buffer.extend(b"\r\n")
+                buffer.extend(b"\r\n")
+                self.transport.write(bytes(buffer))
+                self.pending_trailers = []
+
+        elif _type == "http.response.early_hint":
+            data = HttpScopeRunner.build_http_response_header(
+                status=103,
+                http_version="1.1",
+                headers=[(b"link", link) for link in event.get("links", [])],
+            )
+            self.transport.write(data)
+
         elif _type == "http.response.zerocopysend":
             file = event["file"]
-            count = event.get("count")
-            asyncio.create_task(self.sendfile(file, count))
+            fd = file if isinstance(file, int) else file.fileno()
+            offset = event.get("offset")
+            self.more_body = event.get("more_body", False)
+
+            if offset is not None:
+                await self.sendfile(fd, offset, event.get("count"))
+            else:
+                # without an offset the file position is used and advanced
+                position = os.lseek(fd, 0, os.SEEK_CUR)
+                sent = await self.sendfile(fd, position, event.get("count"))
+                os.lseek(fd, position + sent, os.SEEK_SET)
+
+        elif _type == "http.response.pathsend":
             self.more_body = False
+            fd = os.open(event["path"], os.O_RDONLY)
+            try:
+                await self.sendfile(fd, 0, None)
+            finally:
+                os.close(fd)
 
     async def sendfile(
-        self,
-        fd: int,
-        count: Optional[int] = None,
-    ):
-        count = count or 512
+        self, fd: int, offset: int, count: Optional[int]
+    ) -> int:
+        """Send `count` bytes of `fd` from `offset`, or up to its end
+
+        Plain TCP uses os.sendfile once everything written before has left
+        the transport buffer, TLS falls back to reading the file in chunks.
+        Both wait for the client like `send` does. Returns the bytes sent.
+        """
+
+        if self.disconnected:
+            raise ClientDisconnected()
+
+        if count is None:
+            count = max(os.fstat(fd).st_size - offset, 0)
+
+        if self.chunked and count:
+            self.transport.write(b"%x\r\n" % count)
+
+        sock: Optional[socket.socket] = self.transport.get_extra_info("socket")
+        if sock is None or self.transport.get_extra_info("sslcontext"):
+            sent = await self.sendfile_fallback(fd, offset, count)
+        else:
+            sent = await self.sendfile_native(sock, fd, offset, count)
+
+        self.content_length += sent
+
+        if self.chunked:
+            if count:
+                self.transport.write(b"\r\n")
+            if not self.more_body and not self.trailers:
+                self.transport.write(b"0\r\n\r\n")
+
+        return sent
+
+    async def sendfile_native(
+        self, sock: socket.socket, fd: int, offset: int, count: int
+    ) -> int:
+        loop = asyncio.get_running_loop()
+
+        # the headers must reach the socket before the file does. A zero
+        # high-water mark makes set_write_buffer_limits call pause_writing
+        # right away while anything is buffered, asyncio and uvloop both do
+        # so synchronously, and resume_writing sets ready_write once the
+        # buffer drained. A transport pausing later would let the file
+        # overtake the buffered bytes.
+        if self.transport.get_write_buffer_size():
+            self.transport.set_write_buffer_limits(high=0)
+            await self.ready_write.wait()
+            if self.disconnected:
+                raise ClientDisconnected()
+            self.transport.set_write_buffer_limits(
+                high=self.config.write_buffer_high,
+                low=self.config.write_buffer_low,
+            )
 
-        offset = 0
-        fsize = os.fstat(fd).st_size
+        # the transport owns the socket's fd, waiting for the socket to be
+        # writable goes through a duplicate
+        out_fd = os.dup(sock.fileno())
+        sent = 0
+        try:
+            while sent < count:
+                if self.disconnected:
+                    raise ClientDisconnected()
+
+                try:
+                    n = os.sendfile(
+                        out_fd,
+                        fd,
+                        offset + sent,
+                        min(count - sent, SENDFILE_CHUNK),
+                    )
+                except BlockingIOError:
+                    writable = loop.create_future()
+                    loop.add_writer(out_fd, writable.set_result, None)
+                    try:
+                        await writable
+                    finally:
+                        loop.remove_writer(out_fd)
+                    continue
+
+                if n == 0:
+                    # the file is shorter than announced
+                    break
+                sent += n
+        finally:
+            os.close(out_fd)
 
-        s: socket.socket = self.transport.get_extra_info("socket")
-        fd_out = s.fileno()
+        return sent
 
-        while offset < fsize:
-            remaining_bytes = fsize - offset
-            count_to_send = min(count, remaining_bytes)
+    async def sendfile_fallback(self, fd: int, offset: int, count: int) -> int:
+        sent = 0
+        while sent < count:
+            if self.disconnected:
+                raise ClientDisconnected()
 
-            if count_to_send == 0:
+            data = os.pread(
+                fd, min(count - sent, SENDFILE_CHUNK), offset + sent
+            )
+            if not data:
                 break
 
-            await self.ready_write.wait()
-            try:
-                bytes_to_sent = os.sendfile(fd_out, fd, offset, count_to_send)
-
-                if bytes_to_sent == 0:
-                    raise RuntimeError("Connection have been closed")
-            except BlockingIOError as e:
-                if e.errno != errno.EAGAIN:
-                    raise
-                await asyncio.sleep(0)
+            self.transport.write(data)
+            sent += len(data)
+            if not self.ready_write.is_set():
+                await self.ready_write.wait()
 
-            else:
-                offset += count_to_send
+        return sent
 
     @classmethod
     def build_http_response_header(
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import os
 import sys
 import ssl
+import socket
+import struct
 import logging
 import asyncio
 import threading
@@ -10,10 +13,14 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Callable,
+    Coroutine,
     Dict,
     Iterable,
+    List,
     Literal,
     Optional,
+    Tuple,
+    TypeVar,
     cast,
 )
 
@@ -24,6 +31,9 @@ if TYPE_CHECKING:
 
 
 LOG_LEVEL = Literal["DEBUG", "INFO", "WARNING", "ERROR"]
+EVENT_LOOP = Literal["auto", "uvloop", "asyncio"]
+
+T = TypeVar("T")
 
 
 def create_ssl_context(
@@ -67,6 +77,11 @@ def create_logger(
     logger = logging.getLogger(name)
     logger.setLevel(log_level)
 
+    # loggers are created once per Worker/Server instance, a second handler
+    # would write every record twice
+    if logger.handlers:
+        return logger
+
     if not log_fmt:
         log_fmt = DEFAULT_LOG_FMT
 
@@ -112,6 +127,173 @@ def load_app(app) -> "ASGIHandler":
     raise ImportError("Cannot load app")
 
 
+def get_memory_usage(pid: int | str = "self") -> Optional[Tuple[int, int]]:
+    """Return the (rss, private) memory of a process in bytes
+
+    Private memory excludes pages still shared copy-on-write with the parent,
+    it is only available on Linux.
+    """
+
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+
+    def kb(name: str) -> int:
+        return int(fields.get(name, "0 kB").split()[0]) * 1024
+
+    return kb("Rss"), kb("Private_Clean") + kb("Private_Dirty")
+
+
+def get_rss() -> int:
+    """Return the resident memory of the current process in bytes"""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # ru_maxrss is the peak resident size in KiB on Linux and BSD
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_accept_queue_length(sockets: List[socket.socket], port: int) -> int:
+    """Return the number of connections waiting to be accepted
+
+    TCP listeners owned by the process are asked through TCP_INFO, without
+    any the LISTEN entries for `port` in /proc/net/tcp{,6} are summed up,
+    which covers per-worker SO_REUSEPORT listeners.
+    """
+
+    tcp_sockets = [
+        sock
+        for sock in sockets
+        if sock.family in (socket.AF_INET, socket.AF_INET6)
+    ]
+    if tcp_sockets and hasattr(socket, "TCP_INFO"):
+        total = 0
+        for sock in tcp_sockets:
+            try:
+                info = sock.getsockopt(
+                    socket.IPPROTO_TCP, socket.TCP_INFO, 104
+                )
+            except OSError:
+                continue
+            # tcpi_unacked holds the accept queue length of a listener
+            total += struct.unpack_from("I", info, 24)[0]
+        return total
+
+    total = 0
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] != "0A":
+                        continue
+
+                    if int(fields[1].rsplit(":", 1)[1], 16) == port:
+                        total += int(fields[4].split(":")[1], 16)
+        except (OSError, StopIteration):
+            ...
+
+    return total
+
+
+def get_addresses(
+    transport: asyncio.BaseTransport,
+) -> Tuple[Optional[Tuple[str, Optional[int]]], Optional[Tuple[str, int]]]:
+    """Return the ASGI `server` and `client` addresses of a connection"""
+
+    sockname = transport.get_extra_info("sockname")
+    peername = transport.get_extra_info("peername")
+
+    # unix sockets have a path as their name and usually no peer name
+    if isinstance(sockname, str):
+        return (sockname, None), None
+
+    server = tuple(sockname[:2]) if sockname else None
+    client = tuple(peername[:2]) if peername else None
+    return server, client
+
+
+def set_tcp_quickack(transport: asyncio.BaseTransport):
+    """Acknowledge the peer's next segments without the delayed-ACK wait
+
+    Linux leaves quick-ack mode on its own, so this is re-armed per request.
+    """
+
+    sock = transport.get_extra_info("socket")
+    if sock is None or sock.family == socket.AF_UNIX:
+        return
+
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    except OSError:
+        ...
+
+
+def event_loop_factory(
+    loop: "EVENT_LOOP",
+) -> Callable[[], asyncio.AbstractEventLoop]:
+    """Return the function creating event loops of kind `loop`
+
+    `auto` prefers uvloop and falls back to asyncio's own loop.
+    """
+
+    if loop == "asyncio":
+        return asyncio.new_event_loop
+
+    try:
+        import uvloop
+    except ImportError:
+        if loop == "uvloop":
+            raise RuntimeError("uvloop is not installed")
+        return asyncio.new_event_loop
+
+    return uvloop.new_event_loop
+
+
+def run_event_loop(main: Coroutine[Any, Any, T], loop: "EVENT_LOOP") -> T:
+    """`asyncio.run` on a new event loop of kind `loop`"""
+
+    factory = event_loop_factory(loop)
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(main)
+
+    # Python 3.10 has no loop factory, this is its asyncio.run on our loop
+    new_loop = factory()
+    try:
+        asyncio.set_event_loop(new_loop)
+        return new_loop.run_until_complete(main)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(new_loop)
+            for task in tasks:
+                task.cancel()
+            new_loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True)
+            )
+            new_loop.run_until_complete(new_loop.shutdown_asyncgens())
+            new_loop.run_until_complete(new_loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            new_loop.close()
+
+
+def eager_task_factory(loop, coro, *, eager_start=None, **kwargs):
+    """asyncio.eager_task_factory also taking uvloop's `eager_start`"""
+
+    assert sys.version_info >= (3, 12), "eager tasks need Python 3.12"
+    if eager_start is False:
+        return asyncio.Task(coro, loop=loop, **kwargs)
+    return asyncio.eager_task_factory(loop, coro, **kwargs)
+
+
 def to_thread(
     func: Callable,
     args: Optional[Iterable[Any]] = None,
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import urllib.parse
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .server import ServerState
+    from .uhttp import ASGIHandler, HTTPScope
+
+
+WarmupSpec = str | Dict[str, Any]
+
+
+class WarmupRequest:
+    """A synthetic request fed to the application before serving"""
+
+    __slots__ = ("method", "path", "query_string", "headers", "body")
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[List[Tuple[bytes, bytes]]] = None,
+        body: bytes = b"",
+    ):
+        url = urllib.parse.urlsplit(path)
+        self.method = method.upper()
+        self.path = url.path or "/"
+        self.query_string = url.query.encode("latin-1")
+        self.headers = headers or []
+        self.body = body
+
+    @classmethod
+    def parse(cls, spec: WarmupSpec) -> "WarmupRequest":
+        """Build a request from "METHOD /path" or a dict
+
+        A dict takes `method`, `path`, `headers` (a mapping or a list of
+        pairs) and `body`.
+        """
+
+        if isinstance(spec, str):
+            method, _, path = spec.strip().partition(" ")
+            if not path:
+                method, path = "GET", method
+            return cls(method, path.strip())
+
+        headers = spec.get("headers") or []
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+
+        body = spec.get("body") or b""
+        return cls(
+            spec.get("method", "GET"),
+            spec.get("path", "/"),
+            headers=[(encode(k).lower(), encode(v)) for k, v in headers],
+            body=encode(body),
+        )
+
+    def __str__(self) -> str:
+        query = f"?{self.query_string.decode()}" if self.query_string else ""
+        return f"{self.method} {self.path}{query}"
+
+
+def encode(value: str | bytes) -> bytes:
+    return value.encode("latin-1") if isinstance(value, str) else value
+
+
+async def warmup(
+    app: "ASGIHandler",
+    config: "Config",
+    server_state: "ServerState",
+    logger: logging.Logger,
+):
+    """Run the configured warmup requests one after another
+
+    Each request is limited by `config.warmup_timeout`, failures are logged
+    and never prevent the worker from serving.
+    """
+
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    for spec in config.warmup:
+        request = WarmupRequest.parse(spec)
+        request_started_at = loop.time()
+        try:
+            status = await asyncio.wait_for(
+                run_request(app, config, server_state, request),
+                config.warmup_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Warmup {request} timed out after {config.warmup_timeout}s"
+            )
+            continue
+        except Exception as e:
+            logger.warning(f"Warmup {request} failed: {e!r}")
+            continue
+
+        logger.info(
+            f"Warmup {request} {status} in "
+            f"{(loop.time() - request_started_at) * 1000:.2f}ms"
+        )
+
+    logger.info(
+        f"Warmup of {len(config.warmup)} requests done in "
+        f"{(loop.time() - started_at) * 1000:.0f}ms"
+    )
+
+
+async def run_request(
+    app: "ASGIHandler",
+    config: "Config",
+    server_state: "ServerState",
+    request: WarmupRequest,
+) -> Optional[int]:
+    headers = [(b"host", f"{config.host}:{config.port}".encode())]
+    if request.body:
+        headers.append((b"content-length", str(len(request.body)).encode()))
+    headers.extend(request.headers)
+
+    scope: "HTTPScope" = {
+        "type": "http",
+        "asgi": {
+            "version": "2.5",
+            "spec_version": "2.0",
+        },
+        "http_version": "1.1",
+        "method": request.method,  # type: ignore
+        "scheme": "http",
+        "path": request.path,
+        "raw_path": request.path.encode(),
+        "query_string": request.query_string,
+        "root_path": server_state.root_path,
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": (config.host, config.port),
+        "state": server_state.lifespan.app_state,
+        "extensions": {},
+    }
+
+    status: Optional[int] = None
+    complete = asyncio.Event()
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": request.body}
+
+        await complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        nonlocal status
+        if event["type"] == "http.response.start":
+            status = event["status"]
+
+        elif event["type"] == "http.response.body" and not event.get(
+            "more_body"
+        ):
+            complete.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        complete.set()
+
+    return status
@@ -0,0 +1,692 @@
+from __future__ import annotations
+
+import os
+import zlib
+import time
+import base64
+import hashlib
+import asyncio
+import logging
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .uhttp import ClientDisconnected, HttpScopeRunner, log_access
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .server import ServerState
+    from .uhttp import ASGIHandler, WebSocketScope
+
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_NO_STATUS = 1005
+CLOSE_ABNORMAL = 1006
+CLOSE_INVALID_DATA = 1007
+CLOSE_TOO_BIG = 1009
+CLOSE_INTERNAL_ERROR = 1011
+
+# close codes an endpoint may not put on the wire
+RESERVED_CLOSE_CODES = {1004, CLOSE_NO_STATUS, CLOSE_ABNORMAL, 1015}
+
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+class ProtocolError(Exception):
+    """A client violation failing the connection with `code`"""
+
+    def __init__(self, code: int, reason: str = ""):
+        super().__init__(code, reason)
+        self.code = code
+        self.reason = reason
+
+
+def accept_key(key: bytes) -> bytes:
+    return base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+
+
+def unmask(data: bytes | bytearray, mask: bytes | bytearray) -> bytes:
+    """XOR `data` with the repeated 4 byte `mask`
+
+    The whole payload is XORed as one big integer, which runs in C instead
+    of looping over the bytes in Python.
+    """
+
+    length = len(data)
+    if not length:
+        return b""
+
+    key = bytes(mask) * (length // 4 + 1)
+    return (
+        int.from_bytes(data, "little") ^ int.from_bytes(key[:length], "little")
+    ).to_bytes(length, "little")
+
+
+def build_frame(opcode: int, payload: bytes, rsv1: bool = False) -> bytes:
+    """Serialize a final, unmasked server frame"""
+
+    first = 0x80 | opcode | (0x40 if rsv1 else 0)
+    length = len(payload)
+
+    if length < 126:
+        header = bytes((first, length))
+    elif length < 1 << 16:
+        header = bytes((first, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((first, 127)) + length.to_bytes(8, "big")
+
+    return header + payload
+
+
+def build_close_payload(code: int, reason: str = "") -> bytes:
+    if code == CLOSE_NO_STATUS:
+        return b""
+    return code.to_bytes(2, "big") + reason.encode()[:123]
+
+
+def is_websocket_upgrade(headers: List[Tuple[bytes, bytes]]) -> bool:
+    for name, value in headers:
+        if name.lower() == b"upgrade" and b"websocket" in value.lower():
+            return True
+    return False
+
+
+class FrameParser:
+    """Incremental parser of masked client frames
+
+    `feed` returns the frames completed by the data, partial frames stay in
+    the buffer, which is compacted once per call.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[bool, bool, int, bytes]]:
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        pos = 0
+        size = len(buffer)
+
+        while size - pos >= 2:
+            first, second = buffer[pos], buffer[pos + 1]
+            if first & 0x30:
+                raise ProtocolError(CLOSE_PROTOCOL_ERROR, "reserved bits set")
+            if not second & 0x80:
+                raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unmasked frame")
+
+            length = second & 0x7F
+            start = pos + 2
+            if length == 126:
+                if size - start < 2:
+                    break
+                length = int.from_bytes(buffer[start : start + 2], "big")
+                start += 2
+            elif length == 127:
+                if size - start < 8:
+                    break
+                length = int.from_bytes(buffer[start : start + 8], "big")
+                start += 8
+
+            if self.max_size and length > self.max_size:
+                raise ProtocolError(CLOSE_TOO_BIG, "frame too big")
+
+            end = start + 4 + length
+            if end > size:
+                break
+
+            payload = unmask(
+                buffer[start + 4 : end], buffer[start : start + 4]
+            )
+            frames.append(
+                (bool(first & 0x80), bool(first & 0x40), first & 0x0F, payload)
+            )
+            pos = end
+
+        if pos:
+            del buffer[:pos]
+
+        return frames
+
+
+class PerMessageDeflate:
+    """The permessage-deflate extension (RFC 7692)"""
+
+    NAME = b"permessage-deflate"
+    # messages smaller than this are sent uncompressed
+    MIN_SIZE = 128
+    COMPRESS_LEVEL = 6
+
+    def __init__(
+        self,
+        server_no_context_takeover: bool = False,
+        client_no_context_takeover: bool = False,
+        server_max_window_bits: int = 15,
+    ):
+        self.server_no_context_takeover = server_no_context_takeover
+        self.client_no_context_takeover = client_no_context_takeover
+        self.server_max_window_bits = server_max_window_bits
+        self.compressor = self.new_compressor()
+        self.decompressor = zlib.decompressobj(-15)
+
+    @classmethod
+    def negotiate(
+        cls, headers: Iterable[Tuple[bytes, bytes]]
+    ) -> Optional[Tuple["PerMessageDeflate", bytes]]:
+        """Accept the first valid permessage-deflate offer
+
+        Returns the extension and the value of the response header.
+        """
+
+        for name, value in headers:
+            if name.lower() != b"sec-websocket-extensions":
+                continue
+
+            for offer in value.split(b","):
+                params = [p.strip() for p in offer.split(b";")]
+                if params[0].lower() != cls.NAME:
+                    continue
+
+                accepted = cls.parse_offer(params[1:])
+                if accepted is not None:
+                    return accepted
+
+        return None
+
+    @classmethod
+    def parse_offer(
+        cls, params: List[bytes]
+    ) -> Optional[Tuple["PerMessageDeflate", bytes]]:
+        kwargs: Dict[str, Any] = {}
+        response = [cls.NAME]
+
+        for param in params:
+            key, _, value = param.partition(b"=")
+            key = key.strip().lower()
+            value = value.strip().strip(b'"')
+
+            if key in (
+                b"server_no_context_takeover",
+                b"client_no_context_takeover",
+            ):
+                kwargs[key.decode()] = True
+                response.append(key)
+
+            elif key == b"server_max_window_bits":
+                # zlib has no raw deflate with an 8 bit window
+                if not value.isdigit() or not 9 <= int(value) <= 15:
+                    return None
+                kwargs["server_max_window_bits"] = int(value)
+                response.append(key + b"=" + value)
+
+            elif key == b"client_max_window_bits":
+                # our decompressor always uses the largest window
+                if value and (
+                    not value.isdigit() or not 8 <= int(value) <= 15
+                ):
+                    return None
+
+            else:
+                return None
+
+        return cls(**kwargs), b"; ".join(response)
+
+    def new_compressor(self):
+        return zlib.compressobj(
+            self.COMPRESS_LEVEL, zlib.DEFLATED, -self.server_max_window_bits
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        data = self.compressor.compress(data) + self.compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+        if self.server_no_context_takeover:
+            self.compressor = self.new_compressor()
+
+        if data.endswith(DEFLATE_TAIL):
+            data = data[:-4]
+        return data
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        if self.client_no_context_takeover:
+            self.decompressor = zlib.decompressobj(-15)
+
+        try:
+            data = self.decompressor.decompress(data + DEFLATE_TAIL, max_size)
+        except zlib.error:
+            raise ProtocolError(CLOSE_INVALID_DATA, "invalid compressed data")
+
+        if self.decompressor.unconsumed_tail:
+            raise ProtocolError(CLOSE_TOO_BIG, "message too big")
+        return data
+
+
+class WebSocketProtocol(asyncio.Protocol):
+    """ASGI `websocket` scope over a connection upgraded by H11Protocol
+
+    The app is started once the transport is handed over, the 101 response
+    is only written when it sends `websocket.accept`.
+    """
+
+    # received messages queued for the app before reading is paused
+    MAX_QUEUED_MESSAGES = 16
+    # seconds to wait for the client's close frame after sending ours
+    CLOSE_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        app: "ASGIHandler",
+        scope: "WebSocketScope",
+        server_state: "ServerState",
+        logger: logging.Logger,
+        access_logger: logging.Logger,
+        config: "Config",
+        loop: asyncio.AbstractEventLoop,
+    ):
+        # global scope
+        self.app = app
+        self.tasks: Set[asyncio.Task] = server_state.tasks
+        self.connections = server_state.connections
+        self.loop = loop
+        self.logger = logger
+        self.access_logger = access_logger
+        self.config = config
+
+        # connection scope
+        self.scope = scope
+        self.transport: asyncio.Transport
+        self.parser = FrameParser(config.ws_max_size)
+        self.deflate: Optional[PerMessageDeflate] = None
+        self.ready_write = asyncio.Event()
+        self.ready_write.set()
+        self.message_event = asyncio.Event()
+        self.messages: deque[Dict[str, Any]] = deque()
+        self.reading_paused = False
+        self.started_at = time.perf_counter_ns()
+
+        # message being reassembled from fragments
+        self.fragments: List[bytes] = []
+        self.fragments_size = 0
+        self.message_opcode: Optional[int] = None
+        self.message_compressed = False
+
+        # websocket state
+        self.connect_sent = False
+        self.accepted = False
+        self.close_sent_at: Optional[float] = None
+        self.close_code: Optional[int] = None
+        self.close_reason = ""
+
+        # liveness
+        self.last_ping: float = loop.time()
+        self.ping_sent_at: Optional[float] = None
+        self.ping_data: bytes = b""
+        self.rtt: Optional[float] = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:  # type:ignore
+        self.transport = transport
+        self.connections.add(self)
+
+        task = self.loop.create_task(self.run())
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.connections.discard(self)
+        if self.close_code is None:
+            self.close_code = CLOSE_ABNORMAL
+        self.message_event.set()
+        self.ready_write.set()
+
+    def pause_writing(self) -> None:
+        self.ready_write.clear()
+
+    def resume_writing(self) -> None:
+        self.ready_write.set()
+
+    def data_received(self, data: bytes) -> None:
+        try:
+            for fin, rsv1, opcode, payload in self.parser.feed(data):
+                self.frame_received(fin, rsv1, opcode, payload)
+        except ProtocolError as e:
+            self.logger.debug(
+                f"WebSocket protocol error from {self.scope['client']}: "
+                f"{e.reason}"
+            )
+            self.fail(e.code, e.reason)
+
+    # -------------------- frames ------------------------
+    def frame_received(
+        self, fin: bool, rsv1: bool, opcode: int, payload: bytes
+    ):
+        if self.close_code is not None:
+            return
+
+        if opcode >= OP_CLOSE:
+            if not fin or rsv1 or len(payload) > 125:
+                raise ProtocolError(
+                    CLOSE_PROTOCOL_ERROR, "invalid control frame"
+                )
+
+            if opcode == OP_CLOSE:
+                self.close_received(payload)
+            elif opcode == OP_PING:
+                if self.accepted:
+                    self.write_frame(OP_PONG, payload)
+            elif opcode == OP_PONG:
+                self.pong_received(payload)
+            else:
+                raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unknown opcode")
+            return
+
+        if opcode == OP_CONTINUATION:
+            if self.message_opcode is None or rsv1:
+                raise ProtocolError(
+                    CLOSE_PROTOCOL_ERROR, "unexpected continuation"
+                )
+
+        elif opcode in (OP_TEXT, OP_BINARY):
+            if self.message_opcode is not None:
+                raise ProtocolError(
+                    CLOSE_PROTOCOL_ERROR, "expected continuation"
+                )
+            if rsv1 and self.deflate is None:
+                raise ProtocolError(CLOSE_PROTOCOL_ERROR, "reserved bits set")
+            self.message_opcode = opcode
+            self.message_compressed = rsv1
+
+        else:
+            raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unknown opcode")
+
+        self.fragments.append(payload)
+        self.fragments_size += len(payload)
+        max_size = self.config.ws_max_size
+        if max_size and self.fragments_size > max_size:
+            raise ProtocolError(CLOSE_TOO_BIG, "message too big")
+
+        if fin:
+            self.message_received()
+
+    def message_received(self):
+        data = b"".join(self.fragments)
+        if self.message_compressed:
+            assert self.deflate is not None
+            data = self.deflate.decompress(data, self.config.ws_max_size)
+
+        if self.message_opcode == OP_TEXT:
+            try:
+                message = {"type": "websocket.receive", "text": data.decode()}
+            except UnicodeDecodeError:
+                raise ProtocolError(CLOSE_INVALID_DATA, "invalid utf-8")
+        else:
+            message = {"type": "websocket.receive", "bytes": data}
+
+        self.fragments = []
+        self.fragments_size = 0
+        self.message_opcode = None
+
+        self.messages.append(message)
+        self.message_event.set()
+        if (
+            len(self.messages) >= self.MAX_QUEUED_MESSAGES
+            and not self.reading_paused
+        ):
+            self.reading_paused = True
+            self.transport.pause_reading()
+
+    def close_received(self, payload: bytes):
+        code = CLOSE_NO_STATUS
+        reason = ""
+        if len(payload) == 1:
+            raise ProtocolError(CLOSE_PROTOCOL_ERROR, "invalid close frame")
+        if payload:
+            code = int.from_bytes(payload[:2], "big")
+            if (
+                code < 1000
+                or code in RESERVED_CLOSE_CODES
+                or 1016 <= code < 3000
+            ):
+                raise ProtocolError(CLOSE_PROTOCOL_ERROR, "invalid close code")
+            try:
+                reason = payload[2:].decode()
+            except UnicodeDecodeError:
+                raise ProtocolError(CLOSE_INVALID_DATA, "invalid utf-8")
+
+        if self.accepted and self.close_sent_at is None:
+            self.write_frame(OP_CLOSE, build_close_payload(code))
+        self.disconnect(code, reason)
+
+    def fail(self, code: int, reason: str = ""):
+        if self.accepted and self.close_sent_at is None:
+            self.write_frame(OP_CLOSE, build_close_payload(code, reason))
+        self.disconnect(code, reason)
+
+    def disconnect(self, code: int, reason: str = ""):
+        if self.close_code is None:
+            self.close_code = code
+            self.close_reason = reason
+        self.message_event.set()
+        self.transport.close()
+
+    def write_frame(self, opcode: int, payload: bytes, rsv1: bool = False):
+        if opcode == OP_CLOSE:
+            self.close_sent_at = self.loop.time()
+        self.transport.write(build_frame(opcode, payload, rsv1))
+
+    # -------------------- liveness ------------------------
+    def on_tick(self, now: float):
+        """Called periodically by the server to manage connection liveness"""
+
+        if self.transport.is_closing():
+            return
+
+        if self.close_sent_at is not None:
+            if now - self.close_sent_at >= self.CLOSE_TIMEOUT:
+                self.disconnect(CLOSE_ABNORMAL)
+            return
+
+        ping_interval = self.config.ws_ping_interval
+        if not self.accepted or not ping_interval:
+            return
+
+        if self.ping_sent_at is None:
+            if now - self.last_ping >= ping_interval:
+                self.ping(now)
+
+        elif now - self.ping_sent_at >= self.config.ws_ping_timeout:
+            self.logger.debug(
+                f"WebSocket {self.scope['client']} missed its keepalive pong"
+            )
+            self.fail(CLOSE_INTERNAL_ERROR, "keepalive ping timeout")
+
+    def ping(self, now: float):
+        self.ping_data = os.urandom(8)
+        self.ping_sent_at = self.last_ping = now
+        self.write_frame(OP_PING, self.ping_data)
+
+    def pong_received(self, data: bytes):
+        if self.ping_sent_at is None or data != self.ping_data:
+            return
+
+        self.rtt = self.loop.time() - self.ping_sent_at
+        self.ping_sent_at = None
+
+    def shutdown(self):
+        """Close an open WebSocket with 1001, the app sees the disconnect"""
+
+        if self.accepted and self.close_sent_at is None:
+            self.write_frame(
+                OP_CLOSE,
+                build_close_payload(CLOSE_GOING_AWAY, "server shutdown"),
+            )
+
+    # -------------------- ASGI ------------------------
+    async def run(self):
+        failed = False
+        try:
+            await self.app(self.scope, self.receive, self.send)
+        except ClientDisconnected:
+            ...
+        except asyncio.CancelledError:
+            ...
+        except Exception:
+            failed = True
+            self.logger.exception("Exception in ASGI WebSocket application")
+
+        if self.transport.is_closing():
+            return
+
+        if not self.accepted:
+            self.reject(500 if failed else 403)
+        elif self.close_sent_at is None:
+            self.write_frame(
+                OP_CLOSE,
+                build_close_payload(
+                    CLOSE_INTERNAL_ERROR if failed else CLOSE_NORMAL
+                ),
+            )
+
+    async def receive(self):
+        if not self.connect_sent:
+            self.connect_sent = True
+            return {"type": "websocket.connect"}
+
+        while not self.messages:
+            if self.close_code is not None:
+                return {
+                    "type": "websocket.disconnect",
+                    "code": self.close_code,
+                    "reason": self.close_reason,
+                }
+            self.message_event.clear()
+            await self.message_event.wait()
+
+        message = self.messages.popleft()
+        if (
+            self.reading_paused
+            and len(self.messages) < self.MAX_QUEUED_MESSAGES
+        ):
+            self.reading_paused = False
+            self.transport.resume_reading()
+        return message
+
+    async def send(self, event):
+        _type = event["type"]
+
+        if self.close_sent_at is not None or self.transport.is_closing():
+            raise ClientDisconnected()
+
+        if _type == "websocket.accept":
+            if self.accepted:
+                raise RuntimeError("WebSocket already accepted")
+            self.accept(event)
+
+        elif _type == "websocket.close":
+            if not self.accepted:
+                self.reject(403)
+                return
+
+            self.write_frame(
+                OP_CLOSE,
+                build_close_payload(
+                    event.get("code") or CLOSE_NORMAL,
+                    event.get("reason") or "",
+                ),
+            )
+
+        elif _type == "websocket.send":
+            if not self.accepted:
+                raise RuntimeError("WebSocket is not accepted yet")
+
+            text = event.get("text")
+            if text is not None:
+                opcode, data = OP_TEXT, text.encode()
+            else:
+                opcode, data = OP_BINARY, event.get("bytes") or b""
+
+            rsv1 = False
+            if self.deflate and len(data) >= self.deflate.MIN_SIZE:
+                data = self.deflate.compress(data)
+                rsv1 = True
+
+            self.write_frame(opcode, data, rsv1)
+            await self.ready_write.wait()
+
+        else:
+            raise RuntimeError(f"Unexpected ASGI message {_type!r}")
+
+    def accept(self, event):
+        request_headers = self.scope["headers"]
+        key = b""
+        for name, value in request_headers:
+            if name.lower() == b"sec-websocket-key":
+                key = value.strip()
+
+        headers = [
+            (b"upgrade", b"websocket"),
+            (b"connection", b"Upgrade"),
+            (b"sec-websocket-accept", accept_key(key)),
+        ]
+
+        subprotocol = event.get("subprotocol")
+        if subprotocol:
+            headers.append((b"sec-websocket-protocol", subprotocol.encode()))
+
+        if self.config.ws_per_message_deflate:
+            negotiated = PerMessageDeflate.negotiate(request_headers)
+            if negotiated is not None:
+                self.deflate, extension = negotiated
+                headers.append((b"sec-websocket-extensions", extension))
+
+        headers.extend(event.get("headers") or [])
+
+        self.transport.write(
+            HttpScopeRunner.build_http_response_header(
+                status=101, http_version="1.1", headers=headers
+            )
+        )
+        self.accepted = True
+        self.last_ping = self.loop.time()
+        self.log_access(101)
+
+    def reject(self, status: int):
+        self.transport.write(
+            HttpScopeRunner.build_http_response_header(
+                status=status,
+                http_version="1.1",
+                headers=[
+                    (b"content-length", b"0"),
+                    (b"connection", b"close"),
+                ],
+            )
+        )
+        self.close_code = CLOSE_ABNORMAL
+        self.message_event.set()
+        self.transport.close()
+        self.log_access(status)
+
+    def log_access(self, status: int):
+        if self.config.access_log:
+            log_access(
+                self.access_logger, self.scope, status, 0, self.started_at
+            )
@@ -2,35 +2,87 @@ from __future__ import annotations
 
 import os
 import sys
+import time
 import signal
+import asyncio
 import threading
 import multiprocessing as mp
-from typing import TYPE_CHECKING, Optional
-
-import uvloop
+from typing import TYPE_CHECKING, List, Optional
 
 from .server import Server
-from .utils import create_logger, load_app
-from .reloader import Reloader
+from .lifespan import Lifespan
+from .utils import create_logger, load_app, run_event_loop
 
 
 if TYPE_CHECKING:
     from .config import Config
+    from .uhttp import ASGIHandler
+
+
+class WorkerStatus:
+    """State a worker publishes to the arbiter through shared memory"""
+
+    def __init__(self):
+        self.heartbeat = mp.RawValue("d", 0.0)
+        self.booted_at = mp.RawValue("d", 0.0)
+        self.recycle = mp.RawValue("b", 0)
+        self.inflight = mp.RawValue("i", 0)
+        self.loop_lag = mp.RawValue("d", 0.0)
+
+    def beat(self):
+        self.heartbeat.value = time.monotonic()
+        if not self.booted_at.value:
+            self.booted_at.value = self.heartbeat.value
+
+    def request_recycle(self):
+        """Ask the arbiter to replace this worker by a fresh one"""
+
+        self.recycle.value = 1
+
+    def reset(self):
+        self.heartbeat.value = 0.0
+        self.booted_at.value = 0.0
+        self.recycle.value = 0
+        self.inflight.value = 0
+        self.loop_lag.value = 0.0
+
 
-uvloop.install()
+class Terminated(Exception):
+    """SIGTERM received by the process waiting for a worker"""
+
+
+def raise_terminated(signum, frame):
+    raise Terminated()
 
 
 class Worker:
-    def __init__(self, config: "Config"):
+    # seconds a draining worker gets beyond the graceful timeout to exit
+    EXIT_GRACE = 5.0
+
+    def __init__(
+        self,
+        config: "Config",
+        index: int = 0,
+        preloaded_app: Optional["ASGIHandler"] = None,
+        capture_output: bool = False,
+    ):
         self.app = config.app
+        self.index = index
+        self.preloaded_app = preloaded_app
         self.worker = None
         self.config = config
         self.logger = create_logger(
             __name__, self.config.log_level, self.config.log_fmt
         )
         self.server: Optional[Server] = None
-        (self._read_stdout_fd, self._write_stdout_fd) = os.pipe()
-        (self._read_stderr_fd, self._write_stderr_fd) = os.pipe()
+        self.status = WorkerStatus()
+        self.started_at: float = 0.0
+        self.booted = False
+        self.capture_output = capture_output
+        self._read_stdout_fd: Optional[int] = None
+        self._read_stderr_fd: Optional[int] = None
+        # third-party modules the reloader's template process imports once
+        self.preimport_modules: List[str] = []
 
     @property
     def stdout_fd(self):
@@ -41,6 +93,9 @@ class Worker:
         return self._read_stderr_fd
 
     def run(self, blocking=False):
+        if self.config.threads < 1:
+            raise RuntimeError("Number of threads must be greater than 0")
+
         if self.config.workers > 1 and self.config.reload:
             raise RuntimeError(
                 "Number of workers must be 1 in auto reloading mode"
@@ -51,28 +106,60 @@ class Worker:
                 "app must be str or factory function in auto reloading mode"
             )
 
-        self.worker = mp.Process(
-            target=self.main,
+        # a preloaded app is only shared with the worker through fork
+        context = mp.get_context("fork") if self.preloaded_app else mp
+
+        write_stdout_fd = write_stderr_fd = None
+        if self.capture_output:
+            self._read_stdout_fd, write_stdout_fd = os.pipe()
+            self._read_stderr_fd, write_stderr_fd = os.pipe()
+
+        reloader = None
+        target, args = self.main, (write_stdout_fd, write_stderr_fd)
+        if blocking and self.config.reload:
+            # watchdog is only imported when reloading is enabled
+            from .reloader import Reloader, serve_template
+
+            # discovery forks, it has to run before any thread is started
+            reloader = Reloader(self, self.config)
+            reloader.discover()
+            target, args = serve_template, (self,)
+
+        self.status.reset()
+        self.started_at = time.monotonic()
+        self.booted = False
+        self.worker = context.Process(
+            target=target,
             daemon=False,
-            args=(
-                self._write_stdout_fd.is_integer(),
-                self._write_stderr_fd.is_integer(),
-            ),
+            args=args,
         )
 
         self.worker.start()
 
+        # only the child keeps the write ends so the pipes reach EOF once it
+        # exits
+        if write_stdout_fd is not None and write_stderr_fd is not None:
+            os.close(write_stdout_fd)
+            os.close(write_stderr_fd)
+
         if blocking:
-            if self.config.reload:
-                reloader = Reloader(self, self.config)
+            if reloader:
                 reloader.main()
 
             else:
-                stop_event = threading.Event()
+                # the parent may be the only process signalled, e.g. by
+                # `docker stop`, it then asks the worker to drain
+                signal.signal(signal.SIGTERM, raise_terminated)
                 try:
-                    stop_event.wait()
+                    self.worker.join()
+                except Terminated:
+                    # the drain is bounded, a repeated SIGTERM changes nothing
+                    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+                    self.terminate()
+                    self.drain()
                 except KeyboardInterrupt:
-                    self.worker.join(timeout=5)
+                    # Ctrl-C reached the worker's process group as well
+                    self.drain()
                     return 1
 
         return 0
@@ -84,23 +171,46 @@ class Worker:
         sys.stdout = sys.__stdout__ = open(1, "w", buffering=1)
         sys.stderr = sys.__stderr__ = open(2, "w", buffering=1)
 
-    def main(self, stdout_fd: int, stderr_fd: int):
+    def main(self, stdout_fd: Optional[int], stderr_fd: Optional[int]):
         """Entrypoint where child processes start and run"""
 
-        self._sync_to_stdio(stdout_fd, stderr_fd)
+        # handlers installed by the arbiter are inherited through fork
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTTIN, signal.SIG_DFL)
+        signal.signal(signal.SIGTTOU, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        if stdout_fd is not None and stderr_fd is not None:
+            self._sync_to_stdio(stdout_fd, stderr_fd)
+
+        if self.config.cpu_affinity:
+            self._pin_cpu()
+
+        if not self.config.sockets and self.config.reuse_port:
+            # each worker listens on its own SO_REUSEPORT sockets so the
+            # kernel balances connections instead of a shared accept queue
+            self.config.sockets = self.config.create_sockets()
 
         logger = create_logger(
             __name__, self.config.log_level, self.config.log_fmt
         )
 
-        app = load_app(self.app)
+        app = self.preloaded_app or load_app(self.app)
+
+        logger.info(f"Worker {self.pid} is running")
+
+        if self.config.threads > 1:
+            self._serve_threads(app)
+            return
+
         server = Server(
             app=app,
             config=self.config,
+            status=self.status,
         )
 
-        logger.info(f"Worker {self.pid} is running")
-
         # when user presses Ctrl-C, SIGINT will be sent to all processes
         # (what belongs to the process group) includes children so we
         # should catch them in children at here
@@ -111,18 +221,141 @@ class Worker:
         finally:
             self.logger.info(f"Worker {self.pid} was stopped")
 
+    def _serve_threads(self, app: "ASGIHandler"):
+        """Run one server per thread, each with its own event loop
+
+        The servers share the listening socket and one lifespan which is run
+        by this thread's loop, so application state is set up once per
+        process.
+        """
+
+        if getattr(sys, "_is_gil_enabled", lambda: True)():
+            self.logger.warning(
+                "The GIL is enabled, server threads will contend for it"
+            )
+
+        lifespan = Lifespan(app, self.logger)
+        servers = [
+            Server(
+                app=app,
+                config=self.config,
+                status=self.status if index == 0 else None,
+                lifespan=lifespan,
+            )
+            for index in range(self.config.threads)
+        ]
+        servers[0].siblings = servers
+
+        try:
+            run_event_loop(
+                self._run_threads(servers, lifespan), self.config.loop
+            )
+        except KeyboardInterrupt:
+            ...
+        finally:
+            self.logger.info(f"Worker {self.pid} was stopped")
+
+    async def _run_threads(self, servers: List[Server], lifespan: Lifespan):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+        if self.config.lifespan:
+            await lifespan.startup()
+
+        def serve(server: Server):
+            try:
+                server.main()
+            finally:
+                # one server exiting takes the whole process down
+                loop.call_soon_threadsafe(stop.set)
+
+        threads = [
+            threading.Thread(
+                target=serve, args=(server,), name=f"uasgi-server-{index}"
+            )
+            for index, server in enumerate(servers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            await stop.wait()
+        finally:
+            for server in servers:
+                server.stop_threadsafe()
+
+            for thread in threads:
+                await asyncio.to_thread(thread.join)
+
+            if self.config.lifespan:
+                await lifespan.shutdown()
+
+    def _pin_cpu(self):
+        cpus = sorted(os.sched_getaffinity(0))
+        cpu = cpus[self.index % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+        self.logger.debug(f"Worker {self.index} pinned to CPU {cpu}")
+
     @property
     def pid(self):
         if self.worker:
             return self.worker.pid
 
+    def is_alive(self) -> bool:
+        return self.worker is not None and self.worker.is_alive()
+
+    @property
+    def exitcode(self):
+        if self.worker:
+            return self.worker.exitcode
+
+    def is_hung(self, timeout: float) -> bool:
+        """Whether the worker's event loop stopped beating for `timeout`
+
+        The clock starts at the first heartbeat, a slow import or lifespan
+        startup is not a hang.
+        """
+
+        last_beat = self.status.heartbeat.value
+        return bool(last_beat) and time.monotonic() - last_beat > timeout
+
+    def is_ready(self) -> bool:
+        return self.status.heartbeat.value > 0
+
+    @property
+    def boot_time(self) -> float:
+        """Seconds between the worker start and its first heartbeat"""
+
+        return self.status.booted_at.value - self.started_at
+
+    def terminate(self):
+        """Ask the worker to stop accepting and drain its connections"""
+
+        if self.pid:
+            os.kill(self.pid, signal.SIGTERM)
+
+    def kill(self):
+        if self.pid:
+            os.kill(self.pid, signal.SIGKILL)
+
     def reload(self):
+        # the template process replaces its worker on SIGHUP
         if self.pid:
             self.logger.info("Worker is reloading")
-            os.kill(self.pid, signal.SIGINT)
-            self.join()
-            self.run()
+            os.kill(self.pid, signal.SIGHUP)
 
-    def join(self):
+    def join(self, timeout: float = 5):
         if self.worker and self.worker.is_alive():
-            self.worker.join(timeout=5)
+            self.worker.join(timeout=timeout)
+
+    def drain(self):
+        """Wait for a stopping worker within the graceful timeout, or kill it"""
+
+        self.join(self.config.graceful_timeout + self.EXIT_GRACE)
+        if self.is_alive():
+            self.logger.warning(
+                f"Worker {self.pid} did not drain in time, killing it"
+            )
+            self.kill()
+            self.join()